@@ -0,0 +1 @@
+# This file intentionally left empty to make the directory a Python package
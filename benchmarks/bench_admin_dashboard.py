@@ -0,0 +1,39 @@
+"""
+Admin dashboard time to first byte as booking history grows.
+
+Only the first page of each table is rendered, so this should stay flat.
+Run from the repository root:
+
+    python -m benchmarks.bench_admin_dashboard
+"""
+from benchmarks.common import create_bench_app, login_client, seed_history, measure
+
+HISTORY_SIZES = [1000, 10000, 50000]
+
+def main():
+    app = create_bench_app()
+    client = login_client(app, admin=True)
+
+    def dashboard(i):
+        response = client.get('/admin/dashboard')
+        assert response.status_code == 200
+
+    def deep_page(i):
+        response = client.get('/admin/bookings', query_string={'after': cursor})
+        assert response.status_code == 200
+
+    print(f"{'history':>8} {'dashboard p50':>14} {'p95':>7} {'last page p50':>14}  (ms)")
+    seeded = 0
+    with app.app_context():
+        for size in HISTORY_SIZES:
+            seed_history(size - seeded, offset=seeded)
+            seeded = size
+            # Cursor just before the oldest booking, the deepest page there is
+            cursor = client.get('/admin/bookings', query_string={'order': 'asc', 'limit': 1}).json['items'][0]
+            cursor = f"{cursor['start_date']}T00:00:00_{size + 1}"
+            p50, p95 = measure(dashboard)
+            deep_p50, _ = measure(deep_page)
+            print(f'{size:>8} {p50:>14.2f} {p95:>7.2f} {deep_p50:>14.2f}')
+
+if __name__ == '__main__':
+    main()
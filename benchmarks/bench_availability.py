@@ -0,0 +1,56 @@
+"""
+Overlap check cost: the in-memory interval index versus the original SQL query.
+
+The SQL path is the three-way OR filter create_booking and create_blocked_date
+used to run against both tables. Run from the repository root:
+
+    python -m benchmarks.bench_availability
+"""
+import random
+from datetime import datetime, timedelta
+from benchmarks.common import create_bench_app, seed_history, measure
+
+INTERVAL_COUNTS = [10000, 100000]
+
+def sql_overlaps(start_date, end_date):
+    from src.database import db
+    from src.models import Booking, BlockedDate
+
+    def overlapping(model):
+        return model.query.filter(
+            db.or_(
+                db.and_(model.start_date <= start_date, model.end_date >= start_date),
+                db.and_(model.start_date <= end_date, model.end_date >= end_date),
+                db.and_(model.start_date >= start_date, model.end_date <= end_date)
+            )
+        ).first()
+
+    return overlapping(Booking) is not None or overlapping(BlockedDate) is not None
+
+def main():
+    from src.availability import availability
+
+    app = create_bench_app()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    random.seed(1)
+
+    print(f"{'intervals':>9} {'index p50':>10} {'index+sync p50':>15} {'sql p50':>9} {'rebuild':>9}  (ms)")
+    seeded = 0
+    with app.app_context():
+        for count in INTERVAL_COUNTS:
+            seed_history(count - seeded, offset=seeded)
+            seeded = count
+            span_days = count * 4
+
+            def probe():
+                start = today - timedelta(days=random.randrange(span_days))
+                return start, start + timedelta(days=2)
+
+            rebuild_ms, _ = measure(lambda i: availability.rebuild(), repeat=3)
+            index_ms, _ = measure(lambda i: availability.index.overlaps(*probe()), repeat=2000)
+            synced_ms, _ = measure(lambda i: availability.is_free(*probe()), repeat=500)
+            sql_ms, _ = measure(lambda i: sql_overlaps(*probe()), repeat=50)
+            print(f'{count:>9} {index_ms:>10.4f} {synced_ms:>15.3f} {sql_ms:>9.2f} {rebuild_ms:>9.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Events the guest calendar receives per month: one per stay versus merged
+busy ranges from /api/availability.
+
+History is seeded with back-to-back stays, so every stay continues the
+previous busy range. Run from the repository root:
+
+    python -m benchmarks.bench_availability_ranges
+"""
+from datetime import datetime, timedelta
+from benchmarks.common import create_bench_app, login_client, remote_addr, seed_history, measure
+from src.response_cache import events_cache
+
+HISTORY = 5000
+
+def main():
+    app = create_bench_app()
+    client = login_client(app)
+
+    today = datetime.now().date()
+    window = {
+        'start': (today - timedelta(days=35)).isoformat(),
+        'end': (today + timedelta(days=7)).isoformat(),
+    }
+
+    def fetch(url):
+        events_cache.clear()
+        response = client.get(url, query_string=window, environ_base=remote_addr())
+        assert response.status_code == 200
+        return response
+
+    with app.app_context():
+        seed_history(HISTORY, gap_nights=0)
+        print(f"{'endpoint':>18} {'events':>7} {'bytes':>6} {'p50':>6} {'p95':>6}  (ms, uncached)")
+        for url in ('/api/bookings', '/api/availability'):
+            response = fetch(url)
+            p50, p95 = measure(lambda i: fetch(url))
+            print(f'{url:>18} {len(response.json):>7} {len(response.data):>6} {p50:>6.2f} {p95:>6.2f}')
+
+if __name__ == '__main__':
+    main()
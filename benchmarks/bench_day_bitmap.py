@@ -0,0 +1,61 @@
+"""
+Day-level availability queries on the DayBitmap, next to the interval index
+and SQL equivalents.
+
+History is seeded with 3-night stays and 1-night gaps, so a first-free search
+for 2+ nights has to walk the whole history before it finds room. Run from the
+repository root:
+
+    python -m benchmarks.bench_day_bitmap
+"""
+import random
+from datetime import datetime, timedelta
+from benchmarks.common import create_bench_app, seed_history, measure
+
+INTERVAL_COUNTS = [10000, 100000]
+
+def sql_monthly_occupancy(year):
+    from src.database import db
+    from src.summary import occupied_nights
+
+    months = [datetime(year, month, 1) for month in range(1, 13)] + [datetime(year + 1, 1, 1)]
+    return db.session.execute(db.select(
+        *(db.func.sum(occupied_nights(start, end)) for start, end in zip(months, months[1:]))
+    )).one()
+
+def main():
+    from src.availability import availability
+
+    app = create_bench_app()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    random.seed(1)
+
+    print(f"{'intervals':>9} {'index any':>10} {'bitmap any':>11} {'first free':>11} "
+          f"{'months':>8} {'sql months':>11} {'rebuild':>9}  (ms)")
+    seeded = 0
+    with app.app_context():
+        for count in INTERVAL_COUNTS:
+            seed_history(count - seeded, offset=seeded)
+            seeded = count
+            span_days = count * 4
+            earliest = (today - timedelta(days=span_days + 1)).date()
+
+            def probe():
+                start = today - timedelta(days=random.randrange(span_days))
+                return start, start + timedelta(days=2)
+
+            def probe_days():
+                start, end = probe()
+                return start.date(), end.date()
+
+            rebuild_ms, _ = measure(lambda i: availability.rebuild(), repeat=3)
+            index_ms, _ = measure(lambda i: availability.index.overlaps(*probe()), repeat=2000)
+            bitmap_ms, _ = measure(lambda i: availability.days.any(*probe_days()), repeat=2000)
+            gap_ms, _ = measure(lambda i: availability.days.first_gap(earliest, 3), repeat=20)
+            months_ms, _ = measure(lambda i: availability.monthly_occupancy(today.year - 1), repeat=200)
+            sql_ms, _ = measure(lambda i: sql_monthly_occupancy(today.year - 1), repeat=20)
+            print(f'{count:>9} {index_ms:>10.4f} {bitmap_ms:>11.4f} {gap_ms:>11.2f} '
+                  f'{months_ms:>8.3f} {sql_ms:>11.2f} {rebuild_ms:>9.1f}')
+
+if __name__ == '__main__':
+    main()
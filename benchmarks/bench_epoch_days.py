@@ -0,0 +1,60 @@
+"""
+Calendar window queries filtering on the DateTime columns (the old
+ix_booking_end_start index) versus the integer epoch-day columns.
+
+Each query fetches a month of bookings the way /api/bookings does, at random
+points in the seeded history. Index sizes come from SQLite's dbstat table.
+Run from the repository root:
+
+    python -m benchmarks.bench_epoch_days
+"""
+import random
+from datetime import datetime, timedelta
+from benchmarks.common import create_bench_app, seed_history, measure
+
+INTERVAL_COUNTS = [10000, 100000]
+
+def index_bytes(name):
+    from src.database import db
+    return db.session.execute(db.text('SELECT sum(pgsize) FROM dbstat WHERE name = :name'), {'name': name}).scalar()
+
+def main():
+    from src.database import db
+    from src.models import Booking
+    from src.models.epoch_day import epoch_day
+
+    app = create_bench_app()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    random.seed(1)
+    columns = (Booking.id, Booking.start_date, Booking.end_date)
+
+    def by_date(start, end):
+        return db.session.execute(db.select(*columns).filter(
+            Booking.end_date > start - timedelta(days=1), Booking.start_date < end)).all()
+
+    def by_day(start, end):
+        return db.session.execute(db.select(*columns).filter(
+            Booking.end_day >= epoch_day(start), Booking.start_day <= epoch_day(end) - 1)).all()
+
+    print(f"{'intervals':>9} {'datetime p50':>13} {'epoch day p50':>14} {'datetime idx':>13} {'epoch idx':>10}  (ms, KiB)")
+    seeded = 0
+    with app.app_context():
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_booking_end_start ON booking (end_date, start_date)'))
+        db.session.commit()
+        for count in INTERVAL_COUNTS:
+            seed_history(count - seeded, offset=seeded)
+            seeded = count
+            db.session.execute(db.text('ANALYZE'))
+            span_days = count * 4
+
+            def window():
+                start = today - timedelta(days=random.randrange(span_days))
+                return start, start + timedelta(days=42)
+
+            date_ms, _ = measure(lambda i: by_date(*window()), repeat=500)
+            day_ms, _ = measure(lambda i: by_day(*window()), repeat=500)
+            print(f'{count:>9} {date_ms:>13.3f} {day_ms:>14.3f} '
+                  f"{index_bytes('ix_booking_end_start') / 1024:>13.0f} {index_bytes('ix_booking_end_start_day') / 1024:>10.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Cost of GET /api/bookings when the calendar has not changed.
+
+Compares a cold build (cache dropped before every request), a warm cache
+hit, and a conditional request answered with 304 Not Modified.
+Run from the repository root:
+
+    python -m benchmarks.bench_events_cache
+"""
+from benchmarks.common import create_bench_app, login_client, remote_addr, seed_history, measure
+from src.response_cache import events_cache
+
+HISTORY_SIZES = [1000, 10000]
+
+def main():
+    app = create_bench_app()
+    client = login_client(app)
+
+    def fetch(headers=None):
+        return client.get('/api/bookings', headers=headers, environ_base=remote_addr())
+
+    def cold(i):
+        events_cache.clear()
+        assert fetch().status_code == 200
+
+    def warm(i):
+        assert fetch().status_code == 200
+
+    def not_modified(i):
+        assert fetch({'If-None-Match': etag}).status_code == 304
+
+    print(f"{'history':>8} {'cold p50':>9} {'warm p50':>9} {'304 p50':>8} {'304 p95':>8}  (ms)")
+    seeded = 0
+    with app.app_context():
+        for size in HISTORY_SIZES:
+            seed_history(size - seeded, offset=seeded)
+            seeded = size
+            etag = fetch().headers['ETag']
+            cold_p50, _ = measure(cold, repeat=10)
+            warm_p50, _ = measure(warm)
+            nm_p50, nm_p95 = measure(not_modified)
+            print(f'{size:>8} {cold_p50:>9.1f} {warm_p50:>9.2f} {nm_p50:>8.2f} {nm_p95:>8.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Payload size and encode time of the events feed, full versus slim.
+
+Regular users get the slim projection (dates and type only); admins get
+the full events with guest details. Run from the repository root:
+
+    python -m benchmarks.bench_events_projection
+"""
+from benchmarks.common import create_bench_app, seed_history, measure
+from src.routes.api import build_events
+from src.utils.json_stream import iter_json_array
+
+EVENTS = 5000
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        seed_history(EVENTS)
+        with app.test_request_context():
+            print(f"{EVENTS} events")
+            print(f"{'projection':>10} {'bytes':>9} {'p50':>8} {'p95':>8}  (ms, query + encode)")
+            for name, slim in (('full', False), ('slim', True)):
+                size = len(b''.join(iter_json_array(build_events(None, None, None, slim=slim))))
+                p50, p95 = measure(lambda i: b''.join(iter_json_array(build_events(None, None, None, slim=slim))),
+                                   repeat=20)
+                print(f'{name:>10} {size:>9} {p50:>8.1f} {p95:>8.1f}')
+
+if __name__ == '__main__':
+    main()
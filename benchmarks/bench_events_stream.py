@@ -0,0 +1,90 @@
+"""
+Throughput and peak memory of the admin events feed: the ORM + jsonify path
+it used to take versus Core tuples streamed through iter_json_array, with
+and without orjson.
+
+The old path is mounted on the bench app as /bench/legacy-events. The
+response cache is cleared before every request so each one rebuilds the
+payload. Run from the repository root:
+
+    python -m benchmarks.bench_events_stream
+"""
+import time
+import tracemalloc
+from flask import jsonify
+from benchmarks.common import create_bench_app, login_client, remote_addr, seed_history
+from src.response_cache import events_cache
+from src.utils import json_stream
+
+ROW_COUNTS = [1000, 10000, 50000]
+
+def legacy_events():
+    from src.models import Booking, BlockedDate
+
+    events = []
+    for booking in Booking.query.all():
+        events.append({
+            'id': booking.id,
+            'start': booking.start_date.isoformat(),
+            'end': booking.end_date.isoformat(),
+            'title': 'Booked',
+            'type': 'booking',
+            'guest_name': booking.guest_name,
+            'guest_email': booking.guest_email
+        })
+    for blocked in BlockedDate.query.all():
+        events.append({
+            'id': blocked.id,
+            'start': blocked.start_date.isoformat(),
+            'end': blocked.end_date.isoformat(),
+            'title': 'Booked',
+            'type': 'blocked',
+            'reason': blocked.reason
+        })
+    return jsonify(events)
+
+def fetch(client, url):
+    events_cache.clear()
+    response = client.get(url, environ_base=remote_addr(), buffered=False)
+    assert response.status_code == 200
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return size
+
+def run(client, url, seconds=2.0):
+    """Return (requests/second, peak traced MiB, body bytes) for `url`"""
+    tracemalloc.start()
+    size = fetch(client, url)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+
+    count, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        fetch(client, url)
+        count += 1
+    return count / (time.perf_counter() - started), peak, size
+
+def main():
+    app = create_bench_app()
+    app.add_url_rule('/bench/legacy-events', view_func=legacy_events)
+    client = login_client(app, admin=True)
+    orjson = json_stream.orjson
+
+    print(f"{'rows':>6} {'path':>16} {'req/s':>8} {'peak MiB':>9} {'bytes':>10}")
+    seeded = 0
+    with app.app_context():
+        for count in ROW_COUNTS:
+            seed_history(count - seeded, offset=seeded)
+            seeded = count
+            for name, url, use_orjson in (('orm + jsonify', '/bench/legacy-events', False),
+                                          ('core + json', '/api/bookings', False),
+                                          ('core + orjson', '/api/bookings', True)):
+                if use_orjson and orjson is None:
+                    continue
+                json_stream.orjson = orjson if use_orjson else None
+                rate, peak, size = run(client, url)
+                json_stream.orjson = orjson
+                print(f'{count:>6} {name:>16} {rate:>8.1f} {peak:>9.1f} {size:>10}')
+
+if __name__ == '__main__':
+    main()
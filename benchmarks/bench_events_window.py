@@ -0,0 +1,43 @@
+"""
+Latency of GET /api/bookings as booking history grows.
+
+Compares the unbounded feed with the month window FullCalendar requests.
+Run from the repository root:
+
+    python -m benchmarks.bench_events_window
+"""
+from datetime import datetime, timedelta
+from benchmarks.common import create_bench_app, login_client, remote_addr, seed_history, measure
+
+HISTORY_SIZES = [1000, 10000, 50000]
+
+def main():
+    app = create_bench_app()
+    client = login_client(app)
+
+    today = datetime.now().date()
+    window = {
+        'start': (today - timedelta(days=7)).isoformat() + 'T00:00:00+02:00',
+        'end': (today + timedelta(days=35)).isoformat() + 'T00:00:00+02:00',
+    }
+
+    def windowed(i):
+        response = client.get('/api/bookings', query_string=window, environ_base=remote_addr())
+        assert response.status_code == 200
+
+    def unbounded(i):
+        response = client.get('/api/bookings', environ_base=remote_addr())
+        assert response.status_code == 200
+
+    print(f"{'history':>8} {'window p50':>11} {'window p95':>11} {'all p50':>9} {'all p95':>9}  (ms)")
+    seeded = 0
+    with app.app_context():
+        for size in HISTORY_SIZES:
+            seed_history(size - seeded, offset=seeded)
+            seeded = size
+            window_p50, window_p95 = measure(windowed)
+            all_p50, all_p95 = measure(unbounded, repeat=5)
+            print(f'{size:>8} {window_p50:>11.2f} {window_p95:>11.2f} {all_p50:>9.1f} {all_p95:>9.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Throughput of ExponentialBackoffLimiter.check_rate_limit with 10k client IPs.
+
+"legacy" re-creates the original list-of-datetimes limiter behind one global
+lock for comparison (with its ban duration capped so it can't overflow). The
+"hot" column sends everything from 10 IPs, like a scraping burst, which grows
+the legacy per-IP lists. Run from the repository root:
+
+    python -m benchmarks.bench_rate_limiter
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from src.rate_limiting import ExponentialBackoffLimiter, MemoryStorage, SQLiteStorage
+
+DISTINCT_IPS = 10000
+CHECKS = 200000
+THREADS = [1, 8]
+
+class LegacyLimiter:
+    def __init__(self):
+        self.violations = defaultdict(int)
+        self.ban_until = defaultdict(lambda: datetime.min)
+        self.request_times = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def check_rate_limit(self, ip):
+        with self._lock:
+            now = datetime.now()
+            self.request_times[ip] = [t for t in self.request_times[ip]
+                                      if now - t < timedelta(seconds=60)]
+            self.request_times[ip].append(now)
+            if len(self.request_times[ip]) > 100:
+                self.violations[ip] += 1
+                self.ban_until[ip] = now + timedelta(seconds=2 ** min(self.violations[ip] - 1, 16))
+                return False
+            recent_requests = len([t for t in self.request_times[ip]
+                                   if now - t < timedelta(seconds=1)])
+            if recent_requests > 3:
+                self.violations[ip] += 1
+                self.ban_until[ip] = now + timedelta(seconds=2 ** min(self.violations[ip] - 1, 16))
+                return False
+            return True
+
+def run(limiter, ips, checks, threads):
+    """Return checks per second with `threads` threads sharing the work"""
+    per_thread = checks // threads
+
+    def worker(offset):
+        check = limiter.check_rate_limit
+        for i in range(per_thread):
+            check(ips[(offset + i) % len(ips)])
+
+    workers = [threading.Thread(target=worker, args=(n * 7919,)) for n in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+def main():
+    ips = [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(DISTINCT_IPS)]
+    # A scraper that has already made ~100 requests this minute
+    hot_ips = ips[:10]
+
+    limiters = {
+        'legacy': LegacyLimiter,
+        'memory': lambda: ExponentialBackoffLimiter(MemoryStorage()),
+        'sqlite': lambda: ExponentialBackoffLimiter(
+            SQLiteStorage(os.path.join(tempfile.mkdtemp(), 'rate_limits.db'))),
+    }
+    print(f"{'storage':>8} {'threads':>7} {'10k IPs/s':>11} {'hot IPs/s':>11}")
+    for name, factory in limiters.items():
+        checks = CHECKS if name != 'sqlite' else CHECKS // 20
+        # The legacy lists grow without bound under a burst, so keep its run short
+        hot_checks = 4000 if name == 'legacy' else checks // 4
+        for threads in THREADS:
+            spread = run(factory(), ips, checks, threads)
+            hot = run(factory(), hot_ips, hot_checks, threads)
+            print(f'{name:>8} {threads:>7} {spread:>11,.0f} {hot:>11,.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Reader latency while another connection writes, with and without the
+SQLITE_PRAGMAS profile.
+
+A writer process (standing in for another gunicorn worker) commits batches
+of bookings in a loop while reader threads run the calendar's window query. Without WAL a commit locks readers out, and
+without busy_timeout they fail with "database is locked" instead of waiting.
+Run from the repository root:
+
+    python -m benchmarks.bench_sqlite_profile
+"""
+import os
+import multiprocessing
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, select, insert, func
+from sqlalchemy.exc import OperationalError
+from src.config import Config
+from src.database import db, apply_pragmas
+from src.models import Booking
+
+SEED = 20000
+DURATION = 3.0
+READERS = 4
+WRITE_BATCH = 2000
+WRITE_INTERVAL = 0.05
+
+def make_engine(path, pragmas):
+    engine = create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False},
+                           pool_size=READERS + 1)
+    if pragmas:
+        event.listen(engine, 'connect', lambda connection, record: apply_pragmas(connection, pragmas))
+    return engine
+
+def rows(start, count):
+    base = datetime(2000, 1, 1)
+    return [{
+        'guest_name': f'Guest {i}', 'guest_email': f'guest{i}@example.com',
+        'start_date': base + timedelta(days=i), 'end_date': base + timedelta(days=i, hours=12),
+    } for i in range(start, start + count)]
+
+def writer(path, pragmas, stop, commits):
+    engine = make_engine(path, pragmas)
+    next_id = SEED
+    while not stop.is_set():
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(Booking), rows(next_id, WRITE_BATCH))
+            next_id += WRITE_BATCH
+            with commits.get_lock():
+                commits.value += 1
+        except OperationalError:
+            pass
+        # A steady write rate, so both profiles do the same amount of work
+        time.sleep(WRITE_INTERVAL)
+    engine.dispose()
+
+def run(pragmas):
+    path = os.path.join(tempfile.mkdtemp(prefix='homestay-bench-'), 'bench.db')
+    engine = make_engine(path, pragmas)
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Booking), rows(0, SEED))
+
+    stop = threading.Event()
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def reader():
+        window_start = datetime(2000, 1, 1) + timedelta(days=SEED - 40)
+        query = select(func.count()).select_from(Booking).filter(
+            Booking.end_date > window_start, Booking.start_date < window_start + timedelta(days=42))
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    connection.execute(query).scalar()
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+            except OperationalError:
+                with lock:
+                    errors[0] += 1
+
+    writer_stop = multiprocessing.Event()
+    commits = multiprocessing.Value('i', 0)
+    writer_process = multiprocessing.Process(target=writer, args=(path, pragmas, writer_stop, commits))
+    writer_process.start()
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    writer_stop.set()
+    for thread in threads:
+        thread.join()
+    writer_process.join()
+    engine.dispose()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float('nan')
+    return len(latencies) / DURATION, p99, latencies[-1] if latencies else float('nan'), errors[0], commits.value / DURATION
+
+def main():
+    print(f"{'profile':>10} {'reads/s':>9} {'read p99':>9} {'read max':>9} {'errors':>7} {'commits/s':>10}  (ms)")
+    for name, pragmas in (('default', {}), ('tuned', Config.SQLITE_PRAGMAS)):
+        reads, p99, worst, errors, commits = run(pragmas)
+        print(f'{name:>10} {reads:>9.0f} {p99:>9.2f} {worst:>9.2f} {errors:>7} {commits:>10.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Rendering 100k welcome emails, as a bulk resend would.
+
+Compares the old chain of str.replace calls with the compiled template.
+Run from the repository root:
+
+    python -m benchmarks.bench_welcome_template
+"""
+import time
+from datetime import datetime, timedelta
+from src.config import Config
+from src.models import Booking
+from src.utils.templates import compile_template
+
+RENDERS = 100000
+
+def replace_chain(template, booking):
+    body = template.replace('{guest_name}', booking.guest_name)
+    body = body.replace('{start_date}', booking.start_date.strftime('%Y-%m-%d'))
+    return body.replace('{end_date}', booking.end_date.strftime('%Y-%m-%d'))
+
+def main():
+    template = Config.WELCOME_EMAIL_TEMPLATE
+    start = datetime(2030, 1, 1)
+    bookings = [
+        Booking(id=i, guest_name=f'Guest {i}', guest_email=f'guest{i}@example.com',
+                start_date=start + timedelta(days=i % 365), end_date=start + timedelta(days=i % 365 + 3))
+        for i in range(1000)
+    ]
+
+    def run(render):
+        started = time.perf_counter()
+        for i in range(RENDERS):
+            render(bookings[i % len(bookings)])
+        return time.perf_counter() - started
+
+    compiled = compile_template(template)
+    legacy = run(lambda booking: replace_chain(template, booking))
+    # Escaping is off to compare like for like with the unescaped replace chain
+    fast = run(lambda booking: compiled.render(booking, html=False))
+    escaped = run(compiled.render)
+    print(f'{RENDERS} renders of a {len(template)} character template')
+    print(f"{'str.replace chain':>22} {legacy:>7.3f} s")
+    print(f"{'compiled':>22} {fast:>7.3f} s")
+    print(f"{'compiled, escaped':>22} {escaped:>7.3f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import os
+import json
+import sys
+import platform
+import subprocess
+import tempfile
+import time
+import statistics
+import itertools
+from datetime import datetime, timedelta, timezone
+
+def create_bench_app():
+    """Create an app backed by a throwaway SQLite file with email disabled"""
+    # Config reads the environment at import time, so this must run first
+    db_dir = tempfile.mkdtemp(prefix='homestay-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(db_dir, 'bench.db')}"
+    os.environ['SEND_EMAILS'] = 'false'
+    os.makedirs('instance', exist_ok=True)
+
+    from src.app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+def login_client(app, admin=False):
+    """Return a test client logged in as the guest user or the admin"""
+    client = app.test_client()
+    if admin:
+        client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    else:
+        client.post('/login', data={'access_code': app.config['DEFAULT_ACCESS_CODE']})
+    return client
+
+_client_ids = itertools.count()
+
+def remote_addr():
+    """Give each benchmark request its own client IP to stay under the rate limit"""
+    i = next(_client_ids)
+    return {'REMOTE_ADDR': f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}'}
+
+def seed_history(count, offset=0, stay_nights=3, gap_nights=1):
+    """Bulk insert `count` back-to-back bookings reaching backwards from today"""
+    from src.database import db
+    from src.models import Booking
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+    for i in range(offset, offset + count):
+        start = today - timedelta(days=(i + 1) * (stay_nights + gap_nights))
+        rows.append({
+            'guest_name': f'Guest {i}',
+            'guest_email': f'guest{i}@example.com',
+            'start_date': start,
+            'end_date': start + timedelta(days=stay_nights),
+        })
+    db.session.execute(db.insert(Booking), rows)
+    db.session.commit()
+
+def measure(fn, repeat=50):
+    """Run `fn` repeatedly and return (median, p95) wall time in milliseconds"""
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def percentile(sorted_samples, fraction):
+    """Return the sample at `fraction` (0-1) of an already sorted list"""
+    if not sorted_samples:
+        return None
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+def environment():
+    """Describe the machine and code a run was made on, for comparing result files"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import orjson  # noqa: F401
+        has_orjson = True
+    except ImportError:
+        has_orjson = False
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'orjson': has_orjson,
+    }
+
+def write_results(suite, params, results, output=None):
+    """
+    Write a run's results as JSON and return the path
+
+    By default files go to instance/benchmarks/<suite>-<UTC timestamp>.json;
+    `python -m benchmarks.compare` reads two of them side by side.
+    """
+    started = datetime.now(timezone.utc)
+    if output is None:
+        output = os.path.join('instance', 'benchmarks', f"{suite}-{started.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'suite': suite,
+            'created_at': started.isoformat(timespec='seconds'),
+            'argv': sys.argv[1:],
+            'environment': environment(),
+            'params': params,
+            'results': results,
+        }, f, indent=2)
+    return output
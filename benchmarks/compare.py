@@ -0,0 +1,43 @@
+"""
+Compare two results files from benchmarks.suite or benchmarks.load.
+
+Prints each benchmark's p50 and p95 in both runs and the change, slowest
+first. Run from the repository root:
+
+    python -m benchmarks.compare before.json after.json
+"""
+import json
+import sys
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__.strip())
+    before, after = load(sys.argv[1]), load(sys.argv[2])
+    if before['suite'] != after['suite']:
+        sys.exit(f"Can't compare a {before['suite']} run with a {after['suite']} run")
+    for label, run in (('before', before), ('after', after)):
+        env = run['environment']
+        print(f"{label:>6}: {run['created_at']} commit {env['commit'] or '?'} python {env['python']} "
+              f"{run['params']}")
+
+    rows = []
+    for name in sorted(before['results'].keys() & after['results'].keys()):
+        old, new = before['results'][name], after['results'][name]
+        if old['p50_ms'] is None or new['p50_ms'] is None:
+            continue
+        change = new['p50_ms'] / old['p50_ms'] - 1 if old['p50_ms'] else 0
+        rows.append((change, name, old, new))
+
+    print(f"{'benchmark':<30} {'p50 before':>11} {'p50 after':>10} {'change':>8} {'p95 before':>11} {'p95 after':>10}")
+    for change, name, old, new in sorted(rows, key=lambda row: row[0], reverse=True):
+        print(f"{name:<30} {old['p50_ms']:>11.4f} {new['p50_ms']:>10.4f} {change:>+8.1%} "
+              f"{old['p95_ms']:>11.4f} {new['p95_ms']:>10.4f}")
+    for name in sorted(before['results'].keys() ^ after['results'].keys()):
+        print(f"{name:<30} only in {'before' if name in before['results'] else 'after'}")
+
+if __name__ == '__main__':
+    main()
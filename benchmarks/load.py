@@ -0,0 +1,212 @@
+"""
+Concurrent HTTP load against a locally started gunicorn, written to a JSON
+results file for comparing runs.
+
+Seeds a throwaway database with a generated calendar, starts gunicorn on it
+and has `--concurrency` threads send a weighted mix of guest and admin
+requests for `--duration` seconds. Requests come from `--clients` different
+loopback addresses (127.x.y.z, which Linux routes to lo) so the per-IP rate
+limit applies as it would to real visitors rather than throttling the
+driver itself. Run from the repository root:
+
+    python -m benchmarks.load --workers 4 --threads 8 --concurrency 32 --duration 30
+
+Pass --url to load a server that is already running instead.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from urllib.parse import urlencode, urlsplit
+from benchmarks.common import create_bench_app, percentile, write_results
+
+def month_window(rng, first, last):
+    """Query string for the calendar window of a random month, as FullCalendar sends it"""
+    day = first + timedelta(days=rng.randrange((last - first).days))
+    start = day.replace(day=1) - timedelta(days=7)
+    return urlencode({'start': f'{start}T00:00:00', 'end': f'{start + timedelta(days=42)}T00:00:00'})
+
+def new_booking(rng, first, last):
+    # Far past the generated calendar so most of these succeed
+    start = last + timedelta(days=rng.randrange(30, 20000))
+    return {'guest_name': 'Load Test', 'guest_email': 'load@example.com',
+            'start_date': start.isoformat(), 'end_date': (start + timedelta(days=rng.randint(1, 7))).isoformat()}
+
+# name: (weight, admin session, method, path builder, JSON body builder)
+SCENARIOS = {
+    'calendar_month': (40, False, 'GET', lambda rng, first, last: f'/api/bookings?{month_window(rng, first, last)}', None),
+    'availability': (15, False, 'GET', lambda rng, first, last: '/api/availability', None),
+    'first_free': (10, False, 'GET', lambda rng, first, last: f'/api/availability/first-free?nights={rng.randint(1, 14)}', None),
+    'occupancy': (5, False, 'GET',
+                  lambda rng, first, last: f'/api/availability/occupancy?year={rng.randint(first.year, last.year)}', None),
+    'admin_calendar_month': (15, True, 'GET', lambda rng, first, last: f'/api/bookings?{month_window(rng, first, last)}', None),
+    'admin_dashboard': (10, True, 'GET', lambda rng, first, last: '/admin/dashboard', None),
+    'create_booking': (5, False, 'POST', lambda rng, first, last: '/api/bookings', new_booking),
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def request(host, port, method, path, source=None, body=None, headers=None, timeout=30):
+    """Send one request on a fresh connection and return (status, headers, body)"""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout,
+                                            source_address=(source, 0) if source else None)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+def login(host, port, path, access_code):
+    """Return the session cookie for a login with `access_code`"""
+    status, headers, _ = request(host, port, 'POST', path, body=urlencode({'access_code': access_code}),
+                                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    cookie = next((value.split(';', 1)[0] for value in headers.get_all('Set-Cookie') or []
+                   if value.startswith('session=')), None)
+    if status != 302 or cookie is None:
+        sys.exit(f'Logging in at {path} failed with status {status}; check the access codes')
+    return cookie
+
+def start_gunicorn(port, workers, threads):
+    """Start gunicorn on the seeded database and wait until it answers"""
+    data_dir = os.path.dirname(os.environ['DATABASE_URL'][len('sqlite:///'):])
+    env = dict(os.environ,
+               RATE_LIMIT_STORAGE=f'sqlite:///{data_dir}/rate_limits.db',
+               METRICS_STORAGE=f'sqlite:///{data_dir}/metrics.db')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                               '--workers', str(workers), '--threads', str(threads),
+                               '--log-level', 'warning', 'wsgi:app'], env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit('gunicorn exited during startup; is it installed? (pip install -r requirements.txt)')
+        try:
+            if request('127.0.0.1', port, 'GET', '/login', timeout=2)[0] == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    sys.exit('gunicorn did not answer within 60 seconds')
+
+def drive(host, port, cookies, first, last, args):
+    """Run the request mix from every thread and return [(scenario, status, started, seconds)]"""
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][0] for name in names]
+    loopback = host in ('127.0.0.1', 'localhost')
+    clients = [f'127.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}' for n in range(1, args.clients + 1)]
+    deadline = time.monotonic() + args.warmup + args.duration
+    records = []
+
+    def worker(n):
+        rng = random.Random(args.seed * 1000 + n)
+        mine = []
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            _, admin, method, path, body = SCENARIOS[name]
+            headers = {'Cookie': cookies[admin]}
+            payload = None
+            if body is not None:
+                payload = json.dumps(body(rng, first, last))
+                headers['Content-Type'] = 'application/json'
+            source = rng.choice(clients) if loopback and args.clients > 1 else None
+            started = time.monotonic()
+            try:
+                status = request(host, port, method, path(rng, first, last), source, payload, headers)[0]
+            except OSError:
+                status = 'error'
+            mine.append((name, status, started, time.monotonic() - started))
+        records.extend(mine)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records
+
+def summarize(records, duration):
+    samples = sorted(seconds * 1000 for _, _, _, seconds in records)
+    return {
+        'p50_ms': percentile(samples, 0.5),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+        'count': len(records),
+        'rps': len(records) / duration,
+        'statuses': dict(Counter(str(status) for _, status, _, _ in records)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='load this running server instead of starting gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (default 4)')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker (default 8)')
+    parser.add_argument('--concurrency', type=int, default=32, help='requests in flight at once (default 32)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds measured (default 30)')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds sent before measuring (default 3)')
+    parser.add_argument('--clients', type=int, default=5000, help='distinct client IPs (default 5000)')
+    parser.add_argument('--years', type=float, default=5, help='years of generated history (default 5)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the data and request mix')
+    parser.add_argument('--output', help='results file (default instance/benchmarks/load-<time>.json)')
+    args = parser.parse_args()
+
+    from src.config import Config
+
+    today = date.today()
+    first, last = today - timedelta(days=round(args.years * 365.25)), today + timedelta(days=180)
+    server = None
+    params = {key: value for key, value in vars(args).items() if key != 'output'}
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        from src.seed import seed_calendar
+
+        app = create_bench_app()
+        with app.app_context():
+            params['bookings'], params['blocked_dates'] = seed_calendar(years=args.years, seed=args.seed)
+        print(f"Seeded {params['bookings']} bookings and {params['blocked_dates']} blocked dates")
+        host, port = '127.0.0.1', free_port()
+        server = start_gunicorn(port, args.workers, args.threads)
+
+    try:
+        cookies = {False: login(host, port, '/login', Config.DEFAULT_ACCESS_CODE),
+                   True: login(host, port, '/admin/login', Config.ADMIN_ACCESS_CODE)}
+        print(f'Sending load for {args.warmup:g}s warmup + {args.duration:g}s from {args.concurrency} threads')
+        records = drive(host, port, cookies, first, last, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    if not records:
+        sys.exit('No requests completed')
+    measured_from = min(started for _, _, started, _ in records) + args.warmup
+    records = [record for record in records if record[2] >= measured_from]
+    results = {'all': summarize(records, args.duration)}
+    for name in SCENARIOS:
+        results[name] = summarize([record for record in records if record[0] == name], args.duration)
+
+    print(f"{'scenario':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for name, result in results.items():
+        if result['count']:
+            print(f"{name:<22} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                  f"{result['p99_ms']:>8.1f}  {result['statuses']}")
+    print(f"Results written to {write_results('load', params, results, args.output)}")
+
+if __name__ == '__main__':
+    main()
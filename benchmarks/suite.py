@@ -0,0 +1,111 @@
+"""
+Micro-benchmark suite over a generated multi-year calendar, written to a JSON
+results file for comparing runs.
+
+Covers the overlap check, event serialization, rate limiter checks and
+welcome email rendering. Run from the repository root:
+
+    python -m benchmarks.suite --years 50 --output before.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import random
+from datetime import timedelta
+from benchmarks.common import create_bench_app, login_client, remote_addr, measure, write_results
+
+def benchmarks(app, rng, scale):
+    """Yield (name, fn, repeat, operations per call) for every benchmark"""
+    from src.availability import availability
+    from src.config import Config
+    from src.database import db
+    from src.models import Booking
+    from src.rate_limiting import ExponentialBackoffLimiter, MemoryStorage
+    from src.routes.api import build_events
+    from src.utils.json_stream import dumps, iter_json_array
+    from src.utils.templates import compile_template
+
+    first, last = db.session.execute(db.select(db.func.min(Booking.start_date), db.func.max(Booking.end_date))).one()
+    span_days = (last - first).days
+
+    def probe(nights):
+        start = first + timedelta(days=rng.randrange(span_days))
+        return start, start + timedelta(days=nights)
+
+    availability.sync()
+    yield 'overlap_check_index', lambda i: availability.index.overlaps(*probe(3)), 5000 * scale, 1
+    yield 'overlap_check_synced', lambda i: availability.is_free(*probe(3)), 1000 * scale, 1
+    yield 'first_free_7_nights', lambda i: availability.first_free(probe(0)[0].date(), 7), 1000 * scale, 1
+
+    def encode_month(i):
+        start, end = probe(35)
+        return dumps(list(build_events(None, start, end)))
+
+    yield 'events_encode_month', encode_month, 200 * scale, 1
+    yield 'events_encode_all', lambda i: b''.join(iter_json_array(build_events(None, None, None))), 5 * scale, 1
+    yield 'events_encode_all_slim', \
+        lambda i: b''.join(iter_json_array(build_events(None, None, None, slim=True))), 5 * scale, 1
+
+    limiter = ExponentialBackoffLimiter(MemoryStorage())
+    ips = [f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}' for n in range(10000)]
+
+    def check_batch(i):
+        check = limiter.check_rate_limit
+        for n in range(1000):
+            check(ips[(i * 1000 + n) % len(ips)])
+
+    yield 'limiter_check', check_batch, 50 * scale, 1000
+
+    template = compile_template(Config.WELCOME_EMAIL_TEMPLATE)
+    bookings = Booking.query.limit(1000).all()
+
+    def render_batch(i):
+        for booking in bookings:
+            template.render(booking)
+
+    yield 'welcome_template_render', render_batch, 20 * scale, len(bookings)
+
+    client = login_client(app)
+
+    def get(url):
+        def fetch(i):
+            # Large payloads stream, and are only cached once fully read
+            with client.get(url, environ_base=remote_addr()) as response:
+                assert response.status_code == 200
+                response.get_data()
+        return fetch
+
+    yield 'http_events_cached', get('/api/bookings'), 200 * scale, 1
+    yield 'http_availability_cached', get('/api/availability'), 200 * scale, 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--years', type=float, default=30, help='years of generated history (default 30)')
+    parser.add_argument('--scale', type=int, default=1, help='multiply every repeat count by this')
+    parser.add_argument('--only', action='append', help='run benchmarks whose name contains this (repeatable)')
+    parser.add_argument('--output', help='results file (default instance/benchmarks/suite-<time>.json)')
+    args = parser.parse_args()
+
+    from src.seed import seed_calendar
+
+    app = create_bench_app()
+    rng = random.Random(1)
+    results = {}
+    with app.app_context():
+        bookings, blocked = seed_calendar(years=args.years, seed=1)
+        print(f'Seeded {bookings} bookings and {blocked} blocked dates over {args.years:g} years')
+        print(f"{'benchmark':<26} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>12}")
+        for name, fn, repeat, operations in benchmarks(app, rng, args.scale):
+            if args.only and not any(part in name for part in args.only):
+                continue
+            fn(0)  # Warm caches and imports outside the measurement
+            p50, p95 = measure(fn, repeat=repeat)
+            ops_per_sec = operations * 1000 / p50 if p50 else None
+            results[name] = {'p50_ms': p50 / operations, 'p95_ms': p95 / operations,
+                             'ops_per_sec': ops_per_sec, 'repeat': repeat, 'batch': operations}
+            print(f'{name:<26} {p50 / operations:>10.4f} {p95 / operations:>10.4f} {ops_per_sec or 0:>12,.0f}')
+
+    params = {'years': args.years, 'scale': args.scale, 'bookings': bookings, 'blocked_dates': blocked}
+    print(f"Results written to {write_results('suite', params, results, args.output)}")
+
+if __name__ == '__main__':
+    main()
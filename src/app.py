@@ -2,13 +2,24 @@ import logging
 from flask import Flask, request, redirect, url_for
 from flask_login import LoginManager
 from src.config import Config
-from src.database import db
-from src.models import User
+from src.database import db, create_missing_indexes, configure_sqlite
+from src.migrations import migrate_epoch_days, migrate_epoch_days_command
+from src.seed import seed_command
+from src.availability import availability, ensure_version_row
+from src.response_cache import events_cache
+from src.summary import dashboard_summary
+from src.rate_limiting import limiter
+from src.metrics import metrics
+from src.profiling import profiler
+from src.identity import identity_cache, ensure_users_version_row
+from src.settings import settings
+from src.utils.templates import compile_template, TemplateError
 login_manager = LoginManager()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    # Served from memory, so authenticated requests don't query the user table
+    return identity_cache.get(int(user_id))
 
 def create_app():
     app = Flask(__name__)
@@ -29,17 +40,37 @@ def create_app():
     app.logger.info('Booking application startup')
 
     db.init_app(app)
+    limiter.init_app(app)
+    # Registered first so request timing covers every other before_request hook
+    metrics.init_app(app)
+    profiler.init_app(app)
     with app.app_context():
+        configure_sqlite(db.engine, app.config['SQLITE_PRAGMAS'])
+        metrics.instrument_engine(db.engine)
         db.create_all()
+        filled = migrate_epoch_days(db.engine)
+        if filled:
+            app.logger.info(f'Back-filled epoch days for {filled} rows')
+        create_missing_indexes()
+        ensure_version_row()
+        ensure_users_version_row()
+        availability.rebuild()
+        # Versions restart with a new database, so drop anything cached from another
+        events_cache.clear()
+        dashboard_summary.clear()
+        identity_cache.invalidate()
         
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     
-    # Load welcome template from database if available
+    # Settings live in the database so every worker sees the same values
     with app.app_context():
-        admin = db.session.query(User).filter_by(username='admin').first()
-        if admin and admin.welcome_template:
-            app.config['WELCOME_EMAIL_TEMPLATE'] = admin.welcome_template
+        settings.clear()
+        settings.import_legacy()
+        try:
+            compile_template(settings.get('welcome_template'))
+        except TemplateError as e:
+            app.logger.warning(f"Saved welcome template is invalid, the default will be used: {str(e)}")
     
     # Custom unauthorized handler to redirect admin routes to admin login
     @login_manager.unauthorized_handler
@@ -48,6 +79,21 @@ def create_app():
             return redirect(url_for('auth.admin_login'))
         return redirect(url_for('auth.login'))
 
+    from src.utils.smtp_pool import smtp_pool
+    smtp_pool.configure(app.config['SMTP_POOL_MAX_IDLE'], app.config['SMTP_POOL_IDLE_TIMEOUT'],
+                        app.config['SMTP_POOL_NOOP_INTERVAL'])
+
+    from src.utils.outbox import outbox_worker, outbox_worker_command
+    app.cli.add_command(outbox_worker_command)
+    app.cli.add_command(migrate_epoch_days_command)
+    app.cli.add_command(seed_command)
+
+    # Start delivering queued email (including anything left from before a
+    # restart) once this process begins serving requests
+    @app.before_request
+    def start_outbox_worker():
+        outbox_worker.ensure_running(app)
+
     # Register blueprints
     from src.routes.auth import bp as auth_bp
     app.register_blueprint(auth_bp)
@@ -70,6 +116,9 @@ def create_app():
     except ImportError:
         app.logger.warning('API blueprint not available')
 
+    from src.routes.metrics import bp as metrics_bp
+    app.register_blueprint(metrics_bp)
+
     return app
 
 if __name__ == '__main__':
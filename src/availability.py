@@ -0,0 +1,380 @@
+import bisect
+import threading
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import event
+from src.database import db
+from src.models import Booking, BlockedDate, DataVersion, ChangeLog
+
+TRACKED_MODELS = {Booking: 'booking', BlockedDate: 'blocked'}
+
+# How many versions of history the change log keeps for resuming streams
+CHANGE_LOG_VERSIONS = 1000
+
+def normalize(value):
+    """Drop any UTC offset so all ranges compare as naive calendar datetimes"""
+    return value.replace(tzinfo=None)
+
+class IntervalIndex:
+    """Sorted index of occupied ranges, merged into disjoint blocks for lookups
+
+    Ranges are closed: [start, end] conflicts with anything that touches it,
+    matching the overlap rules the booking routes have always enforced.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._ranges = []    # (start, end, key) for every range, sorted
+        self._by_key = {}    # key -> (start, end)
+        self._starts = []    # merged block starts, sorted
+        self._ends = []      # merged block ends, parallel to _starts
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __contains__(self, key):
+        return key in self._by_key
+
+    def load(self, ranges):
+        """Replace the index contents with (start, end, key) tuples"""
+        self.clear()
+        self._ranges = sorted((normalize(start), normalize(end), key) for start, end, key in ranges)
+        self._by_key = {key: (start, end) for start, end, key in self._ranges}
+        self._starts, self._ends = self._merge(self._ranges)
+
+    def add(self, start, end, key):
+        start, end = normalize(start), normalize(end)
+        if key in self._by_key:
+            self.remove(key)
+        bisect.insort(self._ranges, (start, end, key))
+        self._by_key[key] = (start, end)
+
+        # Blocks lo..hi-1 touch the new range and collapse into a single block
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def remove(self, key):
+        if key not in self._by_key:
+            return
+        start, end = self._by_key.pop(key)
+        del self._ranges[bisect.bisect_left(self._ranges, (start, end, key))]
+
+        # Re-merge only the ranges that made up the block this one belonged to
+        block = bisect.bisect_right(self._starts, start) - 1
+        block_start, block_end = self._starts[block], self._ends[block]
+        lo = bisect.bisect_left(self._ranges, block_start, key=lambda r: r[0])
+        hi = bisect.bisect_right(self._ranges, block_end, key=lambda r: r[0])
+        starts, ends = self._merge(self._ranges[lo:hi])
+        self._starts[block:block + 1] = starts
+        self._ends[block:block + 1] = ends
+
+    def overlaps(self, start, end):
+        """Return True if [start, end] touches any indexed range"""
+        start, end = normalize(start), normalize(end)
+        block = bisect.bisect_right(self._starts, end) - 1
+        return block >= 0 and self._ends[block] >= start
+
+    def blocks(self):
+        """Return the merged, disjoint (start, end) blocks in order"""
+        return list(zip(self._starts, self._ends))
+
+    def blocks_between(self, start, end):
+        """Return the merged blocks touching [start, end]"""
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        return list(zip(self._starts[lo:hi], self._ends[lo:hi]))
+
+    def span(self, key):
+        """Return the (start, end) indexed under `key`, or None"""
+        return self._by_key.get(key)
+
+    @staticmethod
+    def _merge(ranges):
+        starts, ends = [], []
+        for start, end, _ in ranges:
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        return starts, ends
+
+def year_offset(day):
+    return day.toordinal() - date(day.year, 1, 1).toordinal()
+
+def days_in_year(year):
+    return date(year + 1, 1, 1).toordinal() - date(year, 1, 1).toordinal()
+
+class DayBitmap:
+    """Occupied calendar days packed into one int bitset per year
+
+    Bit n of a year's int is set when day n of that year (0 = January 1st) is
+    occupied. Range checks, gap searches and counts are then a handful of
+    shifts, masks and bit_count() calls per year touched.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._years = {}  # year -> int bitset
+        self._order = []  # keys of _years, kept sorted for next_occupied
+
+    def load(self, ranges):
+        """Replace the bitmap contents with inclusive (start, end) date ranges"""
+        self.clear()
+        for start, end in ranges:
+            self.set(start, end)
+
+    def _segments(self, start, end):
+        """Split inclusive dates [start, end] into (year, first_bit, mask) per year"""
+        for year in range(start.year, end.year + 1):
+            first = year_offset(start) if year == start.year else 0
+            last = year_offset(end) if year == end.year else days_in_year(year) - 1
+            yield year, first, ((1 << (last - first + 1)) - 1) << first
+
+    def set(self, start, end):
+        for year, _, mask in self._segments(start, end):
+            if year not in self._years:
+                bisect.insort(self._order, year)
+            self._years[year] = self._years.get(year, 0) | mask
+
+    def unset(self, start, end):
+        for year, _, mask in self._segments(start, end):
+            bits = self._years.get(year, 0) & ~mask
+            if bits:
+                self._years[year] = bits
+            elif self._years.pop(year, None) is not None:
+                self._order.pop(bisect.bisect_left(self._order, year))
+
+    def any(self, start, end):
+        """Return True if any day in [start, end] is occupied"""
+        return any(self._years.get(year, 0) & mask for year, _, mask in self._segments(start, end))
+
+    def count(self, start, end):
+        """Return the number of occupied days in [start, end]"""
+        return sum((self._years.get(year, 0) & mask).bit_count() for year, _, mask in self._segments(start, end))
+
+    def next_occupied(self, day):
+        """Return the first occupied day on or after `day`, or None"""
+        for year in self._order[bisect.bisect_left(self._order, day.year):]:
+            first = year_offset(day) if year == day.year else 0
+            bits = self._years[year] >> first
+            if bits:
+                return date(year, 1, 1) + timedelta(days=first + (bits & -bits).bit_length() - 1)
+        return None
+
+    def next_free(self, day):
+        """Return the first unoccupied day on or after `day`"""
+        while True:
+            first = year_offset(day)
+            bits = ~(self._years.get(day.year, 0) >> first)
+            free = first + (bits & -bits).bit_length() - 1
+            if free < days_in_year(day.year):
+                return date(day.year, 1, 1) + timedelta(days=free)
+            day = date(day.year + 1, 1, 1)
+
+    def first_gap(self, after, days):
+        """Return the first day on or after `after` starting `days` free days in a row"""
+        day = self.next_free(after)
+        while True:
+            occupied = self.next_occupied(day)
+            if occupied is None or (occupied - day).days >= days:
+                return day
+            day = self.next_free(occupied)
+
+class Availability:
+    """Per-process interval index of bookings and blocked dates
+
+    The index is tagged with the DataVersion it reflects. Changes committed by
+    this process are applied in place; anything else (another gunicorn worker,
+    bulk statements) moves the version on and triggers a rebuild on next use.
+    """
+
+    def __init__(self):
+        self.index = IntervalIndex()
+        self.days = DayBitmap()
+        self.version = None
+        self._lock = threading.Lock()
+
+    def rebuild(self, version=None):
+        """Reload every occupied range from the database, tagged with `version` if it was just read"""
+        if version is None:
+            version = current_version()
+        ranges = []
+        for model, kind in TRACKED_MODELS.items():
+            rows = db.session.execute(db.select(model.id, model.start_date, model.end_date))
+            ranges.extend((start, end, (kind, id)) for id, start, end in rows)
+        with self._lock:
+            self.index.load(ranges)
+            self.days.load((start.date(), end.date()) for start, end in self.index.blocks())
+            self.version = version
+
+    def sync(self):
+        """Rebuild if the database has changed since the index was built"""
+        version = current_version()
+        if version != self.version:
+            self.rebuild(version)
+
+    def is_free(self, start_date, end_date):
+        """Return True if no booking or blocked date touches [start_date, end_date]"""
+        self.sync()
+        with self._lock:
+            return not self.index.overlaps(start_date, end_date)
+
+    def first_free(self, after, nights):
+        """Return the first arrival date on or after `after` with `nights` free nights"""
+        self.sync()
+        with self._lock:
+            # Ranges are inclusive, so a stay needs its departure day free too
+            return self.days.first_gap(after, nights + 1)
+
+    def monthly_occupancy(self, year):
+        """Return the number of occupied days in each month of `year`"""
+        self.sync()
+        months = [date(year, month, 1) for month in range(1, 13)] + [date(year + 1, 1, 1)]
+        with self._lock:
+            return [self.days.count(start, end - timedelta(days=1)) for start, end in zip(months, months[1:])]
+
+    def apply(self, changes, version_before, version_after):
+        """Apply changes this process just committed, if the index was current"""
+        with self._lock:
+            if self.version != version_before:
+                # Missed someone else's change in between; sync() will rebuild
+                return
+            spans = []
+            for action, key, start, end in changes:
+                if key in self.index:
+                    spans.append(self.index.span(key))
+                if action == 'remove':
+                    self.index.remove(key)
+                else:
+                    start, end = normalize(start), normalize(end)
+                    self.index.add(start, end, key)
+                    spans.append((start, end))
+            for start, end in spans:
+                self._repaint(start, end)
+            self.version = version_after
+
+    def _repaint(self, start, end):
+        """Redraw the days of [start, end] from the merged blocks touching it"""
+        first, last = start.date(), end.date()
+        self.days.unset(first, last)
+        touching = self.index.blocks_between(datetime.combine(first, time.min), datetime.combine(last, time.max))
+        for block_start, block_end in touching:
+            self.days.set(max(block_start.date(), first), min(block_end.date(), last))
+
+def ensure_version_row():
+    if db.session.get(DataVersion, 1) is None:
+        db.session.add(DataVersion(id=1, version=0))
+        db.session.commit()
+
+def current_version():
+    return db.session.execute(db.select(DataVersion.version).filter_by(id=1)).scalar()
+
+def lock_calendar():
+    """
+    Hold the calendar write lock for the rest of the session's transaction
+
+    Call this before checking availability for a new range, with nothing
+    written yet in the transaction. On SQLite it starts the transaction with
+    BEGIN IMMEDIATE, so a writer in another worker waits for our commit (up to
+    busy_timeout) instead of interleaving its own check and insert with ours.
+    Other databases lock the DataVersion row every calendar change updates.
+    Readers are never blocked.
+
+    This serializes every booking and blocked date write, including ones
+    whose dates don't overlap. SQLite only ever allows one writer at a time,
+    so the lock adds just the (in-memory) availability check to each write's
+    turn rather than a new bottleneck.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    else:
+        connection.execute(db.select(DataVersion.version).filter_by(id=1).with_for_update())
+
+# SQLITE_BUSY and SQLITE_LOCKED, and PostgreSQL's lock_not_available
+LOCK_ERROR_CODES = {5, 6}
+LOCK_ERROR_SQLSTATES = {'55P03'}
+
+def calendar_busy(error):
+    """Return True if the OperationalError `error` means the write lock wasn't granted in time"""
+    orig = getattr(error, 'orig', None)
+    code = getattr(orig, 'sqlite_errorcode', None)
+    if code is not None:
+        # Extended result codes keep the primary code in the low byte
+        return code & 0xff in LOCK_ERROR_CODES
+    return getattr(orig, 'pgcode', None) in LOCK_ERROR_SQLSTATES or 'database is locked' in str(orig)
+
+def bump_version(connection):
+    """Increment the data version inside the caller's transaction and return it"""
+    bump = db.update(DataVersion).filter_by(id=1).values(version=DataVersion.version + 1)
+    if connection.dialect.update_returning:
+        # One round trip instead of an UPDATE and a SELECT
+        return connection.execute(bump.returning(DataVersion.version)).scalar()
+    connection.execute(bump)
+    return connection.execute(db.select(DataVersion.version).filter_by(id=1)).scalar()
+
+def record_version(session, version):
+    first_before, _ = session.info.get('availability_versions', (version - 1, None))
+    session.info['availability_versions'] = (first_before, version)
+
+def log_changes(connection, version, entries):
+    """Write (action, kind, row_id) entries to the change log and trim old history"""
+    connection.execute(db.insert(ChangeLog), [
+        {'version': version, 'action': action, 'kind': kind, 'row_id': row_id} for action, kind, row_id in entries
+    ])
+    if version % 100 == 0:
+        connection.execute(db.delete(ChangeLog).filter(ChangeLog.version <= version - CHANGE_LOG_VERSIONS))
+
+@event.listens_for(db.session, 'after_flush')
+def track_changes(session, flush_context):
+    changes = []
+    for instance in session.deleted:
+        kind = TRACKED_MODELS.get(type(instance))
+        if kind:
+            changes.append(('remove', (kind, instance.id), None, None))
+    for instance in list(session.new) + list(session.dirty):
+        kind = TRACKED_MODELS.get(type(instance))
+        if kind and (instance in session.new or session.is_modified(instance)):
+            changes.append(('add', (kind, instance.id), instance.start_date, instance.end_date))
+    if changes:
+        session.info.setdefault('availability_changes', []).extend(changes)
+        version = bump_version(session.connection())
+        record_version(session, version)
+        log_changes(session.connection(), version, [(action, *key) for action, key, _, _ in changes])
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_bulk_statements(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE bypass the flush, so just invalidate every index
+    if orm_execute_state.is_select or orm_execute_state.bind_mapper is None:
+        return
+    if orm_execute_state.bind_mapper.class_ in TRACKED_MODELS:
+        session = orm_execute_state.session
+        session.info['availability_stale'] = True
+        version = bump_version(session.connection())
+        record_version(session, version)
+        log_changes(session.connection(), version, [('reset', None, None)])
+
+@event.listens_for(db.session, 'after_commit')
+def apply_changes(session):
+    changes = session.info.pop('availability_changes', [])
+    versions = session.info.pop('availability_versions', None)
+    stale = session.info.pop('availability_stale', False)
+    if versions and not stale:
+        availability.apply(changes, *versions)
+
+@event.listens_for(db.session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('availability_changes', None)
+    session.info.pop('availability_versions', None)
+    session.info.pop('availability_stale', None)
+
+availability = Availability()
@@ -7,9 +7,71 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'change-me-in-production')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///bookings.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Applied to every SQLite connection. WAL keeps readers from blocking on
+    # writers across gunicorn workers, and busy_timeout (ms) makes writers
+    # queue for the lock rather than fail.
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '5000')),
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,  # KiB
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        # sqlite3 keeps this many prepared statements per connection; other
+        # drivers reject the argument
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {'cached_statements': 256}
+    if ':memory:' not in SQLALCHEMY_DATABASE_URI:
+        SQLALCHEMY_ENGINE_OPTIONS.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+            max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+        )
     DEFAULT_ACCESS_CODE = os.getenv('DEFAULT_ACCESS_CODE', '1234')
     ADMIN_ACCESS_CODE = os.getenv('ADMIN_ACCESS_CODE', 'admin1234')
     
+    # Rate limiter state: 'memory' (per process) or 'sqlite:///path' (shared by
+    # every gunicorn worker on the host)
+    RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'sqlite:///instance/rate_limits.db')
+    # Upper bound on tracked IPs, and how long an IP's violation history is
+    # kept after its last request or ban ends
+    RATE_LIMIT_MAX_IPS = int(os.getenv('RATE_LIMIT_MAX_IPS', '100000'))
+    RATE_LIMIT_IDLE_TTL = int(os.getenv('RATE_LIMIT_IDLE_TTL', '3600'))
+    
+    # Request, email and SQL metrics for /metrics: 'memory' (this process only)
+    # or 'sqlite:///path', where each worker publishes its numbers every
+    # METRICS_FLUSH_INTERVAL seconds. Scrapers can authenticate with
+    # "Authorization: Bearer $METRICS_TOKEN" instead of an admin session.
+    METRICS_STORAGE = os.getenv('METRICS_STORAGE', 'sqlite:///instance/metrics.db')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    # SQL statements slower than this are logged with their endpoint (0 turns
+    # the log off). In debug, responses also carry a Server-Timing header with
+    # the request's query count and database time.
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+
+    # Admin requests sent with an "X-Profile: 1" header (or "memory" to trace
+    # allocations too), or a ?_profile=1 query parameter, are run under cProfile
+    # and saved to PROFILING_DIR for download from /admin/profiles. Only a
+    # PROFILING_SAMPLE_RATE share of them is profiled, one at a time per worker,
+    # and the oldest files go once the directory passes PROFILING_MAX_BYTES.
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_DIR = os.getenv('PROFILING_DIR', 'instance/profiles')
+    PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '1'))
+    PROFILING_MAX_BYTES = int(os.getenv('PROFILING_MAX_BYTES', str(50 * 1024 * 1024)))
+    
+    # Rows per page in the admin bookings and blocked dates tables
+    ADMIN_PAGE_SIZE = 50
+
+    # Open calendars follow /api/changes: how often each stream checks for
+    # changes, and how long before it closes and the browser reconnects
+    CHANGES_POLL_INTERVAL = float(os.getenv('CHANGES_POLL_INTERVAL', '2'))
+    CHANGES_STREAM_SECONDS = int(os.getenv('CHANGES_STREAM_SECONDS', '300'))
+    # Each open stream holds a worker thread; keep this well below gunicorn's --threads
+    CHANGES_MAX_STREAMS = int(os.getenv('CHANGES_MAX_STREAMS', '4'))
+    
     # Email configuration
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.example.com')
     SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
@@ -17,8 +79,24 @@ class Config:
     SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
     SMTP_FROM_EMAIL = os.getenv('SMTP_FROM_EMAIL', 'bookings@example.com')
     OWNER_EMAIL = os.getenv('OWNER_EMAIL', 'owner@example.com')
+    SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
     SEND_EMAILS = os.getenv('SEND_EMAILS', 'true').lower() == 'true'
     
+    # Authenticated SMTP sessions kept open between sends, per server config
+    SMTP_POOL_MAX_IDLE = 2
+    SMTP_POOL_IDLE_TIMEOUT = int(os.getenv('SMTP_POOL_IDLE_TIMEOUT', '60'))
+    SMTP_POOL_NOOP_INTERVAL = 10
+    
+    # Email outbox delivery. Disable the per-process thread when running
+    # `flask outbox-worker` as a separate process instead.
+    OUTBOX_WORKER_THREAD = os.getenv('OUTBOX_WORKER_THREAD', 'true').lower() == 'true'
+    OUTBOX_POLL_INTERVAL = int(os.getenv('OUTBOX_POLL_INTERVAL', '30'))
+    OUTBOX_BATCH_SIZE = 20
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+    OUTBOX_RETRY_BASE_SECONDS = 30
+    OUTBOX_RETRY_MAX_SECONDS = 3600
+    OUTBOX_LEASE_SECONDS = 120
+    
     # Default welcome email template with placeholders
     WELCOME_EMAIL_TEMPLATE = os.getenv('WELCOME_EMAIL_TEMPLATE', """
     <h2>Thank you for your booking, {guest_name}!</h2>
@@ -1,3 +1,33 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
 db = SQLAlchemy()
+
+def create_missing_indexes():
+    """Create indexes declared on models whose tables already existed"""
+    # create_all() skips existing tables entirely, including any indexes added later
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+def configure_sqlite(engine, pragmas):
+    """
+    Apply `pragmas` to every new connection of a SQLite engine
+
+    WAL lets readers carry on while a worker writes, and busy_timeout makes a
+    second writer wait for the lock instead of failing with "database is locked".
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
@@ -0,0 +1,82 @@
+import threading
+from flask_login import UserMixin
+from sqlalchemy import event
+from src.database import db
+from src.models import DataVersion, User
+
+class Identity(UserMixin):
+    """Detached, read-only copy of the User fields needed to authorize a request"""
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f'<Identity {self.username}>'
+
+# DataVersion row counting User changes; row 1 is the calendar's
+USERS_VERSION_ID = 2
+
+def ensure_users_version_row():
+    if db.session.get(DataVersion, USERS_VERSION_ID) is None:
+        db.session.add(DataVersion(id=USERS_VERSION_ID, version=0))
+        db.session.commit()
+
+def bump_users_version(connection):
+    connection.execute(db.update(DataVersion).filter_by(id=USERS_VERSION_ID)
+                       .values(version=DataVersion.version + 1))
+
+class IdentityCache:
+    """
+    Per-process cache of logged-in identities for Flask-Login's user_loader
+
+    The app only has the guest and admin rows, so this stays tiny. Every
+    User write bumps a DataVersion row in the same transaction, and entries
+    are only served while that version is unchanged, so a role change made
+    by any worker applies to the very next request. A lookup costs one
+    primary-key read of the version instead of loading the user.
+    """
+
+    def __init__(self):
+        self._entries = {}  # user_id -> (identity, version)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the Identity for `user_id`, or None if there is no such user"""
+        version = db.session.execute(
+            db.select(DataVersion.version).filter_by(id=USERS_VERSION_ID)
+        ).scalar()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+
+        row = db.session.execute(
+            db.select(User.id, User.username, User.is_admin).filter_by(id=user_id)
+        ).one_or_none()
+        if row is None:
+            return None
+        identity = Identity(*row)
+        with self._lock:
+            self._entries[user_id] = (identity, version)
+        return identity
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+identity_cache = IdentityCache()
+
+@event.listens_for(db.session, 'after_flush')
+def track_user_changes(session, flush_context):
+    if any(isinstance(instance, User) for instance in (*session.new, *session.dirty, *session.deleted)):
+        bump_users_version(session.connection())
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_bulk_user_statements(orm_execute_state):
+    # Bulk UPDATE/DELETE bypass the flush
+    if orm_execute_state.is_select or orm_execute_state.bind_mapper is None:
+        return
+    if orm_execute_state.bind_mapper.class_ is User:
+        bump_users_version(orm_execute_state.session.connection())
@@ -0,0 +1,303 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Type, help text and buckets for every metric the app records
+METRICS = {
+    'homestay_http_requests_total': ('counter', 'HTTP responses by endpoint, method and status', None),
+    'homestay_http_request_duration_seconds': ('histogram', 'Time to build a response, by endpoint', DEFAULT_BUCKETS),
+    'homestay_http_requests_in_flight': ('gauge', 'Requests currently being handled', None),
+    'homestay_rate_limit_rejections_total': ('counter', 'API requests refused by the rate limiter', None),
+    'homestay_email_send_duration_seconds': ('histogram', 'Time to send a batch of emails, retries included', DEFAULT_BUCKETS),
+    'homestay_email_retries_total': ('counter', 'SMTP attempts after the first for a batch of emails', None),
+    'homestay_emails_total': ('counter', 'Emails handed to the SMTP server or given up on, by result', None),
+    'homestay_db_query_duration_seconds': ('histogram', 'Time spent executing SQL statements, by statement type', SQL_BUCKETS),
+    'homestay_db_queries_per_request': ('histogram', 'SQL statements run while building a response, by endpoint', QUERY_COUNT_BUCKETS),
+}
+
+# A worker's gauges are dropped once it hasn't published for this long
+GAUGE_TTL = 60
+# Snapshot row holding the counters and histograms of workers that have exited
+BASELINE = 'baseline'
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def add_snapshot(totals, snapshot, gauges=True):
+    """Add a published snapshot into {(name, labels): value} totals"""
+    for name, labels, value in snapshot:
+        if name not in METRICS or not gauges and METRICS[name][0] == 'gauge':
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if isinstance(value, list):
+            total = totals.setdefault(key, [0] * len(value))
+            totals[key] = [a + b for a, b in zip(total, value)]
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Metrics:
+    """
+    Per-process counters, gauges and histograms in the Prometheus text format
+
+    Each gunicorn worker records into its own copy and publishes a snapshot
+    to a shared SQLite file every `flush_interval` seconds; the /metrics page
+    adds up every worker's latest snapshot. With 'memory' storage only this
+    process's numbers are reported.
+
+    Snapshots are keyed by pid plus a random token, so a new worker reusing a
+    pid doesn't overwrite its predecessor. Once a worker's process is gone,
+    its counters and histograms are folded into a baseline row rather than
+    dropped, so the summed counters never go down (which Prometheus would
+    read as a reset).
+    """
+
+    def __init__(self):
+        self.path = None
+        self.flush_interval = 5
+        self.slow_query_seconds = None
+        self.logger = None
+        self._pid = os.getpid()
+        self._worker = f'{self._pid}:{secrets.token_hex(4)}'
+        self._published_at = 0
+        self._values = {}  # (name, labels) -> number, or [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        storage = app.config['METRICS_STORAGE']
+        if storage.startswith('sqlite:///'):
+            self.path = storage[len('sqlite:///'):]
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        elif storage == 'memory':
+            self.path = None
+        else:
+            raise ValueError(f'Unsupported metrics storage: {storage}')
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        slow_query_ms = app.config['SLOW_QUERY_MS']
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms > 0 else None
+        self.logger = app.logger
+
+        app.before_request(self.start_request)
+        app.after_request(self.record_response)
+        app.teardown_request(self.finish_request)
+
+    def _entries(self):
+        # A worker forked from a process that already recorded starts from zero
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._worker = f'{self._pid}:{secrets.token_hex(4)}'
+            self._values = {}
+            self._published_at = 0
+        return self._values
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            values = self._entries()
+            values[key] = values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            values = self._entries()
+            entry = values.get(key)
+            if entry is None:
+                entry = values[key] = [0] * (len(buckets) + 1) + [0.0]
+            entry[bisect_left(buckets, value)] += 1
+            entry[-1] += value
+
+    def start_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_in_flight = True
+        g._sql_queries = 0
+        g._sql_seconds = 0.0
+        self.inc('homestay_http_requests_in_flight')
+
+    def record_response(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            labels = {'blueprint': request.blueprint or '', 'endpoint': request.endpoint or 'none',
+                      'method': request.method}
+            self.observe('homestay_http_request_duration_seconds', elapsed, **labels)
+            self.inc('homestay_http_requests_total', status=str(response.status_code), **labels)
+            queries = g.get('_sql_queries', 0)
+            self.observe('homestay_db_queries_per_request', queries, endpoint=labels['endpoint'])
+            if current_app.debug:
+                response.headers['Server-Timing'] = (f'db;dur={g.get("_sql_seconds", 0.0) * 1000:.1f};'
+                                                     f'desc="{queries} queries", app;dur={elapsed * 1000:.1f}')
+        return response
+
+    def finish_request(self, exc=None):
+        if g.pop('_metrics_in_flight', False):
+            self.inc('homestay_http_requests_in_flight', -1)
+        self.maybe_publish()
+
+    def instrument_engine(self, engine):
+        """
+        Time every SQL statement `engine` runs
+
+        Statements are also counted against the current request, and any
+        slower than SLOW_QUERY_MS is logged with the endpoint that ran it.
+        """
+        from sqlalchemy import event
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def finish_query(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info['metrics_query_started'].pop()
+            kind = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'other'
+            if kind not in ('select', 'insert', 'update', 'delete'):
+                kind = 'other'
+            elapsed = time.perf_counter() - started
+            self.observe('homestay_db_query_duration_seconds', elapsed, statement=kind)
+            in_request = has_request_context()
+            if in_request:
+                g._sql_queries = g.get('_sql_queries', 0) + 1
+                g._sql_seconds = g.get('_sql_seconds', 0.0) + elapsed
+            if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds and self.logger:
+                endpoint = (request.endpoint or request.path) if in_request else 'background task'
+                sql = ' '.join(statement.split())
+                self.logger.warning(f'Slow query ({elapsed * 1000:.1f} ms) in {endpoint}: {sql[:1000]}')
+
+    def snapshot(self):
+        with self._lock:
+            return [[name, list(labels), value if isinstance(value, (int, float)) else list(value)]
+                    for (name, labels), value in self._entries().items()]
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS metric_snapshots ('
+                               'worker TEXT PRIMARY KEY, pid INTEGER NOT NULL, snapshot TEXT NOT NULL, '
+                               'published_at REAL NOT NULL)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def publish(self):
+        """Write this process's snapshot to the shared storage"""
+        if self.path is None:
+            return
+        now = time.time()
+        self._published_at = now
+        snapshot = json.dumps(self.snapshot())
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('INSERT OR REPLACE INTO metric_snapshots (worker, pid, snapshot, published_at) '
+                               'VALUES (?, ?, ?, ?)', (self._worker, os.getpid(), snapshot, now))
+            self._retire_exited_workers(connection, now)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _retire_exited_workers(self, connection, now):
+        """Fold the counters of workers whose process has exited into the baseline row"""
+        quiet = connection.execute('SELECT worker, pid, snapshot FROM metric_snapshots '
+                                   'WHERE worker != ? AND published_at < ?', (BASELINE, now - GAUGE_TTL)).fetchall()
+        exited = [(worker, snapshot) for worker, pid, snapshot in quiet if not process_exists(pid)]
+        if not exited:
+            return
+        totals = {}
+        row = connection.execute('SELECT snapshot FROM metric_snapshots WHERE worker = ?', (BASELINE,)).fetchone()
+        if row is not None:
+            add_snapshot(totals, json.loads(row[0]))
+        for worker, snapshot in exited:
+            add_snapshot(totals, json.loads(snapshot), gauges=False)
+            connection.execute('DELETE FROM metric_snapshots WHERE worker = ?', (worker,))
+        baseline = [[name, [list(pair) for pair in labels], value] for (name, labels), value in totals.items()]
+        connection.execute('INSERT OR REPLACE INTO metric_snapshots (worker, pid, snapshot, published_at) '
+                           'VALUES (?, 0, ?, ?)', (BASELINE, json.dumps(baseline), now))
+
+    def maybe_publish(self):
+        if self.path is not None and time.time() - self._published_at >= self.flush_interval:
+            try:
+                self.publish()
+            except sqlite3.Error:
+                # Metrics must never fail a request; the next flush tries again
+                self._published_at = time.time()
+
+    def collect(self):
+        """Return {(name, labels): value} summed across every worker"""
+        if self.path is None:
+            snapshots = [(self.snapshot(), time.time())]
+        else:
+            self.publish()
+            rows = self._connection().execute('SELECT snapshot, published_at FROM metric_snapshots').fetchall()
+            snapshots = [(json.loads(snapshot), published_at) for snapshot, published_at in rows]
+
+        totals = {}
+        fresh_after = time.time() - GAUGE_TTL
+        for snapshot, published_at in snapshots:
+            add_snapshot(totals, snapshot, gauges=published_at >= fresh_after)
+        return totals
+
+    def render(self, gauges=None):
+        """
+        Return every metric in the Prometheus text exposition format
+
+        `gauges` maps extra gauge names to (help, value) read at scrape time.
+        """
+        totals = self.collect()
+        lines = []
+        for name, (kind, help, buckets) in METRICS.items():
+            series = sorted((labels, value) for (metric, labels), value in totals.items() if metric == name)
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in series:
+                if kind != 'histogram':
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip((*buckets, '+Inf'), value[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(value[-1])}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        for name, (help, value) in (gauges or {}).items():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+        if self.path is not None:
+            self._connection().execute('DELETE FROM metric_snapshots')
+
+metrics = Metrics()
@@ -0,0 +1,50 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect
+from src.database import db
+from src.models import Booking, BlockedDate
+from src.models.epoch_day import epoch_day
+
+# Indexes on the DateTime columns that the epoch-day indexes replace
+LEGACY_INDEXES = {Booking: 'ix_booking_end_start', BlockedDate: 'ix_blocked_date_end_start'}
+
+def migrate_epoch_days(engine, batch_size=5000):
+    """
+    Add and fill start_day/end_day on tables created before they existed
+
+    Each table is altered and back-filled in one transaction, so other workers
+    never see a column of placeholder zeros. Returns the number of rows filled.
+    """
+    filled = 0
+    for model, legacy_index in LEGACY_INDEXES.items():
+        table = model.__table__
+        with engine.begin() as connection:
+            if connection.dialect.name == 'sqlite':
+                # DDL doesn't open a transaction by itself under pysqlite, and
+                # a worker starting alongside us must wait rather than alter too
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+            columns = {column['name'] for column in inspect(connection).get_columns(table.name)}
+            if {'start_day', 'end_day'} <= columns:
+                continue
+            for name in ('start_day', 'end_day'):
+                if name not in columns:
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0')
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {legacy_index}')
+
+            update = db.update(table).where(table.c.id == db.bindparam('row_id')) \
+                .values(start_day=db.bindparam('start'), end_day=db.bindparam('end'))
+            rows = connection.execute(db.select(table.c.id, table.c.start_date, table.c.end_date)).all()
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                connection.execute(update, [
+                    {'row_id': id, 'start': epoch_day(start), 'end': epoch_day(end)} for id, start, end in batch
+                ])
+                filled += len(batch)
+    return filled
+
+@click.command('migrate-epoch-days')
+@with_appcontext
+def migrate_epoch_days_command():
+    """Add the integer day columns to an existing database and back-fill them"""
+    filled = migrate_epoch_days(db.engine)
+    click.echo(f'Back-filled epoch days for {filled} rows')
@@ -1,3 +1,7 @@
 from .booking import Booking
 from .user import User
 from .blocked_date import BlockedDate
+from .data_version import DataVersion
+from .outbox_message import OutboxMessage
+from .setting import Setting
+from .change_log import ChangeLog
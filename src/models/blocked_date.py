@@ -1,12 +1,30 @@
 from datetime import datetime, UTC
+from sqlalchemy.orm import validates
 from ..database import db
+from .epoch_day import epoch_day, day_of
 
 class BlockedDate(db.Model):
+    # Range lookups filter on the integer days, end first so past history is
+    # never scanned
+    __table_args__ = (
+        db.Index('ix_blocked_date_end_start_day', 'end_day', 'start_day'),
+        # The admin tables page through rows by seeking on (start_date, id)
+        db.Index('ix_blocked_date_start_id', 'start_date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
+    # Days since 1970-01-01 of start_date and end_date, kept in step with them
+    start_day = db.Column(db.Integer, nullable=False, default=day_of('start_date'))
+    end_day = db.Column(db.Integer, nullable=False, default=day_of('end_date'))
     reason = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
     
+    @validates('start_date', 'end_date')
+    def set_day(self, key, value):
+        setattr(self, key.replace('_date', '_day'), epoch_day(value))
+        return value
+
     def __repr__(self):
         return f'<BlockedDate {self.start_date} to {self.end_date}>'
@@ -0,0 +1,18 @@
+from ..database import db
+
+class ChangeLog(db.Model):
+    """
+    One row per booking or blocked date change, tagged with the DataVersion it produced
+
+    The /api/changes stream replays these to calendars that are already open.
+    `action` is 'add' (created or edited), 'remove', or 'reset' for bulk
+    statements whose individual rows aren't known.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    action = db.Column(db.String(10), nullable=False)
+    kind = db.Column(db.String(10), nullable=True)  # booking or blocked
+    row_id = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f'<ChangeLog {self.version} {self.action} {self.kind} {self.row_id}>'
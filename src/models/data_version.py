@@ -0,0 +1,14 @@
+from ..database import db
+
+class DataVersion(db.Model):
+    """
+    Counters bumped in the same transaction as the data they track
+
+    Row 1 counts booking and blocked date changes (see src/availability.py);
+    row 2 counts User changes (see src/identity.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.version}>'
@@ -0,0 +1,51 @@
+from datetime import date
+from sqlalchemy import event
+from sqlalchemy.sql.elements import BindParameter
+from ..database import db
+
+EPOCH = date(1970, 1, 1).toordinal()
+
+# Integer day column kept in step with each date column
+DAY_COLUMNS = {'start_date': 'start_day', 'end_date': 'end_day'}
+
+def epoch_day(value):
+    """Return the number of days from 1970-01-01 to the calendar date of `value`"""
+    return value.toordinal() - EPOCH
+
+def day_of(column):
+    """Column default filling an epoch day from `column` of the same INSERT"""
+    # Covers Core and bulk inserts, which don't go through the model's validators
+    def default(context):
+        return epoch_day(context.get_current_parameters()[column])
+    return default
+
+def missing_days(values):
+    """Return the day values to add to an UPDATE setting `values` ({column name: value})"""
+    days = {}
+    for date_column, day_column in DAY_COLUMNS.items():
+        if date_column not in values or day_column in values:
+            continue
+        value = values[date_column]
+        if isinstance(value, BindParameter):
+            value = value.value
+        if not isinstance(value, date):
+            raise ValueError(f'{date_column} can only be updated to a fixed date unless {day_column} is set too')
+        days[day_column] = epoch_day(value)
+    return days
+
+@event.listens_for(db.session, 'do_orm_execute')
+def fill_updated_days(orm_execute_state):
+    # A column onupdate can't see the new date, and would run for UPDATEs
+    # that don't touch the dates at all, so fill the days in here instead
+    if not orm_execute_state.is_update:
+        return
+    statement = orm_execute_state.statement
+    if not set(DAY_COLUMNS.values()) <= set(statement.table.c.keys()):
+        return
+    values = {getattr(key, 'key', key): value for key, value in (statement._values or {}).items()}
+    days = missing_days(values)
+    if days:
+        orm_execute_state.statement = statement.values(days)
+    # UPDATE by primary key with a list of rows
+    if isinstance(orm_execute_state.parameters, list):
+        orm_execute_state.parameters = [{**row, **missing_days(row)} for row in orm_execute_state.parameters]
@@ -0,0 +1,16 @@
+from datetime import datetime, UTC
+from ..database import db
+
+class Setting(db.Model):
+    """Admin-editable setting shared by every worker
+
+    Each write takes the next version number, so the highest version in the
+    table tells a worker whether its cached settings are current.
+    """
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+
+    def __repr__(self):
+        return f'<Setting {self.key} v{self.version}>'
@@ -0,0 +1,138 @@
+import cProfile
+import os
+import random
+import secrets
+import threading
+import tracemalloc
+from datetime import datetime
+from flask import g, request
+from flask_login import current_user
+
+# Allocation sites listed in a memory profile
+MEMORY_TOP_LINES = 50
+
+class RequestProfiler:
+    """
+    Opt-in cProfile (and optionally tracemalloc) runs of single requests
+
+    When PROFILING_ENABLED is set, an admin request carrying an "X-Profile"
+    header or a "_profile" query parameter is run under cProfile; a value of
+    "memory" also traces allocations. The result is written to PROFILING_DIR
+    as <name>.prof, which snakeviz, flameprof or pstats can open, plus
+    <name>.mem.txt for memory runs, and named in the response's X-Profile
+    header. tracemalloc sees the whole process, so a memory report also
+    counts other threads' requests running at the same time. Only a
+    PROFILING_SAMPLE_RATE share of flagged requests is profiled, one at a
+    time per process, and the oldest files are deleted once the directory
+    passes PROFILING_MAX_BYTES.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.sample_rate = 1.0
+        self.max_bytes = 0
+        self.logger = None
+        self._busy = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['PROFILING_ENABLED']
+        # Relative to the working directory, like the instance/ databases
+        self.directory = os.path.abspath(app.config['PROFILING_DIR'])
+        self.sample_rate = app.config['PROFILING_SAMPLE_RATE']
+        self.max_bytes = app.config['PROFILING_MAX_BYTES']
+        # finish() runs after the response is sent, with no app context left
+        self.logger = app.logger
+
+        app.before_request(self.start_request)
+        app.after_request(self.attach_profile)
+        app.teardown_request(self.abandon_request)
+
+    def requested_mode(self):
+        flag = request.headers.get('X-Profile') or request.args.get('_profile')
+        if not flag:
+            return None
+        return 'memory' if flag.lower() == 'memory' else 'cpu'
+
+    def start_request(self):
+        if not self.enabled:
+            return
+        mode = self.requested_mode()
+        if mode is None or not (current_user.is_authenticated and current_user.is_admin):
+            return
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            g._profile_skipped = True
+            return
+
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{(request.endpoint or 'none').replace('.', '-')}-{secrets.token_hex(3)}"
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, say) already holds the interpreter's hook
+            self._busy.release()
+            g._profile_skipped = True
+            return
+        if mode == 'memory':
+            tracemalloc.start()
+        g._profile = (profile, mode, name)
+
+    def attach_profile(self, response):
+        if g.pop('_profile_skipped', False):
+            response.headers['X-Profile'] = 'skipped'
+        state = g.pop('_profile', None)
+        if state is not None:
+            # Stop once the body has been sent, so streamed responses are included
+            response.headers['X-Profile'] = f'{state[2]}.prof'
+            response.call_on_close(lambda: self.finish(*state))
+        return response
+
+    def abandon_request(self, exc=None):
+        # after_request never ran; don't leave the profiler on or the slot taken
+        state = g.pop('_profile', None)
+        if state is not None:
+            self.finish(*state)
+
+    def finish(self, profile, mode, name):
+        """Stop profiling and write the results, then enforce the size cap"""
+        try:
+            profile.disable()
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, f'{name}.prof'))
+            if mode == 'memory':
+                self.write_memory_report(os.path.join(self.directory, f'{name}.mem.txt'))
+            self.enforce_cap()
+        except OSError as e:
+            self.logger.warning(f'Could not save profile {name}: {str(e)}')
+        finally:
+            if mode == 'memory':
+                tracemalloc.stop()
+            self._busy.release()
+
+    def write_memory_report(self, path):
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, 'w') as f:
+            f.write(f'Traced memory: {current} bytes still allocated, {peak} bytes at peak\n')
+            # tracemalloc has no notion of threads or requests
+            f.write('Allocations are for the whole process, so requests handled by other threads '
+                    'while this one ran are included\n\n')
+            for stat in snapshot.statistics('lineno')[:MEMORY_TOP_LINES]:
+                f.write(f'{stat}\n')
+
+    def profiles(self):
+        """Return (name, size, modified) for every saved profile, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return [(entry.name, entry.stat().st_size, entry.stat().st_mtime) for entry in entries]
+
+    def enforce_cap(self):
+        total = 0
+        for name, size, _ in self.profiles():
+            total += size
+            if total > self.max_bytes:
+                os.remove(os.path.join(self.directory, name))
+
+profiler = RequestProfiler()
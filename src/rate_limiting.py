@@ -1,51 +1,325 @@
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from datetime import datetime, timedelta
-from collections import defaultdict
+from abc import ABC, abstractmethod
+from array import array
+import os
+import sqlite3
+import sys
 import threading
+import time
+from collections import OrderedDict
+
+# Per-IP limits: at most REQUESTS_PER_MINUTE in any 60 seconds and
+# REQUESTS_PER_SECOND in any 1 second
+REQUESTS_PER_MINUTE = 100
+REQUESTS_PER_SECOND = 3
+MAX_BAN_SECONDS = 24 * 60 * 60
+
+# Rough per-entry overhead of a stripe's OrderedDict slot and linked-list node
+ENTRY_OVERHEAD_BYTES = 100
+
+class IPState:
+    """
+    Rate limiting state for one client IP
+
+    `request_times` is a ring holding the timestamps of the last
+    REQUESTS_PER_MINUTE + 1 requests. A limit of N requests per window is
+    exceeded exactly when the request N before the current one falls inside
+    the window, so both checks are a single lookup.
+    """
+    __slots__ = ('request_times', 'head', 'violations', 'ban_until')
+    CAPACITY = REQUESTS_PER_MINUTE + 1
+
+    def __init__(self, request_times=None, head=0, violations=0, ban_until=float('-inf')):
+        if request_times is None:
+            request_times = array('d', [float('-inf')]) * self.CAPACITY
+        self.request_times = request_times
+        self.head = head  # Next slot to write
+        self.violations = violations
+        self.ban_until = ban_until
+
+    def record(self, now):
+        self.request_times[self.head] = now
+        self.head = (self.head + 1) % self.CAPACITY
+
+    def latest(self, n):
+        """Timestamp of the n-th most recent request (1 is the latest)"""
+        return self.request_times[(self.head - n) % self.CAPACITY]
+
+    def expires_at(self, idle_ttl):
+        """When this state can be forgotten: `idle_ttl` after the last request or ban"""
+        return max(self.latest(1), self.ban_until) + idle_ttl
+
+    def size(self):
+        """Approximate bytes held for this state"""
+        return sys.getsizeof(self) + sys.getsizeof(self.request_times)
+
+class LimiterStorage(ABC):
+    """
+    Where ExponentialBackoffLimiter keeps per-IP state
+
+    `update` must be atomic per IP for every process sharing the storage: it
+    loads the state, calls `fn(state)`, saves the state and returns what `fn`
+    returned. A Redis-compatible backend can do this with WATCH/MULTI on a
+    per-IP key, re-running `fn` when the transaction is aborted, and an
+    EXPIREAT of `state.expires_at(idle_ttl)` takes care of eviction.
+
+    `clock` supplies the timestamps stored in IPState, so it has to mean the
+    same thing to every process sharing the storage.
+    """
+    clock = staticmethod(time.time)
+
+    @abstractmethod
+    def get(self, ip):
+        """Return the IPState for `ip`, or None if it has none"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, ip, fn):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sweep(self):
+        """Forget idle IPs now; returns how many were dropped"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self):
+        """Return {'tracked_ips': ..., 'memory_bytes': ...} gauges"""
+        raise NotImplementedError
+
+class MemoryStorage(LimiterStorage):
+    """
+    Per-process storage; each gunicorn worker sees only its own clients
+
+    IPs are spread over independently locked stripes so requests from
+    unrelated clients don't wait on each other. Each stripe is kept in
+    least-recently-used order and bounded to its share of `max_ips`. Every
+    update also drops expired entries from the cold end, so idle IPs are
+    swept as a side effect of normal traffic.
+    """
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, stripes=16, max_ips=100000, idle_ttl=3600):
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in range(stripes)]
+        self.stripe_capacity = max(1, -(-max_ips // stripes))
+        self.idle_ttl = idle_ttl
+
+    def _stripe(self, ip):
+        return self._stripes[hash(ip) % len(self._stripes)]
+
+    def get(self, ip):
+        lock, states = self._stripe(ip)
+        with lock:
+            state = states.get(ip)
+            if state is not None:
+                states.move_to_end(ip)
+            return state
+
+    def update(self, ip, fn):
+        lock, states = self._stripe(ip)
+        with lock:
+            state = states.get(ip)
+            if state is None:
+                state = states[ip] = IPState()
+            else:
+                states.move_to_end(ip)
+            result = fn(state)
+            self._evict(states, self.clock(), keep=ip)
+            return result
+
+    def _evict(self, states, now, keep=None):
+        """Drop expired or over-capacity entries from the least recently used end"""
+        dropped = 0
+        while states:
+            ip, state = next(iter(states.items()))
+            if ip == keep:
+                break
+            if len(states) <= self.stripe_capacity and state.expires_at(self.idle_ttl) > now:
+                break
+            states.popitem(last=False)
+            dropped += 1
+        return dropped
+
+    def clear(self):
+        for lock, states in self._stripes:
+            with lock:
+                states.clear()
+
+    def sweep(self):
+        now = self.clock()
+        dropped = 0
+        for lock, states in self._stripes:
+            with lock:
+                expired = [ip for ip, state in states.items() if state.expires_at(self.idle_ttl) <= now]
+                for ip in expired:
+                    del states[ip]
+                dropped += len(expired)
+        return dropped
+
+    def stats(self):
+        tracked = 0
+        memory = 0
+        for lock, states in self._stripes:
+            with lock:
+                tracked += len(states)
+                memory += sys.getsizeof(states)
+                memory += sum(sys.getsizeof(ip) + state.size() + ENTRY_OVERHEAD_BYTES
+                              for ip, state in states.items())
+        return {'tracked_ips': tracked, 'memory_bytes': memory}
+
+class SQLiteStorage(LimiterStorage):
+    """
+    Storage shared by every process on the host through a SQLite file
+
+    Each update runs in a BEGIN IMMEDIATE transaction, which takes the write
+    lock up front so concurrent workers serialize instead of racing. State
+    outlives the processes (and possibly a reboot), so timestamps are wall
+    clock time rather than monotonic. Rows carry their expiry time, and every
+    `sweep_every` updates expired rows (and any beyond `max_ips`) are deleted.
+    """
+    sweep_every = 1000
+
+    def __init__(self, path, max_ips=100000, idle_ttl=3600):
+        self.path = path
+        self.max_ips = max_ips
+        self.idle_ttl = idle_ttl
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections can't be shared across threads or carried over a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit ('
+                'ip TEXT PRIMARY KEY, request_times BLOB NOT NULL, head INTEGER NOT NULL, '
+                'violations INTEGER NOT NULL, ban_until REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_expires_at ON rate_limit (expires_at)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.updates = 0
+        return connection
+
+    @staticmethod
+    def _load(row):
+        if row is None:
+            return None
+        return IPState(array('d', row[0]), row[1], row[2], row[3])
+
+    def get(self, ip):
+        row = self._connection().execute(
+            'SELECT request_times, head, violations, ban_until FROM rate_limit WHERE ip = ?', (ip,)
+        ).fetchone()
+        return self._load(row)
+
+    def update(self, ip, fn):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT request_times, head, violations, ban_until FROM rate_limit WHERE ip = ?', (ip,)
+            ).fetchone()
+            state = self._load(row) or IPState()
+            result = fn(state)
+            connection.execute(
+                'INSERT OR REPLACE INTO rate_limit (ip, request_times, head, violations, ban_until, expires_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (ip, state.request_times.tobytes(), state.head, state.violations, state.ban_until,
+                 state.expires_at(self.idle_ttl))
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        self._local.updates += 1
+        if self._local.updates % self.sweep_every == 0:
+            self.sweep()
+        return result
+
+    def clear(self):
+        self._connection().execute('DELETE FROM rate_limit')
+
+    def sweep(self):
+        connection = self._connection()
+        expired = connection.execute('DELETE FROM rate_limit WHERE expires_at <= ?', (self.clock(),)).rowcount
+        # Over capacity: forget the IPs that would expire soonest
+        overflow = connection.execute(
+            'DELETE FROM rate_limit WHERE ip IN (SELECT ip FROM rate_limit ORDER BY expires_at '
+            'LIMIT max(0, (SELECT count(*) FROM rate_limit) - ?))', (self.max_ips,)
+        ).rowcount
+        return expired + overflow
+
+    def stats(self):
+        connection = self._connection()
+        tracked = connection.execute('SELECT count(*) FROM rate_limit').fetchone()[0]
+        page_count = connection.execute('PRAGMA page_count').fetchone()[0]
+        page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+        return {'tracked_ips': tracked, 'memory_bytes': page_count * page_size}
+
+def storage_from_url(url, max_ips=100000, idle_ttl=3600):
+    """Build a storage backend from RATE_LIMIT_STORAGE ('memory' or 'sqlite:///path')"""
+    if url == 'memory':
+        return MemoryStorage(max_ips=max_ips, idle_ttl=idle_ttl)
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SQLiteStorage(path, max_ips=max_ips, idle_ttl=idle_ttl)
+    raise ValueError(f'Unsupported rate limit storage: {url}')
 
 class ExponentialBackoffLimiter:
-    def __init__(self):
-        self.violations = defaultdict(int)
-        self.ban_until = defaultdict(lambda: datetime.min)
-        self.request_times = defaultdict(list)
-        self._lock = threading.Lock()
+    def __init__(self, storage=None):
+        self.storage = storage or MemoryStorage()
+
+    def init_app(self, app):
+        self.storage = storage_from_url(app.config['RATE_LIMIT_STORAGE'],
+                                        max_ips=app.config['RATE_LIMIT_MAX_IPS'],
+                                        idle_ttl=app.config['RATE_LIMIT_IDLE_TTL'])
+
+    def reset(self):
+        """Forget every client's history, violations and bans"""
+        self.storage.clear()
+
+    def state(self, ip):
+        """Return the stored IPState for `ip`, or None"""
+        return self.storage.get(ip)
+
+    def stats(self):
+        """Gauges for the number of tracked IPs and the memory they use"""
+        return self.storage.stats()
 
     def calculate_ban_duration(self, violations):
         """Calculate exponential backoff duration in seconds"""
-        return 2 ** (violations - 1)  # 1s, 2s, 4s, 8s, 16s, etc.
+        # 1s, 2s, 4s, 8s, 16s, etc., capped so persistent offenders can't overflow it
+        return min(2 ** min(violations - 1, 32), MAX_BAN_SECONDS)
 
     def is_banned(self, ip):
-        with self._lock:
-            return datetime.now() < self.ban_until[ip]
+        state = self.storage.get(ip)
+        return state is not None and self.storage.clock() < state.ban_until
 
     def check_rate_limit(self, ip):
-        with self._lock:
-            now = datetime.now()
-            
-            # Clean up old request times
-            self.request_times[ip] = [t for t in self.request_times[ip] 
-                                    if now - t < timedelta(seconds=60)]
-            
-            # Add current request
-            self.request_times[ip].append(now)
-            
-            # Check last 60 seconds
-            if len(self.request_times[ip]) > 100:
-                self.violations[ip] += 1
-                ban_duration = self.calculate_ban_duration(self.violations[ip])
-                self.ban_until[ip] = now + timedelta(seconds=ban_duration)
-                return False
-            
-            # Check last second
-            recent_requests = len([t for t in self.request_times[ip] 
-                                 if now - t < timedelta(seconds=1)])
-            if recent_requests > 3:
-                self.violations[ip] += 1
-                ban_duration = self.calculate_ban_duration(self.violations[ip])
-                self.ban_until[ip] = now + timedelta(seconds=ban_duration)
-                return False
-            
-            return True
+        return self.storage.update(ip, self._record_request)
+
+    def _record_request(self, state):
+        now = self.storage.clock()
+        state.record(now)
+
+        # Check last 60 seconds, then the last second
+        if (now - state.latest(REQUESTS_PER_MINUTE + 1) < 60
+                or now - state.latest(REQUESTS_PER_SECOND + 1) < 1):
+            state.violations += 1
+            state.ban_until = now + self.calculate_ban_duration(state.violations)
+            return False
+
+        return True
 
 limiter = ExponentialBackoffLimiter()
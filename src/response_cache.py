@@ -0,0 +1,62 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    Per-process cache of serialized JSON payloads tagged with a DataVersion
+
+    An entry is only served while the data version it was built from is
+    still current, so a commit in any worker invalidates every cached
+    payload. When the version moves on, the whole cache is dropped. Payloads
+    over `max_body_bytes` aren't kept.
+    """
+
+    def __init__(self, max_entries=256, max_body_bytes=1024 * 1024):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self.version = None
+        self._entries = OrderedDict()  # key -> (body, etag)
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Return (body, etag) cached for `key` at `version`, or None"""
+        with self._lock:
+            if version != self.version:
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def etag(key, version):
+        """
+        Return the strong ETag of the payload for `key` at `version`
+
+        The payload is fully determined by the key and the data version, so
+        every worker agrees on the tag before (or without) building the body.
+        """
+        return f'{version}-{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}'
+
+    def put(self, key, version, body):
+        """Cache `body` for `key` and return its strong ETag"""
+        etag = self.etag(key, version)
+        with self._lock:
+            if self.version is not None and version < self.version or len(body) > self.max_body_bytes:
+                # Built from data that has already been replaced, or too big to keep
+                return etag
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            self._entries[key] = (body, etag)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.version = None
+
+events_cache = ResponseCache()
@@ -1,9 +1,16 @@
-from flask import Blueprint, render_template, redirect, url_for, current_app, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, current_app, request, jsonify, send_from_directory
 from flask_login import login_required, current_user
-from src.models import Booking, User, BlockedDate
+from src.models import Booking, BlockedDate
+from src.models.epoch_day import epoch_day
 from src.database import db
+from src.summary import dashboard_summary
+from src.settings import settings
+from src.profiling import profiler
+from src.utils.templates import compile_template, TemplateError, FIELDS
 from functools import wraps
-from datetime import datetime, UTC
+from datetime import datetime, timedelta, UTC
+
+MAX_PAGE_SIZE = 200
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -29,54 +36,191 @@ def update_welcome_template():
     
     if 'template' not in data or not data['template']:
         return jsonify({'error': 'Welcome email template is required'}), 400
-        
-    # Update the welcome email template in the database
-    admin = User.query.filter_by(username='admin').first()
-    admin.welcome_template = data['template']
-    db.session.commit()
     
-    # Also update the app config for the current session
-    current_app.config['WELCOME_EMAIL_TEMPLATE'] = data['template']
+    try:
+        compile_template(data['template'])
+    except TemplateError as e:
+        return jsonify({'error': str(e)}), 400
+        
+    # Every worker picks the new template up on its next settings read
+    settings.set('welcome_template', data['template'])
     
     return jsonify({'message': 'Welcome email template updated successfully'}), 200
 
-@bp.route('/dashboard')
+def encode_cursor(row):
+    return f"{row.start_date.isoformat()}_{row.id}"
+
+def decode_cursor(cursor):
+    start_date, row_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_date), int(row_id)
+
+def serialize_booking(booking):
+    return {
+        'id': booking.id,
+        'guest_name': booking.guest_name,
+        'guest_email': booking.guest_email,
+        'start_date': booking.start_date.strftime('%Y-%m-%d'),
+        'end_date': booking.end_date.strftime('%Y-%m-%d'),
+        'created_at': booking.created_at.strftime('%Y-%m-%d')
+    }
+
+def serialize_blocked_date(blocked):
+    return {
+        'id': blocked.id,
+        'reason': blocked.reason,
+        'start_date': blocked.start_date.strftime('%Y-%m-%d'),
+        'end_date': blocked.end_date.strftime('%Y-%m-%d'),
+        'created_at': blocked.created_at.strftime('%Y-%m-%d')
+    }
+
+def keyset_page(model, query, after=None, limit=50, descending=True):
+    """
+    Return (rows, next_cursor) for one page of `query` ordered by (start_date, id)
+
+    Pages seek past the last row of the previous page instead of using OFFSET,
+    so every page costs the same no matter how deep into the history it is.
+    """
+    key = db.tuple_(model.start_date, model.id)
+    if after is not None:
+        query = query.filter(key < after if descending else key > after)
+    if descending:
+        query = query.order_by(model.start_date.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.start_date.asc(), model.id.asc())
+
+    # Fetch one extra row to learn whether there is another page
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def filtered_query(model, when=None, search=None):
+    """Apply the admin table filters: `when` is 'upcoming' or 'past'"""
+    query = model.query
+    today = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    if when == 'upcoming':
+        query = query.filter(model.end_day >= epoch_day(today))
+    elif when == 'past':
+        query = query.filter(model.end_day < epoch_day(today))
+    if search:
+        pattern = f'%{search}%'
+        if model is Booking:
+            query = query.filter(db.or_(Booking.guest_name.ilike(pattern), Booking.guest_email.ilike(pattern)))
+        else:
+            query = query.filter(BlockedDate.reason.ilike(pattern))
+    return query
+
+def table_page(model, serialize):
+    """Serve one page of an admin table as JSON"""
+    when = request.args.get('when')
+    if when not in (None, 'all', 'upcoming', 'past'):
+        return jsonify({'error': 'Invalid filter'}), 400
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': 'Invalid sort order'}), 400
+    try:
+        after = decode_cursor(request.args['after']) if 'after' in request.args else None
+        limit = int(request.args.get('limit', current_app.config['ADMIN_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = filtered_query(model, when, request.args.get('q'))
+    rows, next_cursor = keyset_page(model, query, after, limit, descending=order == 'desc')
+    return jsonify({'items': [serialize(row) for row in rows], 'next': next_cursor}), 200
+
+@bp.route('/bookings')
 @login_required
 @admin_required
-def dashboard():
-    bookings = Booking.query.order_by(Booking.start_date.desc()).all()
-    blocked_dates = BlockedDate.query.order_by(BlockedDate.start_date.desc()).all()
+def bookings_page():
+    return table_page(Booking, serialize_booking)
+
+@bp.route('/blocked-dates')
+@login_required
+@admin_required
+def blocked_dates_page():
+    return table_page(BlockedDate, serialize_blocked_date)
+
+@bp.route('/summary')
+@login_required
+@admin_required
+def summary():
+    return jsonify(dashboard_summary.get()), 200
+
+@bp.route('/profiles')
+@login_required
+@admin_required
+def list_profiles():
+    return jsonify([
+        {'name': name, 'size': size, 'created_at': datetime.fromtimestamp(modified, UTC).isoformat(),
+         'url': url_for('admin.download_profile', name=name)}
+        for name, size, modified in profiler.profiles()
+    ]), 200
+
+@bp.route('/profiles/<name>')
+@login_required
+@admin_required
+def download_profile(name):
+    if not name.endswith(('.prof', '.mem.txt')):
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_from_directory(profiler.directory, name, as_attachment=True)
+
+@bp.route('/welcome-template/preview', methods=['POST'])
+@login_required
+@admin_required
+def preview_welcome_template():
+    data = request.get_json()
     
-    # Find the next upcoming booking (excluding blocked dates)
-    now = datetime.now(UTC)
-    next_booking = Booking.query.filter(
-        Booking.start_date > now
-    ).order_by(Booking.start_date.asc()).first()
+    if 'template' not in data or not data['template']:
+        return jsonify({'error': 'Welcome email template is required'}), 400
     
-    # Get total number of bookings
-    total_bookings = Booking.query.count()
+    try:
+        template = compile_template(data['template'])
+    except TemplateError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Render against a sample stay; nothing is saved
+    start_date = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None) + timedelta(days=14)
+    sample = Booking(id=1234, guest_name='Jane Doe', guest_email='jane@example.com',
+                     start_date=start_date, end_date=start_date + timedelta(days=3))
+    return jsonify({'html': template.render(sample)}), 200
+
+@bp.route('/dashboard')
+@login_required
+@admin_required
+def dashboard():
+    # Only the first page of each table is rendered; admin.js loads the rest
+    # with the same filter and sort, taken from this page's query string
+    page_size = current_app.config['ADMIN_PAGE_SIZE']
+    when = request.args.get('when') if request.args.get('when') in ('all', 'upcoming', 'past') else None
+    descending = request.args.get('order') != 'asc'
+    search = request.args.get('q')
+    bookings, bookings_next = keyset_page(Booking, filtered_query(Booking, when, search),
+                                          limit=page_size, descending=descending)
+    blocked_dates, blocked_dates_next = keyset_page(BlockedDate, filtered_query(BlockedDate, when, search),
+                                                    limit=page_size, descending=descending)
     
+    # Cached until the next booking or blocked date change
+    summary = dashboard_summary.get()
     next_guest_info = None
-    if next_booking:
-        # Ensure start_date is timezone-aware
-        start_date = next_booking.start_date.replace(tzinfo=UTC)
-        days_until = (start_date - now).days
+    if summary['next_guest']:
         next_guest_info = {
-            'name': next_booking.guest_name,
-            'days': days_until,
-            'total_bookings': total_bookings
+            'name': summary['next_guest']['name'],
+            'days': summary['next_guest']['days'],
+            'total_bookings': summary['total_bookings']
         }
     
-    # Get current access code
-    current_code = current_app.config['DEFAULT_ACCESS_CODE']
-    
-    # Get welcome email template from database
-    admin = User.query.filter_by(username='admin').first()
-    welcome_template = admin.welcome_template or current_app.config['WELCOME_EMAIL_TEMPLATE']
+    # Current access code and welcome email template
+    current_settings = settings.snapshot()
+    current_code = current_settings['access_code']
+    welcome_template = current_settings['welcome_template']
     
     return render_template('admin/dashboard.html', 
                          bookings=bookings,
+                         bookings_next=bookings_next,
                          blocked_dates=blocked_dates,
+                         blocked_dates_next=blocked_dates_next,
                          next_guest_info=next_guest_info,
+                         summary=summary,
                          current_code=current_code,
-                         welcome_template=welcome_template)
+                         welcome_template=welcome_template,
+                         template_fields=FIELDS)
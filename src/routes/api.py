@@ -1,11 +1,21 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, stream_with_context
 from flask_login import login_required, current_user
-from datetime import datetime
-from src.models import Booking, BlockedDate
+from datetime import datetime, timedelta, UTC
+from src.models import Booking, BlockedDate, ChangeLog
+from src.models.epoch_day import epoch_day
 from src.database import db
 from functools import wraps
+from itertools import chain, islice
+from threading import Lock
+from time import monotonic, sleep
+from sqlalchemy.exc import OperationalError
 from src.rate_limiting import limiter
-from src.utils.email import send_booking_notification_to_owner, send_welcome_email_to_guest
+from src.metrics import metrics
+from src.availability import availability, current_version, lock_calendar, calendar_busy
+from src.response_cache import events_cache
+from src.utils.json_stream import dumps, iter_json_array
+from src.settings import settings
+from src.utils.outbox import queue_booking_emails, outbox_worker
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -13,10 +23,12 @@ def rate_limit_check():
     """Check rate limits and return appropriate response if limit exceeded"""
     ip = request.remote_addr
     if limiter.is_banned(ip):
+        metrics.inc('homestay_rate_limit_rejections_total', reason='banned')
         return jsonify({
             'error': 'Rate limit exceeded. Please try again later.'
         }), 429
     if not limiter.check_rate_limit(ip):
+        metrics.inc('homestay_rate_limit_rejections_total', reason='throttled')
         return jsonify({
             'error': 'Too many requests. Please slow down.'
         }), 429
@@ -30,38 +42,370 @@ def check_rate_limit():
         if response is not None:
             return response
 
+def parse_window_bound(value):
+    """Parse a FullCalendar range boundary, keeping its wall-clock date"""
+    # Stored dates are naive calendar dates, so the client's UTC offset is dropped
+    # rather than converted; otherwise a day boundary would shift by a few hours.
+    return datetime.fromisoformat(value).replace(tzinfo=None)
+
+def parse_window():
+    """Return the (start, end) window from the query string; either may be None"""
+    window_start = parse_window_bound(request.args['start']) if 'start' in request.args else None
+    window_end = parse_window_bound(request.args['end']) if 'end' in request.args else None
+    return window_start, window_end
+
+def in_window(query, model, window_start, window_end):
+    """Restrict `query` to rows of `model` visible in the window"""
+    # Events are drawn through the day after end_date (see calendar.js), so an
+    # event is visible if it ends after the day before the window starts.
+    # The day columns bound the index range; the DateTime comparisons then
+    # settle the boundary days exactly, for stays and bounds that aren't at
+    # midnight.
+    if window_start is not None:
+        after = window_start - timedelta(days=1)
+        query = query.filter(model.end_day >= epoch_day(after), model.end_date > after)
+    if window_end is not None:
+        query = query.filter(model.start_day <= epoch_day(window_end), model.start_date < window_end)
+    return query
+
+# Bump when the shape of the event payloads changes, so browsers holding an
+# older payload under the same data version don't get a 304 for it
+PAYLOAD_FORMAT = 2
+
+# Event count above which a payload is streamed rather than encoded whole
+STREAM_AFTER = 500
+
+def stream_rows(query):
+    """Execute `query`, fetching rows from the cursor in batches as they're iterated"""
+    return db.session.execute(query, execution_options={'yield_per': 1000})
+
+def booking_event(id, start, end, guest_name, guest_email):
+    return {'id': id, 'start': start, 'end': end, 'title': 'Booked', 'type': 'booking',
+            'guest_name': guest_name, 'guest_email': guest_email}
+
+def blocked_event(id, start, end, reason):
+    return {'id': id, 'start': start, 'end': end, 'title': 'Booked', 'type': 'blocked', 'reason': reason}
+
+# Model, payload columns and event builder for the full (admin) events of each type
+FULL_EVENTS = {
+    'booking': (Booking, (Booking.id, Booking.start_date, Booking.end_date,
+                          Booking.guest_name, Booking.guest_email), booking_event),
+    'blocked': (BlockedDate, (BlockedDate.id, BlockedDate.start_date, BlockedDate.end_date,
+                              BlockedDate.reason), blocked_event),
+}
+
+def build_events(event_type, window_start, window_end, slim=False):
+    """
+    Yield the calendar events of `event_type` (None for both) in the window
+
+    Rows are read as plain tuples of just the columns the payload needs. With
+    `slim`, events only carry their dates and type, which is all the guest
+    calendar shows; guest details and block reasons are left out entirely.
+    """
+    for kind, (model, columns, to_event) in FULL_EVENTS.items():
+        if event_type not in (None, kind):
+            continue
+        if slim:
+            rows = stream_rows(in_window(db.select(model.start_date, model.end_date), model,
+                                         window_start, window_end))
+            for start, end in rows:
+                yield {'start': start, 'end': end, 'type': kind}
+        else:
+            rows = stream_rows(in_window(db.select(*columns), model, window_start, window_end))
+            for row in rows:
+                yield to_event(*row)
+
+def stream_and_cache(key, version, items):
+    """Yield `items` as a JSON array, caching the body if it stays small enough"""
+    chunks, size = [], 0
+    for chunk in iter_json_array(items):
+        yield chunk
+        if chunks is not None:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > events_cache.max_body_bytes:
+                chunks = None
+    if chunks is not None:
+        events_cache.put(key, version, b''.join(chunks))
+
+def cached_json_response(key, build):
+    """
+    Serve the JSON array for `key` from the response cache, building it on a miss
+
+    Small payloads (the usual month or two of events) are encoded in one go;
+    past STREAM_AFTER items the rest is streamed out as it is read.
+
+    Every booking or blocked date commit bumps the data version, which
+    invalidates the cached payloads in every worker. Responses carry a strong
+    ETag derived from the key and version, so an unchanged calendar costs the
+    browser a 304 without the events being queried at all.
+    """
+    key = (PAYLOAD_FORMAT, *key)
+    version = current_version()
+    etag = events_cache.etag(key, version)
+    cached = events_cache.get(key, version)
+    if cached is not None:
+        response = current_app.response_class(cached[0], mimetype='application/json')
+    elif request.method == 'HEAD' or request.if_none_match.contains_weak(etag):
+        # No body will be sent, and a stream that is never read would hold the
+        # request context open
+        response = current_app.response_class(b'', mimetype='application/json')
+    else:
+        items = iter(build())
+        head = list(islice(items, STREAM_AFTER))
+        if len(head) < STREAM_AFTER:
+            body = dumps(head)
+            events_cache.put(key, version, body)
+            response = current_app.response_class(body, mimetype='application/json')
+        else:
+            response = current_app.response_class(
+                stream_with_context(stream_and_cache(key, version, chain(head, items))),
+                mimetype='application/json'
+            )
+            # Otherwise make_conditional would buffer the whole stream to measure it
+            response.implicit_sequence_conversion = False
+
+    response.set_etag(etag)
+    # calendar.js compares this with the change stream's starting version
+    response.headers['X-Data-Version'] = str(version)
+    # Let the browser keep the payload but revalidate it on every calendar fetch
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
 @bp.route('/bookings', methods=['GET'])
 @login_required
 def get_bookings():
-    bookings = Booking.query.all()
-    blocked_dates = BlockedDate.query.all()
-    
-    events = []
-    
-    # Add regular bookings
-    for booking in bookings:
-        events.append({
-            'id': booking.id,
-            'start': booking.start_date.isoformat(),
-            'end': booking.end_date.isoformat(),
-            'title': 'Booked',
-            'type': 'booking',
-            'guest_name': booking.guest_name,
-            'guest_email': booking.guest_email
-        })
-    
-    # Add blocked dates (appear the same to regular users)
-    for blocked in blocked_dates:
-        events.append({
-            'id': blocked.id,
-            'start': blocked.start_date.isoformat(),
-            'end': blocked.end_date.isoformat(),
-            'title': 'Booked',
-            'type': 'blocked',
-            'reason': blocked.reason
-        })
-    
-    return jsonify(events)
+    event_type = request.args.get('type')
+    if event_type not in (None, 'booking', 'blocked'):
+        return jsonify({'error': 'Invalid event type'}), 400
+
+    try:
+        window_start, window_end = parse_window()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
+
+    role = 'admin' if current_user.is_admin else 'user'
+    # Regular users get the slim projection; only admins see who booked
+    return cached_json_response(
+        (role, event_type, window_start, window_end),
+        lambda: build_events(event_type, window_start, window_end, slim=role == 'user')
+    )
+
+def merge_busy_ranges(rows):
+    """
+    Coalesce (start, end) rows sorted by start into disjoint busy ranges
+
+    Days are inclusive, so a range starting the day after another ends
+    continues it rather than leaving a gap.
+    """
+    ranges = []
+    for start, end in rows:
+        if ranges and start <= ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in ranges]
+
+@bp.route('/availability', methods=['GET'])
+@login_required
+def get_availability():
+    try:
+        window_start, window_end = parse_window()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
+
+    def build():
+        busy = db.union_all(*(
+            in_window(db.select(model.start_date, model.end_date), model, window_start, window_end)
+            for model in (Booking, BlockedDate)
+        )).subquery()
+        rows = db.session.execute(db.select(busy.c.start_date, busy.c.end_date).order_by(busy.c.start_date))
+        return merge_busy_ranges(rows)
+
+    return cached_json_response(('availability', window_start, window_end), build)
+
+# Years the availability endpoints answer for; far enough out for any stay,
+# and short of date.max so searches and month ends can't overflow
+MIN_YEAR, MAX_YEAR = 1900, 2999
+
+@bp.route('/availability/first-free', methods=['GET'])
+@login_required
+def get_first_free():
+    try:
+        nights = int(request.args.get('nights', 1))
+        after = request.args.get('after')
+        after = datetime.fromisoformat(after).date() if after else datetime.now(UTC).date()
+    except ValueError:
+        return jsonify({'error': 'Invalid nights or date'}), 400
+    if not 1 <= nights <= 365:
+        return jsonify({'error': 'Nights must be between 1 and 365'}), 400
+    if not MIN_YEAR <= after.year <= MAX_YEAR:
+        return jsonify({'error': f'Date must be between {MIN_YEAR} and {MAX_YEAR}'}), 400
+
+    start = availability.first_free(after, nights)
+    end = start + timedelta(days=nights)
+    if end.year > MAX_YEAR:
+        return jsonify({'error': f'No free dates before {MAX_YEAR + 1}'}), 400
+    return jsonify({'start': start.isoformat(), 'end': end.isoformat()})
+
+@bp.route('/availability/occupancy', methods=['GET'])
+@login_required
+def get_occupancy():
+    try:
+        year = int(request.args.get('year', datetime.now(UTC).year))
+    except ValueError:
+        return jsonify({'error': 'Invalid year'}), 400
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        return jsonify({'error': f'Year must be between {MIN_YEAR} and {MAX_YEAR}'}), 400
+    return jsonify({'year': year, 'months': availability.monthly_occupancy(year)})
+
+# Change log entries replayed to a stream at once; beyond this it refetches
+MAX_REPLAY = 500
+
+def changes_since(since, version, slim):
+    """
+    Return the calendar changes logged after version `since`, up to `version`
+
+    Admins get {'action': 'add', 'event': ...} and {'action': 'remove',
+    'type': ..., 'id': ...} changes to apply in place. A single
+    {'action': 'reset'} means the calendar has to refetch instead: always the
+    case for the guests' merged busy ranges, after bulk statements, and when
+    the log no longer reaches back to `since`.
+    """
+    reset = [{'action': 'reset'}]
+    if slim:
+        return reset
+    entries = db.session.execute(
+        db.select(ChangeLog.version, ChangeLog.action, ChangeLog.kind, ChangeLog.row_id)
+        .filter(ChangeLog.version > since, ChangeLog.version <= version)
+        .order_by(ChangeLog.version, ChangeLog.id)
+        .limit(MAX_REPLAY + 1)
+    ).all()
+    if (not entries or entries[0].version != since + 1 or len(entries) > MAX_REPLAY
+            or any(entry.action == 'reset' for entry in entries)):
+        return reset
+
+    # Events are sent as they are now; an add for a row deleted since is dropped
+    # and the remove that follows it in the log takes care of the calendar
+    added = {}
+    for entry in entries:
+        if entry.action == 'add':
+            added.setdefault(entry.kind, set()).add(entry.row_id)
+    events = {}
+    for kind, ids in added.items():
+        model, columns, to_event = FULL_EVENTS[kind]
+        for row in db.session.execute(db.select(*columns).filter(model.id.in_(ids))):
+            events[(kind, row.id)] = to_event(*row)
+
+    changes = []
+    for entry in entries:
+        if entry.action == 'remove':
+            changes.append({'action': 'remove', 'type': entry.kind, 'id': entry.row_id})
+        elif (entry.kind, entry.row_id) in events:
+            changes.append({'action': 'add', 'event': events[(entry.kind, entry.row_id)]})
+    return changes
+
+# Seconds a browser turned away by the stream cap waits before trying again
+BUSY_STREAM_RETRY = 30
+
+class StreamSlots:
+    """Counts this worker's open /api/changes streams, each of which holds a thread"""
+
+    def __init__(self):
+        self.open = 0
+        self._lock = Lock()
+
+    def claim(self, limit):
+        """Take a slot and return the function that gives it back, or None when all `limit` are taken"""
+        with self._lock:
+            if self.open >= limit:
+                return None
+            self.open += 1
+        released = []
+
+        def release():
+            with self._lock:
+                if not released:
+                    released.append(True)
+                    self.open -= 1
+        return release
+
+stream_slots = StreamSlots()
+
+def sse_message(event, data, id=None):
+    message = f'id: {id}\n' if id is not None else ''
+    return f'{message}event: {event}\ndata: {dumps(data).decode()}\n\n'
+
+@bp.route('/changes', methods=['GET'])
+@login_required
+def stream_changes():
+    """
+    Server-Sent Events feed of calendar changes
+
+    Each `changes` message carries the data version as its id, so a browser
+    reconnecting with Last-Event-ID (or a client passing ?since=) resumes
+    where it left off. Without a cursor the stream opens with a `ready`
+    message at the current version. Every worker reads the shared change log,
+    so it doesn't matter which one holds the stream. The stream ends after
+    CHANGES_STREAM_SECONDS and the browser reconnects, so a connection never
+    ties up a worker thread indefinitely.
+
+    Every open stream holds one of the worker's threads for as long as it
+    runs, so a worker serves at most CHANGES_MAX_STREAMS at once; beyond that
+    the request gets a 503 with a `retry:` field and Retry-After header, and
+    the calendar tries again later rather than starving page requests.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return jsonify({'error': 'Invalid since version'}), 400
+
+    slim = not current_user.is_admin
+    stream_seconds = current_app.config['CHANGES_STREAM_SECONDS']
+    poll_interval = current_app.config['CHANGES_POLL_INTERVAL']
+
+    release = stream_slots.claim(current_app.config['CHANGES_MAX_STREAMS'])
+    if release is None:
+        response = current_app.response_class(f'retry: {BUSY_STREAM_RETRY * 1000}\n\n', status=503,
+                                              mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(BUSY_STREAM_RETRY)
+        return response
+
+    def stream():
+        since = cursor
+        deadline = monotonic() + stream_seconds
+        try:
+            yield f'retry: {int(poll_interval * 1000)}\n\n'
+            if since is None:
+                since = current_version()
+                yield sse_message('ready', {'version': since}, id=since)
+            last_sent = monotonic()
+            while True:
+                version = current_version()
+                if version != since:
+                    yield sse_message('changes', changes_since(since, version, slim), id=version)
+                    since, last_sent = version, monotonic()
+                elif monotonic() - last_sent >= 15:
+                    # Comment line so proxies don't time out an idle connection
+                    yield ': keepalive\n\n'
+                    last_sent = monotonic()
+                # Hand the connection back to the pool while we wait
+                db.session.close()
+                if monotonic() >= deadline:
+                    return
+                sleep(poll_interval)
+        finally:
+            release()
+
+    response = current_app.response_class(stream_with_context(stream()), mimetype='text/event-stream')
+    # Also covers a stream closed before it started
+    response.call_on_close(release)
+    response.cache_control.no_cache = True
+    # Stop nginx and friends from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @bp.route('/bookings/<int:booking_id>', methods=['DELETE'])
 @login_required
@@ -92,25 +436,17 @@ def create_booking():
     if end_date <= start_date:
         return jsonify({'error': 'Departure date must be after arrival date'}), 400
     
-    # Check for overlapping bookings
-    overlapping_booking = Booking.query.filter(
-        db.or_(
-            db.and_(Booking.start_date <= start_date, Booking.end_date >= start_date),
-            db.and_(Booking.start_date <= end_date, Booking.end_date >= end_date),
-            db.and_(Booking.start_date >= start_date, Booking.end_date <= end_date)
-        )
-    ).first()
-    
-    # Check for overlapping blocked dates
-    overlapping_blocked = BlockedDate.query.filter(
-        db.or_(
-            db.and_(BlockedDate.start_date <= start_date, BlockedDate.end_date >= start_date),
-            db.and_(BlockedDate.start_date <= end_date, BlockedDate.end_date >= end_date),
-            db.and_(BlockedDate.start_date >= start_date, BlockedDate.end_date <= end_date)
-        )
-    ).first()
-    
-    if overlapping_booking or overlapping_blocked:
+    # Check for overlapping bookings and blocked dates while holding the write
+    # lock, so a concurrent request can't claim the same nights before we commit
+    try:
+        lock_calendar()
+    except OperationalError as e:
+        db.session.rollback()
+        if not calendar_busy(e):
+            raise
+        return jsonify({'error': 'The calendar is busy, please try again'}), 503
+    if not availability.is_free(start_date, end_date):
+        db.session.rollback()
         return jsonify({'error': 'Selected dates overlap with existing booking'}), 400
     
     # Create new booking
@@ -122,18 +458,14 @@ def create_booking():
     )
     
     db.session.add(booking)
+    # Flush for the booking id and created_at used in the email bodies, then
+    # commit the booking and its emails together
+    db.session.flush()
+    queue_booking_emails(booking)
     db.session.commit()
     
-    # Send email notifications
-    owner_email_sent = send_booking_notification_to_owner(booking)
-    guest_email_sent = send_welcome_email_to_guest(booking)
-    
-    if not owner_email_sent or not guest_email_sent:
-        current_app.logger.warning(
-            f"Booking created but email notifications may have failed. "
-            f"Owner email: {'sent' if owner_email_sent else 'failed'}, "
-            f"Guest email: {'sent' if guest_email_sent else 'failed'}"
-        )
+    # Delivery happens in the background so a slow SMTP server can't hold this request
+    outbox_worker.wake(current_app._get_current_object())
     
     return jsonify({'message': 'Booking created successfully'}), 201
 
@@ -154,11 +486,17 @@ def update_access_code():
     if 'code' not in data or not data['code']:
         return jsonify({'error': 'New access code is required'}), 400
         
-    # Update the access code in the app config
-    current_app.config['DEFAULT_ACCESS_CODE'] = data['code']
+    # Store the access code for every worker
+    settings.set('access_code', data['code'])
     
     return jsonify({'message': 'Access code updated successfully'}), 200
 
+@bp.route('/rate-limiter', methods=['GET'])
+@login_required
+@admin_required
+def rate_limiter_stats():
+    return jsonify(limiter.stats()), 200
+
 @bp.route('/blocked-dates', methods=['POST'])
 @login_required
 @admin_required
@@ -181,25 +519,17 @@ def create_blocked_date():
     if end_date <= start_date:
         return jsonify({'error': 'End date must be after start date'}), 400
     
-    # Check for overlapping bookings
-    overlapping_booking = Booking.query.filter(
-        db.or_(
-            db.and_(Booking.start_date <= start_date, Booking.end_date >= start_date),
-            db.and_(Booking.start_date <= end_date, Booking.end_date >= end_date),
-            db.and_(Booking.start_date >= start_date, Booking.end_date <= end_date)
-        )
-    ).first()
-    
-    # Check for overlapping blocked dates
-    overlapping_blocked = BlockedDate.query.filter(
-        db.or_(
-            db.and_(BlockedDate.start_date <= start_date, BlockedDate.end_date >= start_date),
-            db.and_(BlockedDate.start_date <= end_date, BlockedDate.end_date >= end_date),
-            db.and_(BlockedDate.start_date >= start_date, BlockedDate.end_date <= end_date)
-        )
-    ).first()
-    
-    if overlapping_booking or overlapping_blocked:
+    # Check for overlapping bookings and blocked dates while holding the write
+    # lock, so a concurrent request can't claim the same nights before we commit
+    try:
+        lock_calendar()
+    except OperationalError as e:
+        db.session.rollback()
+        if not calendar_busy(e):
+            raise
+        return jsonify({'error': 'The calendar is busy, please try again'}), 503
+    if not availability.is_free(start_date, end_date):
+        db.session.rollback()
         return jsonify({'error': 'Selected dates overlap with existing booking or blocked period'}), 400
     
     # Create new blocked date
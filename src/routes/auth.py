@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_user, logout_user, login_required, current_user
 from src.models import User
 from src.database import db
+from src.settings import settings
 
 bp = Blueprint('auth', __name__)
 
@@ -9,7 +10,7 @@ bp = Blueprint('auth', __name__)
 def login():
     if request.method == 'POST':
         access_code = request.form.get('access_code')
-        if access_code == current_app.config['DEFAULT_ACCESS_CODE']:
+        if access_code == settings.get('access_code'):
             # Create or get a non-admin user
             user = User.query.filter_by(username='user').first()
             if not user:
@@ -32,8 +33,7 @@ def admin_login():
             # Create or get admin user
             admin = User.query.filter_by(username='admin').first()
             if not admin:
-                default_template = current_app.config['WELCOME_EMAIL_TEMPLATE']
-                admin = User(username='admin', password_hash='', is_admin=True, welcome_template=default_template)
+                admin = User(username='admin', password_hash='', is_admin=True)
                 db.session.add(admin)
                 db.session.commit()
             login_user(admin)
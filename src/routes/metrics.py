@@ -0,0 +1,26 @@
+import hmac
+from flask import Blueprint, current_app, request
+from flask_login import current_user
+from src.metrics import metrics
+from src.rate_limiting import limiter
+
+bp = Blueprint('metrics', __name__)
+
+def authorized():
+    token = current_app.config['METRICS_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return current_user.is_authenticated and current_user.is_admin
+
+@bp.route('/metrics', methods=['GET'])
+def export_metrics():
+    if not authorized():
+        return 'Admin access required\n', 403, {'Content-Type': 'text/plain'}
+
+    # The limiter reports its own size; with SQLite storage that is shared by every worker
+    stats = limiter.stats()
+    body = metrics.render({
+        'homestay_rate_limiter_tracked_ips': ('Client IPs the rate limiter is tracking', stats['tracked_ips']),
+        'homestay_rate_limiter_memory_bytes': ('Approximate size of the rate limiter state', stats['memory_bytes']),
+    })
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
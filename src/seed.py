@@ -0,0 +1,102 @@
+import random
+import click
+from datetime import datetime, timedelta
+from flask.cli import with_appcontext
+from src.database import db
+from src.models import Booking, BlockedDate
+
+FIRST_NAMES = ['Anna', 'Ben', 'Chloe', 'David', 'Elena', 'Farid', 'Grace', 'Hugo', 'Ines', 'Jonas',
+               'Keiko', 'Liam', 'Maya', 'Noah', 'Olga', 'Pedro', 'Quinn', 'Rosa', 'Sven', 'Tara']
+LAST_NAMES = ['Andersen', 'Brown', 'Costa', 'Dubois', 'Eriksen', 'Fischer', 'Garcia', 'Haddad',
+              'Ito', 'Jensen', 'Kowalski', 'Lopez', 'Müller', 'Novak', 'Okafor', 'Petrov']
+BLOCK_REASONS = ['Maintenance', 'Owner stay', 'Deep clean', 'Repairs', 'Family visit', '']
+
+# Stay lengths in nights and how often each occurs: mostly weekends and short
+# breaks, with the occasional week or fortnight
+STAY_NIGHTS = [1, 2, 3, 4, 5, 6, 7, 10, 14]
+STAY_WEIGHTS = [8, 20, 18, 12, 8, 5, 14, 3, 2]
+MEAN_STAY = sum(n * w for n, w in zip(STAY_NIGHTS, STAY_WEIGHTS)) / sum(STAY_WEIGHTS)
+
+def generate_calendar(start, end, occupancy=0.6, block_rate=0.05, rng=None):
+    """
+    Yield ('booking' | 'blocked', row) for a calendar between `start` and `end`
+
+    Ranges are laid out one after another with at least a day between them,
+    as the availability check requires, so a generated calendar never
+    overlaps itself. `occupancy` is the rough share of days taken and
+    `block_rate` the share of ranges that are blocked dates.
+    """
+    rng = rng or random.Random()
+    mean_gap = max(MEAN_STAY * (1 - occupancy) / occupancy, 0)
+    day = start
+    count = 0
+    while True:
+        if rng.random() < block_rate:
+            length = rng.randint(1, 5)
+            range_end = day + timedelta(days=length)
+            if range_end > end:
+                return
+            yield 'blocked', {'start_date': day, 'end_date': range_end, 'reason': rng.choice(BLOCK_REASONS)}
+        else:
+            nights = rng.choices(STAY_NIGHTS, STAY_WEIGHTS)[0]
+            range_end = day + timedelta(days=nights)
+            if range_end > end:
+                return
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            yield 'booking', {
+                'guest_name': f'{first} {last}',
+                'guest_email': f'{first.lower()}.{last.lower()}{count}@example.com',
+                'start_date': day,
+                'end_date': range_end,
+            }
+        count += 1
+        day = range_end + timedelta(days=1 + round(rng.expovariate(1 / mean_gap)) if mean_gap else 1)
+
+def seed_calendar(years=3, ahead_days=180, occupancy=0.6, block_rate=0.05, seed=None, batch_size=5000):
+    """
+    Bulk insert a generated calendar covering the last `years` years and the next `ahead_days` days
+
+    Returns (bookings, blocked dates) inserted. No emails are queued.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=round(years * 365.25))
+    batches = {'booking': [], 'blocked': []}
+    models = {'booking': Booking, 'blocked': BlockedDate}
+    counts = {'booking': 0, 'blocked': 0}
+    for kind, row in generate_calendar(start, today + timedelta(days=ahead_days), occupancy, block_rate,
+                                       random.Random(seed)):
+        batch = batches[kind]
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.execute(db.insert(models[kind]), batch)
+            counts[kind] += len(batch)
+            batch.clear()
+    for kind, batch in batches.items():
+        if batch:
+            db.session.execute(db.insert(models[kind]), batch)
+            counts[kind] += len(batch)
+    db.session.commit()
+    return counts['booking'], counts['blocked']
+
+@click.command('seed')
+@click.option('--years', default=3.0, show_default=True, help='Years of history to generate.')
+@click.option('--ahead', 'ahead_days', default=180, show_default=True, help='Days of future bookings.')
+@click.option('--occupancy', default=0.6, show_default=True, help='Rough share of days taken.')
+@click.option('--block-rate', default=0.05, show_default=True, help='Share of ranges that are blocked dates.')
+@click.option('--seed', type=int, default=None, help='Random seed, for a repeatable dataset.')
+@click.option('--clear', is_flag=True, help='Delete existing bookings and blocked dates first.')
+@with_appcontext
+def seed_command(years, ahead_days, occupancy, block_rate, seed, clear):
+    """Fill the calendar with realistic generated bookings and blocked dates"""
+    if not 0 < occupancy < 1:
+        raise click.BadParameter('must be between 0 and 1', param_hint='--occupancy')
+    if clear:
+        Booking.query.delete()
+        BlockedDate.query.delete()
+        db.session.commit()
+    else:
+        existing = Booking.query.count() + BlockedDate.query.count()
+        if existing:
+            raise click.ClickException(f'The calendar already has {existing} entries; pass --clear to replace them')
+    bookings, blocked = seed_calendar(years, ahead_days, occupancy, block_rate, seed)
+    click.echo(f'Added {bookings} bookings and {blocked} blocked dates')
@@ -0,0 +1,80 @@
+import threading
+from flask import current_app
+from src.database import db
+from src.models import Setting, User
+
+# Setting key -> config entry supplying its default
+DEFAULTS = {
+    'access_code': 'DEFAULT_ACCESS_CODE',
+    'welcome_template': 'WELCOME_EMAIL_TEMPLATE',
+}
+
+class SettingsStore:
+    """
+    Per-process cache of the settings table
+
+    Reads cost one `max(version)` lookup; the table is only reloaded when
+    another write (from any worker) has moved the version on. Unset keys fall
+    back to the app config.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """Reload the cached values if any setting changed since the last load"""
+        version = db.session.execute(db.select(db.func.max(Setting.version))).scalar() or 0
+        if version != self.version:
+            rows = db.session.execute(db.select(Setting.key, Setting.value)).all()
+            with self._lock:
+                self._values = dict(rows)
+                self.version = version
+
+    def _value(self, key):
+        if key in self._values:
+            return self._values[key]
+        return current_app.config[DEFAULTS[key]]
+
+    def get(self, key):
+        self.sync()
+        with self._lock:
+            return self._value(key)
+
+    def snapshot(self):
+        """Return every setting after a single version check"""
+        self.sync()
+        with self._lock:
+            return {key: self._value(key) for key in DEFAULTS}
+
+    def set(self, key, value, commit=True):
+        """Store `value` under the next version number"""
+        if key not in DEFAULTS:
+            raise KeyError(key)
+        next_version = db.select(db.func.coalesce(db.func.max(Setting.version), 0) + 1).scalar_subquery()
+        setting = db.session.get(Setting, key)
+        if setting is None:
+            setting = Setting(key=key)
+            db.session.add(setting)
+        setting.value = value
+        setting.version = next_version
+        if commit:
+            db.session.commit()
+
+    def import_legacy(self):
+        """Carry a welcome template saved on the admin user over to the settings table"""
+        if db.session.get(Setting, 'welcome_template') is not None:
+            return
+        template = db.session.execute(
+            db.select(User.welcome_template).filter_by(username='admin')
+        ).scalar()
+        if template:
+            self.set('welcome_template', template)
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+            self.version = None
+
+settings = SettingsStore()
@@ -60,6 +60,40 @@ async function updateWelcomeTemplate() {
     }
 }
 
+async function previewWelcomeTemplate() {
+    const template = document.getElementById('welcomeTemplate').value;
+    const error = document.getElementById('welcomeTemplateError');
+    const preview = document.getElementById('welcomeTemplatePreview');
+    
+    if (!template) {
+        error.classList.remove('hidden');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/admin/welcome-template/preview', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ template }),
+        });
+        const data = await response.json();
+
+        if (response.ok) {
+            error.classList.add('hidden');
+            preview.srcdoc = data.html;
+            preview.classList.remove('hidden');
+        } else {
+            error.textContent = data.error || 'Failed to preview template';
+            error.classList.remove('hidden');
+            preview.classList.add('hidden');
+        }
+    } catch (error) {
+        console.error('Error previewing welcome template:', error);
+    }
+}
+
 async function executeDelete() {
     if (!deleteBookingId && !deleteBlockedId) return;
     
@@ -174,3 +208,95 @@ async function createBlockedDate() {
         document.getElementById('blockError').classList.remove('hidden');
     }
 }
+
+function tableCell(className, ...children) {
+    const cell = document.createElement('td');
+    cell.className = `px-2 py-3 text-sm ${className}`;
+    cell.append(...children);
+    return cell;
+}
+
+function dateRangeCell(item) {
+    const start = document.createElement('div');
+    start.textContent = item.start_date;
+    const to = document.createElement('div');
+    to.className = 'text-xs text-gray-500';
+    to.textContent = 'to';
+    const end = document.createElement('div');
+    end.textContent = item.end_date;
+    return tableCell('text-gray-900', start, to, end);
+}
+
+function deleteButton(onClick) {
+    const button = document.createElement('button');
+    button.className = 'text-red-600 hover:text-red-900';
+    button.textContent = 'Delete';
+    button.addEventListener('click', onClick);
+    return tableCell('text-gray-900', button);
+}
+
+function bookingRow(booking) {
+    const row = document.createElement('tr');
+    row.className = 'hover:bg-gray-50';
+    row.append(
+        tableCell('text-gray-900', booking.guest_name),
+        tableCell('text-gray-900 hidden sm:table-cell', booking.guest_email),
+        dateRangeCell(booking),
+        tableCell('text-gray-900 hidden sm:table-cell', booking.created_at),
+        deleteButton(() => confirmDelete(booking.id, booking.guest_name))
+    );
+    return row;
+}
+
+function blockedDateRow(blocked) {
+    const reason = blocked.reason || 'Owner unavailable';
+    const row = document.createElement('tr');
+    row.className = 'hover:bg-gray-50';
+    row.append(
+        tableCell('text-gray-900', reason),
+        dateRangeCell(blocked),
+        tableCell('text-gray-900 hidden sm:table-cell', blocked.created_at),
+        deleteButton(() => confirmDeleteBlocked(blocked.id, reason))
+    );
+    return row;
+}
+
+// Fetch the page after the button's cursor and append it to the table
+async function loadMore(url, tableId, buttonId, renderRow) {
+    const button = document.getElementById(buttonId);
+    button.disabled = true;
+
+    try {
+        // Keep the filter and sort the first page was rendered with
+        const current = new URLSearchParams(window.location.search);
+        const params = new URLSearchParams();
+        ['when', 'order', 'q'].forEach(key => {
+            if (current.has(key)) params.set(key, current.get(key));
+        });
+        params.set('after', button.dataset.next);
+        const response = await fetch(`${url}?${params}`);
+        const data = await response.json();
+
+        if (!response.ok) {
+            alert(data.error || 'Failed to load more rows. Please try again.');
+            return;
+        }
+
+        const body = document.querySelector(`#${tableId} tbody`);
+        body.append(...data.items.map(renderRow));
+        button.dataset.next = data.next || '';
+        button.classList.toggle('hidden', !data.next);
+    } catch (error) {
+        alert('An error occurred. Please try again.');
+    } finally {
+        button.disabled = false;
+    }
+}
+
+function loadMoreBookings() {
+    return loadMore('/admin/bookings', 'bookingsTable', 'bookingsMore', bookingRow);
+}
+
+function loadMoreBlockedDates() {
+    return loadMore('/admin/blocked-dates', 'blockedDatesTable', 'blockedDatesMore', blockedDateRow);
+}
@@ -12,6 +12,76 @@ function updateEndDateMin(startDate) {
     }
 }
 
+function toCalendarEvent(event) {
+    // Add data attributes and adjust end date
+    event.allDay = true;
+    event.display = 'block';
+    event.start = new Date(event.start);
+    event.end = new Date(new Date(event.end).getTime() + 24*60*60*1000);
+    return event;
+}
+
+// Data versions of the events on screen and of the change stream's start
+let loadedVersion = null;
+let streamVersion = null;
+
+function refetchIfBehind() {
+    if (loadedVersion !== null && streamVersion !== null && loadedVersion < streamVersion) {
+        loadedVersion = null;
+        calendar.refetchEvents();
+    }
+}
+
+function noteLoadedVersion(content, response) {
+    const version = parseInt(response.headers.get('X-Data-Version'), 10);
+    if (!Number.isNaN(version)) {
+        loadedVersion = version;
+        refetchIfBehind();
+    }
+    return content;
+}
+
+function followChanges(applyInPlace) {
+    // Keep the open calendar current from the server's change feed instead of polling
+    if (!window.EventSource) return;
+    const changes = new EventSource('/api/changes');
+
+    // Browsers don't reconnect after an error status, such as the 503 sent
+    // when the server has too many streams open; try again in a while
+    changes.addEventListener('error', function() {
+        if (changes.readyState === EventSource.CLOSED) {
+            setTimeout(() => followChanges(applyInPlace), 30000 + Math.random() * 30000);
+        }
+    });
+
+    // Anything committed between the first fetch and connecting is picked up
+    // here; refetching only then keeps a page load to two API requests
+    changes.addEventListener('ready', function(message) {
+        streamVersion = JSON.parse(message.data).version;
+        refetchIfBehind();
+    });
+
+    changes.addEventListener('changes', function(message) {
+        const updates = JSON.parse(message.data);
+        if (!applyInPlace || updates.some(update => update.action === 'reset')) {
+            calendar.refetchEvents();
+            return;
+        }
+
+        const source = calendar.getEventSources()[0];
+        updates.forEach(function(update) {
+            const event = update.event || update;
+            // Bookings and blocked dates number their ids separately
+            calendar.getEvents()
+                .filter(existing => existing.id === String(event.id) && existing.extendedProps.type === event.type)
+                .forEach(existing => existing.remove());
+            if (update.action === 'add') {
+                calendar.addEvent(toCalendarEvent(event), source);
+            }
+        });
+    });
+}
+
 function initializeCalendar(elementId, options = {}) {
     const calendarEl = document.getElementById(elementId);
     window.calendar = new FullCalendar.Calendar(calendarEl, {
@@ -37,14 +107,8 @@ function initializeCalendar(elementId, options = {}) {
         },
         titleFormat: { year: 'numeric', month: 'long' },
         events: '/api/bookings',
-        eventDataTransform: function(event) {
-            // Add data attributes and adjust end date
-            event.allDay = true;
-            event.display = 'block';
-            event.start = new Date(event.start);
-            event.end = new Date(new Date(event.end).getTime() + 24*60*60*1000);
-            return event;
-        },
+        eventSourceSuccess: noteLoadedVersion,
+        eventDataTransform: toCalendarEvent,
         eventDisplay: 'block',
         eventColor: options.eventColor || '#3B82F6',
         eventContent: options.eventContent || function(arg) {
@@ -129,6 +193,12 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     } else {
-        initializeCalendar('calendar');
+        // Guests only need to see which days are taken
+        initializeCalendar('calendar', {
+            events: '/api/availability'
+        });
     }
+
+    // Admins get individual events to patch in; guests' merged ranges are refetched
+    followChanges(isAdmin);
 });
@@ -0,0 +1,91 @@
+import threading
+from datetime import datetime, timedelta, UTC
+from src.database import db
+from src.models import Booking
+from src.models.epoch_day import epoch_day
+from src.availability import current_version
+
+OCCUPANCY_WINDOWS = (30, 90)
+
+def occupied_nights(window_start, window_end):
+    """SQL expression for the nights of a booking falling inside the window"""
+    # Bookings never overlap, so summing the clipped stays gives booked nights.
+    # CASE rather than two-argument min()/max(), which only SQLite has
+    end, start = epoch_day(window_end), epoch_day(window_start)
+    nights = db.case((Booking.end_day < end, Booking.end_day), else_=end) \
+        - db.case((Booking.start_day > start, Booking.start_day), else_=start)
+    return db.case((nights > 0, nights), else_=0)
+
+def compute_summary(now):
+    """Return the dashboard statistics as of `now` (naive UTC) in one query"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    next_booking = db.select(Booking.guest_name, Booking.start_date) \
+        .filter(Booking.start_date > now) \
+        .order_by(Booking.start_date.asc()) \
+        .limit(1) \
+        .subquery()
+
+    row = db.session.execute(db.select(
+        db.func.count(Booking.id),
+        db.func.sum(db.case((Booking.end_day >= epoch_day(today), 1), else_=0)),
+        *(db.func.sum(occupied_nights(today, today + timedelta(days=days))) for days in OCCUPANCY_WINDOWS),
+        db.select(next_booking.c.guest_name).scalar_subquery(),
+        db.select(next_booking.c.start_date).scalar_subquery(),
+    )).one()
+
+    total, upcoming, *nights, next_name, next_start = row
+    upcoming = upcoming or 0
+    summary = {
+        'total_bookings': total,
+        'upcoming_bookings': upcoming,
+        'past_bookings': total - upcoming,
+        'next_guest': None
+    }
+    for days, booked in zip(OCCUPANCY_WINDOWS, nights):
+        summary[f'occupancy_{days}'] = round(100 * (booked or 0) / days, 1)
+    if next_name is not None:
+        summary['next_guest'] = {'name': next_name, 'start_date': next_start}
+    return summary
+
+class DashboardSummary:
+    """
+    Per-process cache of the dashboard statistics
+
+    The cached result is dropped when the DataVersion moves on (any booking or
+    blocked date change, in any worker), at midnight, and when the next guest
+    arrives, since those are the only things that change the numbers.
+    """
+
+    def __init__(self):
+        self._cached = None  # (version, valid_until, summary)
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = datetime.now(UTC).replace(tzinfo=None)
+        version = current_version()
+        with self._lock:
+            cached = self._cached
+        if cached is None or cached[0] != version or now >= cached[1]:
+            summary = compute_summary(now)
+            valid_until = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            if summary['next_guest'] is not None:
+                valid_until = min(valid_until, summary['next_guest']['start_date'])
+            cached = version, valid_until, summary
+            with self._lock:
+                self._cached = cached
+
+        summary = dict(cached[2])
+        if summary['next_guest'] is not None:
+            start_date = summary['next_guest']['start_date']
+            summary['next_guest'] = {
+                'name': summary['next_guest']['name'],
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'days': (start_date - now).days
+            }
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._cached = None
+
+dashboard_summary = DashboardSummary()
@@ -4,59 +4,64 @@ import socket
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask import current_app
+from src.utils.smtp_pool import smtp_pool, smtp_settings
+from src.settings import settings
+from src.metrics import metrics
+from src.utils.templates import compile_template, TemplateError
 
-def send_email(to_email, subject, body, is_html=False, max_retries=3, retry_delay=2):
+def build_message(to_email, subject, body, is_html=False):
+    """Build a MIME message from the configured sender"""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = current_app.config['SMTP_FROM_EMAIL']
+    msg['To'] = to_email
+    
+    # Attach body
+    content_type = 'html' if is_html else 'plain'
+    msg.attach(MIMEText(body, content_type))
+    return msg
+
+def send_emails(emails, max_retries=3, retry_delay=2):
     """
-    Send an email using the configured SMTP server
+    Send several emails over one pooled SMTP session
     
     Args:
-        to_email (str): Recipient email address
-        subject (str): Email subject
-        body (str): Email body content
-        is_html (bool): Whether the body is HTML content
-        max_retries (int): Maximum number of retry attempts
+        emails (list): (to_email, subject, body, is_html) tuples
+        max_retries (int): Maximum number of attempts for each email
         retry_delay (int): Delay between retries in seconds
     
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        list: One bool per email, True if it was sent successfully
     """
     # Skip sending emails in test mode
     if not current_app.config.get('SEND_EMAILS', False):
-        current_app.logger.info(f"Email sending disabled - would have sent to {to_email}: {subject}")
-        return True
+        for to_email, subject, _, _ in emails:
+            current_app.logger.info(f"Email sending disabled - would have sent to {to_email}: {subject}")
+        return [True] * len(emails)
 
-    # Get email configuration from app config
-    smtp_server = current_app.config['SMTP_SERVER']
-    smtp_port = current_app.config['SMTP_PORT']
-    smtp_username = current_app.config['SMTP_USERNAME']
-    smtp_password = current_app.config['SMTP_PASSWORD']
-    from_email = current_app.config['SMTP_FROM_EMAIL']
+    settings = smtp_settings()
+    pending = [(index, to_email, build_message(to_email, subject, body, is_html))
+               for index, (to_email, subject, body, is_html) in enumerate(emails)]
+    results = [False] * len(emails)
     
-    # Create message
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = from_email
-    msg['To'] = to_email
-    
-    # Attach body
-    content_type = 'html' if is_html else 'plain'
-    msg.attach(MIMEText(body, content_type))
-    
-    current_app.logger.info(f"Attempting to send email to {to_email} via {smtp_server}:{smtp_port}")
+    current_app.logger.info(f"Attempting to send {len(emails)} email(s) via {settings.server}:{settings.port}")
+    started = time.perf_counter()
     
     # Try sending with retries
     for attempt in range(1, max_retries + 1):
+        if attempt > 1:
+            metrics.inc('homestay_email_retries_total')
         try:
-            current_app.logger.debug(f"Email attempt {attempt}/{max_retries}: Connecting to SMTP server")
-            with smtplib.SMTP(smtp_server, smtp_port, timeout=10) as server:
-                current_app.logger.debug("Starting TLS connection")
-                server.starttls()
-                current_app.logger.debug(f"Logging in as {smtp_username}")
-                server.login(smtp_username, smtp_password)
-                current_app.logger.debug(f"Sending message to {to_email}")
-                server.send_message(msg)
-                current_app.logger.info(f"Email successfully sent to {to_email}")
-                return True
+            with smtp_pool.connection(settings) as server:
+                for index, to_email, msg in pending:
+                    try:
+                        current_app.logger.debug(f"Sending message to {to_email}")
+                        server.send_message(msg)
+                        results[index] = True
+                        current_app.logger.info(f"Email successfully sent to {to_email}")
+                    except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                        # Rejected message; the session itself is still usable
+                        current_app.logger.warning(f"SMTP error for {to_email} on attempt {attempt}/{max_retries}: {str(e)}")
         except socket.timeout as e:
             current_app.logger.warning(f"SMTP timeout on attempt {attempt}/{max_retries}: {str(e)}")
         except smtplib.SMTPServerDisconnected as e:
@@ -66,16 +71,41 @@ def send_email(to_email, subject, body, is_html=False, max_retries=3, retry_dela
         except Exception as e:
             current_app.logger.error(f"Unexpected error on attempt {attempt}/{max_retries}: {str(e)}")
         
+        pending = [item for item in pending if not results[item[0]]]
+        if not pending:
+            break
+        
         # Don't sleep after the last attempt
         if attempt < max_retries:
             current_app.logger.info(f"Retrying in {retry_delay} seconds...")
             time.sleep(retry_delay)
     
-    current_app.logger.error(f"Failed to send email to {to_email} after {max_retries} attempts")
-    return False
+    for _, to_email, _ in pending:
+        current_app.logger.error(f"Failed to send email to {to_email} after {max_retries} attempts")
+    metrics.observe('homestay_email_send_duration_seconds', time.perf_counter() - started)
+    metrics.inc('homestay_emails_total', len(emails) - len(pending), result='sent')
+    metrics.inc('homestay_emails_total', len(pending), result='failed')
+    return results
+
+def send_email(to_email, subject, body, is_html=False, max_retries=3, retry_delay=2):
+    """
+    Send an email using the configured SMTP server
+    
+    Args:
+        to_email (str): Recipient email address
+        subject (str): Email subject
+        body (str): Email body content
+        is_html (bool): Whether the body is HTML content
+        max_retries (int): Maximum number of retry attempts
+        retry_delay (int): Delay between retries in seconds
+    
+    Returns:
+        bool: True if email was sent successfully, False otherwise
+    """
+    return send_emails([(to_email, subject, body, is_html)], max_retries, retry_delay)[0]
 
-def send_booking_notification_to_owner(booking):
-    """Send notification email to owner about new booking"""
+def build_owner_notification(booking):
+    """Return (to_email, subject, body, is_html) for the owner's new booking notice"""
     owner_email = current_app.config['OWNER_EMAIL']
     subject = f"New Booking: {booking.guest_name}"
     
@@ -89,27 +119,20 @@ def send_booking_notification_to_owner(booking):
     Created: {booking.created_at.strftime('%Y-%m-%d %H:%M')}
     """
     
-    current_app.logger.info(f"Sending booking notification to owner ({owner_email}) for booking ID: {booking.id}")
-    result = send_email(owner_email, subject, body)
-    if not result:
-        current_app.logger.error(f"Failed to send owner notification for booking ID: {booking.id}")
-    return result
+    return owner_email, subject, body, False
 
-def send_welcome_email_to_guest(booking):
-    """Send welcome email to guest"""
+def build_welcome_email(booking):
+    """Return (to_email, subject, body, is_html) for the guest's welcome email"""
     subject = "Your Booking Confirmation"
     
-    # Get welcome message template from app config
-    welcome_template = current_app.config.get('WELCOME_EMAIL_TEMPLATE', 
-        "Thank you for your booking. We look forward to your stay!")
+    # Get welcome message template from the shared settings; it is compiled
+    # once per distinct template text and validated when saved
+    try:
+        template = compile_template(settings.get('welcome_template'))
+    except TemplateError as e:
+        current_app.logger.error(f"Stored welcome template is invalid, using the default: {str(e)}")
+        template = compile_template(current_app.config['WELCOME_EMAIL_TEMPLATE'])
     
-    # Replace placeholders with actual booking data
-    body = welcome_template.replace('{guest_name}', booking.guest_name)
-    body = body.replace('{start_date}', booking.start_date.strftime('%Y-%m-%d'))
-    body = body.replace('{end_date}', booking.end_date.strftime('%Y-%m-%d'))
+    body = template.render(booking)
     
-    current_app.logger.info(f"Sending welcome email to guest ({booking.guest_email}) for booking ID: {booking.id}")
-    result = send_email(booking.guest_email, subject, body, is_html=True)
-    if not result:
-        current_app.logger.error(f"Failed to send welcome email to guest for booking ID: {booking.id}")
-    return result
+    return booking.guest_email, subject, body, True
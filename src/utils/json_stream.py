@@ -0,0 +1,39 @@
+import json
+
+# orjson is optional; when it's installed, encoding is several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def encode_default(value):
+    # Dates go out as ISO 8601, the same as orjson writes them natively
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps(value):
+    """Encode `value` as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), default=encode_default).encode()
+
+def iter_json_array(items, chunk_size=500):
+    """
+    Yield the JSON encoding of the iterable `items` as a list, a chunk at a time
+
+    Only `chunk_size` items are held at once, so a large result set streams
+    into the response without ever being built as one list or one string.
+    """
+    yield b'['
+    chunk = []
+    first = True
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield (b'' if first else b',') + dumps(chunk)[1:-1]
+            chunk.clear()
+            first = False
+    if chunk:
+        yield (b'' if first else b',') + dumps(chunk)[1:-1]
+    yield b']'
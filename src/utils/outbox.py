@@ -0,0 +1,189 @@
+import threading
+import click
+from datetime import datetime, timedelta, UTC
+from flask import current_app
+from flask.cli import with_appcontext
+from src.database import db
+from src.utils.smtp_pool import smtp_pool
+from src.metrics import metrics
+from src.models import OutboxMessage
+from src.utils.email import send_emails, build_owner_notification, build_welcome_email
+
+def queue_email(to_email, subject, body, is_html=False):
+    """
+    Add an email to the outbox in the caller's transaction
+
+    Nothing is sent until the surrounding transaction commits and a delivery
+    worker picks the message up, so a rolled back request never sends mail.
+    """
+    message = OutboxMessage(to_email=to_email, subject=subject, body=body, is_html=is_html)
+    db.session.add(message)
+    return message
+
+def queue_booking_emails(booking):
+    """Queue the owner notification and guest welcome email for a flushed booking"""
+    for to_email, subject, body, is_html in (build_owner_notification(booking), build_welcome_email(booking)):
+        queue_email(to_email, subject, body, is_html=is_html)
+
+def retry_delay(attempts):
+    """Exponential backoff in seconds after `attempts` failed deliveries"""
+    base = current_app.config['OUTBOX_RETRY_BASE_SECONDS']
+    return min(base * 2 ** (attempts - 1), current_app.config['OUTBOX_RETRY_MAX_SECONDS'])
+
+def lease_until(now):
+    return now + timedelta(seconds=current_app.config['OUTBOX_LEASE_SECONDS'])
+
+def claim_due_messages(now):
+    """
+    Lease due messages to this worker so concurrent workers never send one twice
+
+    Returns (message ids, lease). The lease timestamp doubles as this worker's
+    claim: another worker that takes a message over after it expires writes
+    its own, so `locked_until == lease` means the message is still ours.
+    """
+    lease = lease_until(now)
+    candidates = db.session.execute(
+        db.select(OutboxMessage.id)
+        .filter(OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at <= now)
+        .filter(db.or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until < now))
+        .order_by(OutboxMessage.next_attempt_at)
+        .limit(current_app.config['OUTBOX_BATCH_SIZE'])
+    ).scalars().all()
+
+    claimed = []
+    for message_id in candidates:
+        result = db.session.execute(
+            db.update(OutboxMessage)
+            .filter(OutboxMessage.id == message_id)
+            .filter(db.or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until < now))
+            .values(locked_until=lease)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(message_id)
+    db.session.commit()
+    return claimed, lease
+
+def renew_lease(message_id, lease):
+    """Extend our lease on a message and return the new one, or None if another worker took it over"""
+    renewed = lease_until(datetime.now(UTC))
+    result = db.session.execute(
+        db.update(OutboxMessage)
+        .filter(OutboxMessage.id == message_id, OutboxMessage.locked_until == lease)
+        .values(locked_until=renewed)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return renewed if result.rowcount == 1 else None
+
+def record_attempt(message_id, lease, delivered):
+    """Store the outcome of one delivery attempt, unless the lease was lost meanwhile"""
+    message = db.session.get(OutboxMessage, message_id)
+    attempts = message.attempts + 1
+    now = datetime.now(UTC)
+    values = {'attempts': attempts, 'locked_until': None}
+    if delivered:
+        values.update(status='sent', sent_at=now)
+    elif attempts >= current_app.config['OUTBOX_MAX_ATTEMPTS']:
+        values.update(status='failed', last_error=f'Gave up after {attempts} attempts')
+        current_app.logger.error(f"Giving up on outbox message {message_id} to {message.to_email}")
+    else:
+        delay = retry_delay(attempts)
+        values.update(next_attempt_at=now + timedelta(seconds=delay), last_error=f'Attempt {attempts} failed')
+        current_app.logger.warning(f"Outbox message {message_id} failed, retrying in {delay} seconds")
+
+    result = db.session.execute(
+        db.update(OutboxMessage)
+        .filter(OutboxMessage.id == message_id, OutboxMessage.locked_until == lease)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        current_app.logger.warning(f"Lost the lease on outbox message {message_id} while sending it")
+    return result.rowcount == 1
+
+def deliver_pending():
+    """
+    Send every due outbox message once
+
+    Failed messages are rescheduled with exponential backoff and marked failed
+    after OUTBOX_MAX_ATTEMPTS. Returns the number of messages sent.
+
+    A claimed batch can take longer than one lease (each send may wait out the
+    SMTP timeout), so the lease is renewed before every message and messages
+    another worker has taken over in the meantime are left to it.
+    """
+    sent = 0
+    message_ids, claimed_lease = claim_due_messages(datetime.now(UTC))
+    for message_id in message_ids:
+        lease = renew_lease(message_id, claimed_lease)
+        if lease is None:
+            continue
+        message = db.session.get(OutboxMessage, message_id)
+        # Pooled SMTP sessions are reused, so the batch still shares one connection
+        delivered = send_emails([(message.to_email, message.subject, message.body, message.is_html)],
+                                max_retries=1)[0]
+        if record_attempt(message_id, lease, delivered) and delivered:
+            sent += 1
+    return sent
+
+class OutboxWorker:
+    """Background thread that drains the outbox for one process"""
+
+    def __init__(self):
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_running(self, app):
+        """Start the delivery thread for this process unless disabled"""
+        if not app.config['OUTBOX_WORKER_THREAD']:
+            return False
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                # Threads don't survive a fork, so gunicorn workers each start their own
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopping.clear()
+                    self._thread = threading.Thread(target=self.run, args=(app,), name='outbox-worker', daemon=True)
+                    self._thread.start()
+        return True
+
+    def wake(self, app):
+        """Have the worker check the outbox right away"""
+        if self.ensure_running(app):
+            self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self, app):
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    deliver_pending()
+                    smtp_pool.evict_idle()
+                    # A standalone outbox worker serves no requests, so publish here
+                    metrics.maybe_publish()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Outbox delivery failed: {str(e)}")
+            self._wakeup.wait(app.config['OUTBOX_POLL_INTERVAL'])
+
+outbox_worker = OutboxWorker()
+
+@click.command('outbox-worker')
+@with_appcontext
+def outbox_worker_command():
+    """Deliver queued emails until interrupted"""
+    app = current_app._get_current_object()
+    app.logger.info('Outbox worker started')
+    try:
+        outbox_worker.run(app)
+    except KeyboardInterrupt:
+        app.logger.info('Outbox worker stopped')
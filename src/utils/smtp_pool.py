@@ -0,0 +1,120 @@
+import smtplib
+import threading
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from flask import current_app
+
+SMTPSettings = namedtuple('SMTPSettings', ['server', 'port', 'username', 'password', 'use_tls'])
+
+def smtp_settings():
+    """Return the SMTP settings from the app config, used as the pool key"""
+    config = current_app.config
+    return SMTPSettings(config['SMTP_SERVER'], config['SMTP_PORT'], config['SMTP_USERNAME'],
+                        config['SMTP_PASSWORD'], config.get('SMTP_USE_TLS', True))
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated SMTP sessions open between sends
+
+    Idle sessions are kept per server configuration. A session that has sat
+    idle for longer than `noop_interval` is checked with NOOP before reuse,
+    and sessions idle for longer than `idle_timeout` are closed.
+    """
+
+    def __init__(self, max_idle=2, idle_timeout=60, noop_interval=10):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.noop_interval = noop_interval
+        self._idle = defaultdict(list)  # settings -> [(connection, last_used)]
+        self._lock = threading.Lock()
+
+    def configure(self, max_idle, idle_timeout, noop_interval):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.noop_interval = noop_interval
+
+    def open(self, settings):
+        current_app.logger.debug(f"Connecting to SMTP server {settings.server}:{settings.port}")
+        server = smtplib.SMTP(settings.server, settings.port, timeout=10)
+        try:
+            if settings.use_tls:
+                current_app.logger.debug("Starting TLS connection")
+                server.starttls()
+            if settings.username:
+                current_app.logger.debug(f"Logging in as {settings.username}")
+                server.login(settings.username, settings.password)
+        except Exception:
+            self.discard(server)
+            raise
+        return server
+
+    @staticmethod
+    def discard(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def checkout(self, settings):
+        """Return a healthy idle session for `settings`, or a new one"""
+        self.evict_idle()
+        while True:
+            with self._lock:
+                if not self._idle[settings]:
+                    break
+                server, last_used = self._idle[settings].pop()
+            if time.monotonic() - last_used < self.noop_interval:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            current_app.logger.debug("Dropping stale SMTP connection")
+            server.close()
+        return self.open(settings)
+
+    def checkin(self, settings, server):
+        with self._lock:
+            if len(self._idle[settings]) < self.max_idle:
+                self._idle[settings].append((server, time.monotonic()))
+                return
+        self.discard(server)
+
+    @contextmanager
+    def connection(self, settings=None):
+        """Borrow a session; it goes back to the pool unless the block raised"""
+        settings = settings or smtp_settings()
+        server = self.checkout(settings)
+        try:
+            yield server
+        except BaseException:
+            server.close()
+            raise
+        self.checkin(settings, server)
+
+    def evict_idle(self):
+        """Close sessions that have been idle longer than idle_timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        with self._lock:
+            for settings, idle in self._idle.items():
+                expired.extend(server for server, last_used in idle if last_used < cutoff)
+                idle[:] = [(server, last_used) for server, last_used in idle if last_used >= cutoff]
+        for server in expired:
+            self.discard(server)
+        return len(expired)
+
+    def close_all(self):
+        with self._lock:
+            idle = [server for servers in self._idle.values() for server, _ in servers]
+            self._idle.clear()
+        for server in idle:
+            self.discard(server)
+
+    def idle_count(self):
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+smtp_pool = SMTPConnectionPool()
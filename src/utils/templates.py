@@ -0,0 +1,65 @@
+import re
+from functools import lru_cache
+from markupsafe import escape
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+# Placeholders available in the welcome email, rendered from a booking
+FIELDS = {
+    'guest_name': lambda booking: booking.guest_name,
+    'guest_email': lambda booking: booking.guest_email,
+    'start_date': lambda booking: booking.start_date.date().isoformat(),
+    'end_date': lambda booking: booking.end_date.date().isoformat(),
+    'start_date_long': lambda booking: booking.start_date.strftime('%A, %B %d, %Y'),
+    'end_date_long': lambda booking: booking.end_date.strftime('%A, %B %d, %Y'),
+    'nights': lambda booking: str((booking.end_date.date() - booking.start_date.date()).days),
+    'booking_id': lambda booking: str(booking.id),
+}
+
+class TemplateError(ValueError):
+    pass
+
+class CompiledTemplate:
+    """
+    A template parsed once into literal text and placeholder segments
+
+    `segments` alternates literal, field, literal, ..., literal. They are
+    joined into a format string with literal braces escaped, so rendering is a
+    single `format_map` with each field computed only once.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.fields = tuple(dict.fromkeys(segments[1::2]))
+        self._format = ''.join(
+            '{' + segment + '}' if i % 2 else segment.replace('{', '{{').replace('}', '}}')
+            for i, segment in enumerate(segments)
+        )
+
+    def render(self, booking, html=True):
+        if html:
+            values = {field: escape(FIELDS[field](booking)) for field in self.fields}
+        else:
+            values = {field: FIELDS[field](booking) for field in self.fields}
+        return self._format.format_map(values)
+
+@lru_cache(maxsize=16)
+def compile_template(text):
+    """
+    Parse `text` into a CompiledTemplate, raising TemplateError on unknown placeholders
+
+    Braces around anything other than a single word (CSS rules, for example)
+    are left as they are.
+    """
+    segments = []
+    position = 0
+    for match in PLACEHOLDER.finditer(text):
+        field = match.group(1)
+        if field not in FIELDS:
+            raise TemplateError(f'Unknown placeholder {{{field}}}. Available: '
+                                + ', '.join(f'{{{name}}}' for name in FIELDS))
+        segments.append(text[position:match.start()])
+        segments.append(field)
+        position = match.end()
+    segments.append(text[position:])
+    return CompiledTemplate(tuple(segments))
@@ -1,8 +1,20 @@
+import os
 import pytest
 import threading
+import socketserver
+from contextlib import contextmanager
+from email import message_from_bytes
+from flask import g
 from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page, expect
+from sqlalchemy import event
+# Read when src.config is imported; keeps the suite off instance/metrics.db
+os.environ['METRICS_STORAGE'] = 'memory'
+
 from src.app import create_app
 from src.database import db
+from src.models import User
+from src.rate_limiting import limiter
+from src.utils.smtp_pool import smtp_pool
 
 @pytest.fixture(scope="session")
 def app():
@@ -12,7 +24,8 @@ def app():
         'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
         'DEFAULT_ACCESS_CODE': '1234',
         'ADMIN_ACCESS_CODE': 'admin1234',
-        'SEND_EMAILS': False
+        'SEND_EMAILS': False,
+        'OUTBOX_WORKER_THREAD': False
     })
     
     with app.app_context():
@@ -20,10 +33,126 @@ def app():
         yield app
         db.drop_all()
 
+@pytest.fixture(autouse=True)
+def fresh_client_state(app):
+    """Clear rate limits and forget whoever an earlier test logged in"""
+    limiter.reset()
+    # The app context outlives requests, so login_user() sticks to it
+    g.pop('_login_user', None)
+
+def get_or_create_user(app, username, is_admin):
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            user = User(username=username, password_hash='', is_admin=is_admin)
+            db.session.add(user)
+            db.session.commit()
+        return user
+
+@pytest.fixture
+def admin_user(app):
+    return get_or_create_user(app, 'admin', is_admin=True)
+
+@pytest.fixture
+def regular_user(app):
+    return get_or_create_user(app, 'user', is_admin=False)
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost SMTP stub")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            verb = line.decode().strip().split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "MAIL":
+                if server.fail_next > 0:
+                    server.fail_next -= 1
+                    self.reply("451 Try again later")
+                else:
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                for line in iter(self.rfile.readline, b".\r\n"):
+                    data += line
+                server.messages.append(message_from_bytes(data))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                break
+            else:
+                self.reply("502 Command not implemented")
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """Local stand-in SMTP server that records every message it accepts"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPStubHandler)
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0  # Reject this many MAIL commands with a temporary error
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+@pytest.fixture(scope="function")
+def smtp_server(app, monkeypatch):
+    """Point the app's email settings at a local SMTP stub"""
+    server = SMTPStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setitem(app.config, 'SEND_EMAILS', True)
+    monkeypatch.setitem(app.config, 'SMTP_SERVER', '127.0.0.1')
+    monkeypatch.setitem(app.config, 'SMTP_PORT', server.port)
+    monkeypatch.setitem(app.config, 'SMTP_USE_TLS', False)
+    monkeypatch.setitem(app.config, 'SMTP_USERNAME', '')
+    yield server
+    smtp_pool.close_all()
+    server.shutdown()
+    server.server_close()
+
 @pytest.fixture(scope="function")
 def test_client(app):
     return app.test_client()
 
+@pytest.fixture(scope="function")
+def query_budget(app):
+    """
+    Fail the test if the block runs more than `limit` SQL statements
+
+        with query_budget(4):
+            test_client.get('/api/bookings')
+
+    Keeps N+1 queries from creeping back into an endpoint unnoticed.
+    """
+    @contextmanager
+    def budget(limit):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(' '.join(statement.split()))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        assert len(statements) <= limit, (
+            f'{len(statements)} queries, over the budget of {limit}:\n' + '\n'.join(statements))
+
+    return budget
+
 @pytest.fixture(scope="session")
 def base_url(app):
     # Start Flask server in a separate thread
@@ -1,37 +1,20 @@
+import json
 import pytest
 import time
+from datetime import datetime
+from flask import g
 from flask.testing import FlaskClient
 from flask_login import login_user
-from src.models import User
+from src.models import User, Booking, BlockedDate
 from src.database import db
 from src.rate_limiting import limiter
-
-@pytest.fixture
-def admin_user(app):
-    with app.app_context():
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(username='admin', password_hash='', is_admin=True)
-            db.session.add(admin)
-            db.session.commit()
-        return admin
-
-@pytest.fixture
-def regular_user(app):
-    with app.app_context():
-        user = User.query.filter_by(username='user').first()
-        if not user:
-            user = User(username='user', password_hash='', is_admin=False)
-            db.session.add(user)
-            db.session.commit()
-        return user
-
-@pytest.fixture(autouse=True)
-def reset_limiter():
-    """Reset rate limiter between tests"""
-    limiter.violations.clear()
-    limiter.ban_until.clear()
-    limiter.request_times.clear()
+from src.identity import bump_users_version
+from src.settings import settings
+from src.response_cache import events_cache
+from src.utils import json_stream
+from src.routes import api
+from src.availability import current_version
+from sqlalchemy import event
 
 def test_rate_limit_basic(test_client: FlaskClient):
     """Test basic rate limiting (3 requests per second)"""
@@ -64,10 +47,14 @@ def test_update_access_code_success(test_client: FlaskClient, app, admin_user):
         db.session.refresh(admin_user)
         with app.test_request_context():
             login_user(admin_user)
-            response = test_client.put('/api/access-code', json={'code': '5678'})
-            assert response.status_code == 200
-            assert response.json['message'] == 'Access code updated successfully'
-            assert app.config['DEFAULT_ACCESS_CODE'] == '5678'
+            try:
+                response = test_client.put('/api/access-code', json={'code': '5678'})
+                assert response.status_code == 200
+                assert response.json['message'] == 'Access code updated successfully'
+                assert settings.get('access_code') == '5678'
+            finally:
+                # Later tests log guests in with the configured code
+                settings.set('access_code', app.config['DEFAULT_ACCESS_CODE'])
 
 def test_update_access_code_unauthorized(test_client: FlaskClient, app, regular_user):
     with app.app_context():
@@ -92,3 +79,313 @@ def test_update_access_code_missing_code(test_client: FlaskClient, app, admin_us
         response = test_client.put('/api/access-code', json={})
         assert response.status_code == 400
         assert response.json['error'] == 'New access code is required'
+
+@pytest.fixture
+def calendar_history(app):
+    """One booking and one block in October plus a booking in December"""
+    with app.app_context():
+        Booking.query.delete()
+        BlockedDate.query.delete()
+        db.session.add_all([
+            Booking(guest_name='October Guest', guest_email='oct@example.com',
+                    start_date=datetime(2030, 10, 10), end_date=datetime(2030, 10, 12)),
+            Booking(guest_name='December Guest', guest_email='dec@example.com',
+                    start_date=datetime(2030, 12, 20), end_date=datetime(2030, 12, 24)),
+            BlockedDate(start_date=datetime(2030, 10, 20), end_date=datetime(2030, 10, 22),
+                        reason='Maintenance'),
+        ])
+        db.session.commit()
+    yield
+    with app.app_context():
+        Booking.query.delete()
+        BlockedDate.query.delete()
+        db.session.commit()
+
+def test_get_bookings_window(test_client: FlaskClient, app, regular_user, calendar_history):
+    with app.test_request_context():
+        login_user(regular_user)
+        # FullCalendar's month view for October 2030, sent with the browser's UTC offset
+        response = test_client.get('/api/bookings', query_string={
+            'start': '2030-09-29T00:00:00-04:00',
+            'end': '2030-11-09T00:00:00-04:00',
+        })
+        assert response.status_code == 200
+        assert sorted(event['start'][:10] for event in response.json) == ['2030-10-10', '2030-10-20']
+
+        response = test_client.get('/api/bookings', query_string={
+            'start': '2030-09-29', 'end': '2030-11-09', 'type': 'blocked',
+        })
+        assert response.status_code == 200
+        assert [event['type'] for event in response.json] == ['blocked']
+
+def test_get_bookings_window_edges(test_client: FlaskClient, app, regular_user, calendar_history):
+    with app.test_request_context():
+        login_user(regular_user)
+        # The December stay is drawn through the 24th, so a window opening that day includes it
+        response = test_client.get('/api/bookings', query_string={
+            'start': '2030-12-24', 'end': '2031-01-01',
+        })
+        assert [event['start'][:10] for event in response.json] == ['2030-12-20']
+
+        response = test_client.get('/api/bookings', query_string={
+            'start': '2030-12-25', 'end': '2031-01-01',
+        })
+        assert response.json == []
+
+        # Ends are exclusive, and a stay starting later in the day than the bound is left out
+        with app.app_context():
+            db.session.add(Booking(guest_name='Evening Guest', guest_email='eve@example.com',
+                                   start_date=datetime(2030, 12, 28, 18), end_date=datetime(2030, 12, 30)))
+            db.session.commit()
+        for end, starts in (('2030-12-20', []), ('2030-12-20T12:00:00', ['2030-12-20']),
+                            ('2030-12-28T12:00:00', ['2030-12-20']), ('2030-12-28T19:00:00', ['2030-12-20', '2030-12-28'])):
+            limiter.reset()
+            response = test_client.get('/api/bookings', query_string={'start': '2030-12-01', 'end': end})
+            assert sorted(event['start'][:10] for event in response.json) == starts
+
+def test_get_bookings_slim_for_regular_users(test_client: FlaskClient, app, regular_user, calendar_history):
+    with app.test_request_context():
+        login_user(regular_user)
+        response = test_client.get('/api/bookings', query_string={'start': '2030-09-29', 'end': '2030-11-09'})
+        assert response.status_code == 200
+        assert sorted(response.json, key=lambda event: event['start']) == [
+            {'start': '2030-10-10T00:00:00', 'end': '2030-10-12T00:00:00', 'type': 'booking'},
+            {'start': '2030-10-20T00:00:00', 'end': '2030-10-22T00:00:00', 'type': 'blocked'},
+        ]
+        assert b'oct@example.com' not in response.data
+        assert b'Maintenance' not in response.data
+
+def test_get_bookings_full_for_admin(test_client: FlaskClient, app, admin_user, calendar_history):
+    with app.test_request_context():
+        login_user(admin_user)
+        response = test_client.get('/api/bookings', query_string={'start': '2030-09-29', 'end': '2030-11-09'})
+        assert response.status_code == 200
+        events = {event['type']: event for event in response.json}
+        assert events['booking']['guest_email'] == 'oct@example.com'
+        assert events['blocked']['reason'] == 'Maintenance'
+
+@pytest.mark.parametrize('backend', ['orjson', 'json'])
+@pytest.mark.parametrize('count', [0, 1, 3, 7])
+def test_iter_json_array(monkeypatch, backend, count):
+    if backend == 'json':
+        monkeypatch.setattr(json_stream, 'orjson', None)
+    items = [{'id': i, 'start': datetime(2031, 1, i + 1), 'reason': 'a "quoted" reason'} for i in range(count)]
+    body = b''.join(json_stream.iter_json_array(iter(items), chunk_size=3))
+    assert json.loads(body) == [{**item, 'start': item['start'].isoformat()} for item in items]
+
+def test_get_bookings_streams_large_payloads(test_client: FlaskClient, app, admin_user, calendar_history, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_AFTER', 1)
+    monkeypatch.setattr(events_cache, 'max_body_bytes', 100)
+    events_cache.clear()
+    with app.test_request_context():
+        login_user(admin_user)
+        response = test_client.get('/api/bookings', query_string={'start': '2030-09-29', 'end': '2030-11-09'})
+        assert response.status_code == 200
+        assert 'Content-Length' not in response.headers
+        assert len(response.json) == 2
+        # Too big to keep, but the ETag still lets the browser revalidate
+        assert events_cache._entries == {}
+        response = test_client.get('/api/bookings', query_string={'start': '2030-09-29', 'end': '2030-11-09'},
+                                   headers={'If-None-Match': response.headers['ETag']})
+        assert response.status_code == 304
+
+def test_get_availability_merges_busy_ranges(test_client: FlaskClient, app, regular_user, calendar_history):
+    with app.app_context():
+        db.session.add_all([
+            # Overlaps the October block, and a stay starting the day after it ends
+            BlockedDate(start_date=datetime(2030, 10, 21), end_date=datetime(2030, 10, 25)),
+            Booking(guest_name='Back to back', guest_email='b2b@example.com',
+                    start_date=datetime(2030, 10, 26), end_date=datetime(2030, 10, 28)),
+        ])
+        db.session.commit()
+
+    with app.test_request_context():
+        login_user(regular_user)
+        response = test_client.get('/api/availability', query_string={'start': '2030-09-29', 'end': '2030-11-09'})
+        assert response.status_code == 200
+        assert response.json == [
+            {'start': '2030-10-10T00:00:00', 'end': '2030-10-12T00:00:00'},
+            {'start': '2030-10-20T00:00:00', 'end': '2030-10-28T00:00:00'},
+        ]
+
+        response = test_client.get('/api/availability', query_string={'start': 'soon'})
+        assert response.status_code == 400
+
+def test_get_bookings_not_modified(test_client: FlaskClient, app, regular_user, calendar_history):
+    with app.test_request_context():
+        login_user(regular_user)
+        response = test_client.get('/api/bookings')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert not etag.startswith('W/')
+        # calendar.js compares this with the change stream's `ready` version
+        version = int(response.headers['X-Data-Version'])
+        assert version == current_version()
+
+        response = test_client.get('/api/bookings', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['X-Data-Version'] == str(version)
+
+        # Any booking change invalidates the cached payload and its ETag
+        with app.app_context():
+            db.session.add(Booking(guest_name='New Guest', guest_email='new@example.com',
+                                   start_date=datetime(2030, 11, 1), end_date=datetime(2030, 11, 3)))
+            db.session.commit()
+        response = test_client.get('/api/bookings', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert len(response.json) == 4
+
+def read_sse(response):
+    """Return the (id, event, data) messages of a finished event stream"""
+    messages = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            messages.append((fields.get('id'), fields['event'], json.loads(fields['data'])))
+    return messages
+
+@pytest.fixture
+def short_streams(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGES_STREAM_SECONDS', 0)
+
+def test_changes_stream_replays_admin_changes(test_client: FlaskClient, app, admin_user, calendar_history, short_streams):
+    with app.test_request_context():
+        login_user(admin_user)
+        with app.app_context():
+            since = current_version()
+            october = Booking.query.filter_by(guest_name='October Guest').one()
+            db.session.delete(october)
+            db.session.add(Booking(guest_name='New Guest', guest_email='new@example.com',
+                                   start_date=datetime(2030, 11, 1), end_date=datetime(2030, 11, 3)))
+            db.session.commit()
+            october_id = october.id
+
+        response = test_client.get('/api/changes', query_string={'since': since})
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        [(id, event, changes)] = read_sse(response)
+        assert (event, int(id)) == ('changes', since + 1)
+        assert {'action': 'remove', 'type': 'booking', 'id': october_id} in changes
+        [added] = [change['event'] for change in changes if change['action'] == 'add']
+        assert added['guest_name'] == 'New Guest'
+        assert added['start'] == '2030-11-01T00:00:00'
+
+        # Reconnecting browsers resume from the last id they saw
+        response = test_client.get('/api/changes', headers={'Last-Event-ID': id})
+        assert read_sse(response) == []
+
+def test_changes_stream_resets(test_client: FlaskClient, app, admin_user, regular_user, calendar_history, short_streams):
+    with app.test_request_context():
+        login_user(admin_user)
+        response = test_client.get('/api/changes')
+        [(id, event, data)] = read_sse(response)
+        assert event == 'ready' and data == {'version': int(id)}
+
+        # History from before the log starts can't be replayed
+        response = test_client.get('/api/changes', query_string={'since': -5})
+        assert read_sse(response)[0][2] == [{'action': 'reset'}]
+
+        limiter.reset()
+        response = test_client.get('/api/changes', query_string={'since': 'abc'})
+        assert response.status_code == 400
+
+        # Guests see merged busy ranges, which always refetch
+        login_user(regular_user)
+        response = test_client.get('/api/changes', query_string={'since': int(id) - 1})
+        assert read_sse(response)[0][1:] == ('changes', [{'action': 'reset'}])
+
+def test_changes_streams_are_capped(test_client: FlaskClient, app, regular_user, short_streams, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGES_MAX_STREAMS', 1)
+    with app.test_request_context():
+        login_user(regular_user)
+        release = api.stream_slots.claim(1)
+        try:
+            response = test_client.get('/api/changes')
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == str(api.BUSY_STREAM_RETRY)
+            assert response.get_data(as_text=True) == f'retry: {api.BUSY_STREAM_RETRY * 1000}\n\n'
+        finally:
+            release()
+
+        # Finished streams give their slot back
+        for _ in range(2):
+            limiter.reset()
+            response = test_client.get('/api/changes')
+            assert response.status_code == 200
+            assert read_sse(response)[0][1] == 'ready'
+        assert api.stream_slots.open == 0
+
+def test_get_bookings_invalid_window(test_client: FlaskClient, app, regular_user):
+    with app.test_request_context():
+        login_user(regular_user)
+        response = test_client.get('/api/bookings', query_string={'start': 'last-week'})
+        assert response.status_code == 400
+        assert response.json['error'] == 'Invalid date format'
+
+        response = test_client.get('/api/bookings', query_string={'type': 'holiday'})
+        assert response.status_code == 400
+        assert response.json['error'] == 'Invalid event type'
+
+def test_rate_limiter_stats(test_client: FlaskClient, app, admin_user, regular_user):
+    with app.test_request_context():
+        login_user(admin_user)
+        response = test_client.get('/api/rate-limiter')
+        assert response.status_code == 200
+        assert response.json['tracked_ips'] >= 1
+        assert response.json['memory_bytes'] > 0
+
+def test_rate_limiter_stats_unauthorized(test_client: FlaskClient, app, regular_user):
+    with app.test_request_context():
+        login_user(regular_user)
+        response = test_client.get('/api/rate-limiter')
+        assert response.status_code == 403
+
+def test_identity_is_cached(test_client: FlaskClient, app, admin_user):
+    test_client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def get_as_new_request(url):
+        # The session-wide app context would otherwise keep Flask-Login's
+        # per-request user around between test client calls
+        g.pop('_login_user', None)
+        statements.clear()
+        assert test_client.get(url).status_code == 200
+        return [statement for statement in statements if 'FROM user' in statement]
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        get_as_new_request('/api/availability')
+        assert get_as_new_request('/api/availability') == []
+        assert statements
+
+        # Saving a user row invalidates the cached identity
+        admin_user = db.session.merge(admin_user)
+        admin_user.password_hash = f'changed {time.time()}'
+        db.session.commit()
+        assert len(get_as_new_request('/api/availability')) == 1
+        limiter.reset()
+        assert get_as_new_request('/api/availability') == []
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+def test_identity_follows_other_workers_changes(test_client: FlaskClient, app, admin_user):
+    test_client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    assert test_client.get('/api/rate-limiter').status_code == 200
+
+    # Another worker's commit bumps the shared version along with the row
+    with db.engine.begin() as connection:
+        connection.execute(db.update(User).filter_by(id=admin_user.id).values(is_admin=False))
+        bump_users_version(connection)
+    try:
+        g.pop('_login_user', None)
+        assert test_client.get('/api/rate-limiter').status_code == 403
+    finally:
+        with db.engine.begin() as connection:
+            connection.execute(db.update(User).filter_by(id=admin_user.id).values(is_admin=True))
+            bump_users_version(connection)
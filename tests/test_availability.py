@@ -0,0 +1,248 @@
+import multiprocessing
+import sqlite3
+import pytest
+from datetime import date, datetime
+from flask.testing import FlaskClient
+from flask_login import login_user
+from sqlalchemy.exc import OperationalError
+from src.routes import api
+from src.availability import DayBitmap, IntervalIndex, availability
+from src.models import Booking, BlockedDate
+from src.database import db
+from src.rate_limiting import limiter
+
+def day(n):
+    return datetime(2031, 1, n)
+
+def test_interval_index_merges_touching_ranges():
+    index = IntervalIndex()
+    index.add(day(1), day(3), 'a')
+    index.add(day(5), day(7), 'b')
+    assert index.blocks() == [(day(1), day(3)), (day(5), day(7))]
+
+    index.add(day(3), day(5), 'c')
+    assert index.blocks() == [(day(1), day(7))]
+
+    index.remove('c')
+    assert index.blocks() == [(day(1), day(3)), (day(5), day(7))]
+
+def test_interval_index_overlaps_are_inclusive():
+    index = IntervalIndex()
+    index.add(day(10), day(12), 'a')
+    assert index.overlaps(day(12), day(14))
+    assert index.overlaps(day(8), day(10))
+    assert index.overlaps(day(9), day(20))
+    assert not index.overlaps(day(13), day(14))
+    assert not index.overlaps(day(1), day(9))
+
+def test_interval_index_remove_splits_block():
+    index = IntervalIndex()
+    index.load([(day(1), day(10), 'long'), (day(2), day(3), 'x'), (day(8), day(12), 'y')])
+    assert index.blocks() == [(day(1), day(12))]
+
+    index.remove('long')
+    assert index.blocks() == [(day(2), day(3)), (day(8), day(12))]
+    assert not index.overlaps(day(5), day(6))
+    assert len(index) == 2
+
+def test_day_bitmap_spans_years():
+    days = DayBitmap()
+    days.set(date(2030, 12, 30), date(2031, 1, 2))
+    assert days.any(date(2030, 12, 31), date(2030, 12, 31))
+    assert days.any(date(2031, 1, 2), date(2031, 1, 9))
+    assert not days.any(date(2031, 1, 3), date(2031, 12, 31))
+    assert days.count(date(2030, 1, 1), date(2031, 12, 31)) == 4
+
+    days.unset(date(2031, 1, 1), date(2031, 1, 2))
+    assert days.count(date(2030, 1, 1), date(2031, 12, 31)) == 2
+    assert days.next_occupied(date(2031, 1, 1)) is None
+
+    # Years added out of order are still searched in order
+    days.set(date(2035, 3, 1), date(2035, 3, 1))
+    days.set(date(2033, 5, 1), date(2033, 5, 1))
+    assert days.next_occupied(date(2031, 1, 1)) == date(2033, 5, 1)
+    days.unset(date(2033, 5, 1), date(2033, 5, 1))
+    assert days.next_occupied(date(2031, 1, 1)) == date(2035, 3, 1)
+
+def test_day_bitmap_first_gap():
+    days = DayBitmap()
+    days.load([(date(2031, 1, 1), date(2031, 1, 3)), (date(2031, 1, 6), date(2031, 1, 8)),
+               (date(2031, 1, 9), date(2031, 12, 31))])
+    assert days.first_gap(date(2031, 1, 1), 1) == date(2031, 1, 4)
+    assert days.first_gap(date(2031, 1, 1), 2) == date(2031, 1, 4)
+    assert days.first_gap(date(2031, 1, 1), 3) == date(2032, 1, 1)
+    assert days.first_gap(date(2030, 12, 29), 3) == date(2030, 12, 29)
+    assert days.first_gap(date(2030, 12, 30), 3) == date(2032, 1, 1)
+
+@pytest.fixture
+def empty_calendar(app):
+    with app.app_context():
+        Booking.query.delete()
+        BlockedDate.query.delete()
+        db.session.commit()
+    yield
+    with app.app_context():
+        Booking.query.delete()
+        BlockedDate.query.delete()
+        db.session.commit()
+
+def test_index_follows_session_changes(app, empty_calendar):
+    with app.app_context():
+        assert availability.is_free(day(1), day(5))
+
+        booking = Booking(guest_name='Guest', guest_email='guest@example.com',
+                          start_date=day(2), end_date=day(4))
+        db.session.add(booking)
+        db.session.commit()
+        version = availability.version
+        assert not availability.is_free(day(1), day(5))
+
+        db.session.delete(booking)
+        db.session.commit()
+        assert availability.version == version + 1
+        assert availability.is_free(day(1), day(5))
+
+def test_index_rebuilds_after_bulk_statements(app, empty_calendar):
+    with app.app_context():
+        db.session.execute(db.insert(BlockedDate), [{'start_date': day(20), 'end_date': day(25)}])
+        db.session.commit()
+        assert not availability.is_free(day(24), day(26))
+
+        BlockedDate.query.delete()
+        db.session.commit()
+        assert availability.is_free(day(24), day(26))
+
+def test_index_notices_other_writers(app, empty_calendar):
+    with app.app_context():
+        assert availability.is_free(day(1), day(2))
+        # Simulate another worker committing without this process seeing the flush
+        with db.engine.begin() as connection:
+            connection.execute(db.insert(Booking).values(
+                guest_name='Elsewhere', guest_email='other@example.com',
+                start_date=day(1), end_date=day(2)))
+            connection.execute(db.text('UPDATE data_version SET version = version + 1'))
+        assert not availability.is_free(day(1), day(2))
+
+def test_day_bitmap_follows_session_changes(app, empty_calendar):
+    with app.app_context():
+        assert availability.is_free(day(1), day(31))
+        stays = [Booking(guest_name='Guest', guest_email='guest@example.com',
+                         start_date=day(start), end_date=day(end))
+                 for start, end in [(2, 4), (5, 7), (10, 12)]]
+        db.session.add_all(stays)
+        db.session.add(BlockedDate(start_date=day(4), end_date=day(5)))
+        db.session.commit()
+        db.session.delete(stays[1])
+        db.session.commit()
+
+        patched = dict(availability.days._years)
+        version = availability.version
+        availability.rebuild()
+        assert availability.version == version
+        assert patched == availability.days._years
+        assert availability.monthly_occupancy(2031)[:2] == [7, 0]
+        assert availability.first_free(date(2031, 1, 1), 2) == date(2031, 1, 6)
+        assert availability.first_free(date(2031, 1, 1), 4) == date(2031, 1, 13)
+
+def test_first_free_endpoint(test_client: FlaskClient, app, admin_user, empty_calendar):
+    with app.app_context():
+        db.session.add(Booking(guest_name='Guest', guest_email='guest@example.com',
+                               start_date=day(2), end_date=day(4)))
+        db.session.commit()
+        db.session.add(admin_user)
+        db.session.refresh(admin_user)
+        with app.test_request_context():
+            login_user(admin_user)
+            response = test_client.get('/api/availability/first-free?nights=3&after=2031-01-01')
+            assert response.status_code == 200
+            assert response.json == {'start': '2031-01-05', 'end': '2031-01-08'}
+
+            response = test_client.get('/api/availability/occupancy?year=2031')
+            assert response.json['months'] == [3] + [0] * 11
+
+            response = test_client.get('/api/availability/first-free?nights=0')
+            assert response.status_code == 400
+
+            # Dates near date.max are refused rather than overflowing
+            limiter.reset()
+            response = test_client.get('/api/availability/first-free?nights=3&after=9999-12-30')
+            assert response.status_code == 400
+            response = test_client.get('/api/availability/occupancy?year=9999')
+            assert response.status_code == 400
+
+def test_blocked_date_rejects_overlapping_booking(test_client: FlaskClient, app, admin_user, empty_calendar):
+    with app.app_context():
+        db.session.add(admin_user)
+        db.session.refresh(admin_user)
+        with app.test_request_context():
+            login_user(admin_user)
+            response = test_client.post('/api/bookings', json={
+                'guest_name': 'Guest', 'guest_email': 'guest@example.com',
+                'start_date': '2031-02-01', 'end_date': '2031-02-05',
+            })
+            assert response.status_code == 201
+
+            response = test_client.post('/api/blocked-dates', json={
+                'start_date': '2031-02-05', 'end_date': '2031-02-07',
+            })
+            assert response.status_code == 400
+            assert response.json['error'] == 'Selected dates overlap with existing booking or blocked period'
+
+            response = test_client.post('/api/blocked-dates', json={
+                'start_date': '2031-02-06', 'end_date': '2031-02-07',
+            })
+            assert response.status_code == 201
+
+def raise_sqlite_error(message, code):
+    error = sqlite3.OperationalError(message)
+    error.sqlite_errorcode = code
+    raise OperationalError('BEGIN IMMEDIATE', {}, error)
+
+def test_only_lock_errors_report_a_busy_calendar(test_client: FlaskClient, app, empty_calendar, monkeypatch):
+    test_client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    booking = {'guest_name': 'Guest', 'guest_email': 'guest@example.com',
+               'start_date': '2031-02-01', 'end_date': '2031-02-05'}
+
+    monkeypatch.setattr(api, 'lock_calendar', lambda: raise_sqlite_error('database is locked', 5))
+    response = test_client.post('/api/bookings', json=booking)
+    assert response.status_code == 503
+
+    monkeypatch.setattr(api, 'lock_calendar', lambda: raise_sqlite_error('disk I/O error', 10))
+    with pytest.raises(OperationalError, match='disk I/O error'):
+        test_client.post('/api/blocked-dates', json=booking)
+
+def post_concurrent_booking(app, index, dates, barrier, results):
+    # Connections must not be shared with the parent process after fork
+    db.session.registry.clear()
+    db.engine.dispose(close=False)
+    client = app.test_client()
+    environ = {'REMOTE_ADDR': f'10.17.0.{index}'}
+    client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']}, environ_base=environ)
+    barrier.wait()
+    response = client.post('/api/bookings', environ_base=environ, json={
+        'guest_name': f'Guest {index}', 'guest_email': f'guest{index}@example.com',
+        'start_date': dates[0], 'end_date': dates[1],
+    })
+    results.put((dates, response.status_code))
+
+def test_concurrent_overlapping_bookings_across_processes(app, admin_user, empty_calendar):
+    """Only one of several workers booking the same nights at once succeeds"""
+    contested = ('2031-03-10', '2031-03-14')
+    requests = [contested] * 6 + [(f'2031-04-{n:02d}', f'2031-04-{n + 1:02d}') for n in (1, 4, 7, 10)]
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(len(requests))
+    results = ctx.Queue()
+    workers = [ctx.Process(target=post_concurrent_booking, args=(app, i, dates, barrier, results))
+               for i, dates in enumerate(requests)]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join(30)
+
+    contested_codes = sorted(code for dates, code in outcomes if dates == contested)
+    assert contested_codes == [201] + [400] * 5
+    assert all(code == 201 for dates, code in outcomes if dates != contested)
+    with app.app_context():
+        assert Booking.query.count() == 5
+        assert not availability.is_free(datetime(2031, 3, 10), datetime(2031, 3, 14))
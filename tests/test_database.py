@@ -0,0 +1,104 @@
+import pytest
+import random
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, inspect
+from src.database import db
+from src.migrations import migrate_epoch_days
+from src.models import Booking, BlockedDate
+from src.models.epoch_day import epoch_day
+from src.seed import generate_calendar, seed_command
+
+def test_sqlite_pragmas_applied(app):
+    with app.app_context():
+        pragma = lambda name: db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('busy_timeout') == app.config['SQLITE_PRAGMAS']['busy_timeout']
+        assert pragma('temp_store') == 2  # MEMORY
+
+def test_migrate_epoch_days_backfills_legacy_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        # The booking and blocked_date layouts from before the day columns
+        connection.exec_driver_sql(
+            'CREATE TABLE booking (id INTEGER PRIMARY KEY, start_date DATETIME NOT NULL, end_date DATETIME NOT NULL, '
+            'guest_name VARCHAR(100) NOT NULL, guest_email VARCHAR(120) NOT NULL, created_at DATETIME)')
+        connection.exec_driver_sql('CREATE INDEX ix_booking_end_start ON booking (end_date, start_date)')
+        connection.exec_driver_sql(
+            'CREATE TABLE blocked_date (id INTEGER PRIMARY KEY, start_date DATETIME NOT NULL, '
+            'end_date DATETIME NOT NULL, reason VARCHAR(200), created_at DATETIME)')
+        connection.exec_driver_sql(
+            "INSERT INTO booking (id, start_date, end_date, guest_name, guest_email) "
+            "VALUES (1, '1970-01-02 00:00:00.000000', '2031-01-05 12:00:00.000000', 'Guest', 'guest@example.com')")
+
+    assert migrate_epoch_days(engine) == 1
+    assert migrate_epoch_days(engine) == 0
+
+    with engine.connect() as connection:
+        row = connection.exec_driver_sql('SELECT start_day, end_day FROM booking').one()
+        indexes = {index['name'] for index in inspect(connection).get_indexes('booking')}
+    assert tuple(row) == (1, epoch_day(date(2031, 1, 5)))
+    assert 'ix_booking_end_start' not in indexes
+
+def test_epoch_days_follow_dates(app):
+    with app.app_context():
+        booking = Booking(guest_name='Guest', guest_email='guest@example.com',
+                          start_date=datetime(2031, 6, 1), end_date=datetime(2031, 6, 4))
+        assert (booking.start_day, booking.end_day) == (epoch_day(date(2031, 6, 1)), epoch_day(date(2031, 6, 4)))
+        booking.end_date = datetime(2031, 6, 6)
+        assert booking.end_day == epoch_day(date(2031, 6, 6))
+
+        # Core inserts fill the days from the dates through the column defaults
+        db.session.execute(db.insert(BlockedDate), [{'start_date': datetime(2031, 7, 1), 'end_date': datetime(2031, 7, 2)}])
+        blocked = BlockedDate.query.filter_by(start_date=datetime(2031, 7, 1)).one()
+        assert blocked.start_day == epoch_day(date(2031, 7, 1))
+        db.session.rollback()
+
+def test_updates_keep_epoch_days_in_step(app):
+    with app.app_context():
+        booking = Booking(guest_name='Guest', guest_email='guest@example.com',
+                          start_date=datetime(2031, 6, 1), end_date=datetime(2031, 6, 4))
+        db.session.add(booking)
+        db.session.commit()
+
+        db.session.execute(db.update(Booking).filter_by(id=booking.id).values(end_date=datetime(2031, 6, 9)))
+        Booking.query.filter_by(id=booking.id).update({Booking.start_date: datetime(2031, 6, 2)})
+        db.session.execute(db.update(Booking.__table__).where(Booking.__table__.c.id == booking.id)
+                           .values(guest_name='Renamed'))
+        db.session.refresh(booking)
+        assert (booking.start_day, booking.end_day) == (epoch_day(date(2031, 6, 2)), epoch_day(date(2031, 6, 9)))
+
+        db.session.execute(db.update(Booking), [{'id': booking.id, 'end_date': datetime(2031, 6, 12)}])
+        db.session.refresh(booking)
+        assert booking.end_day == epoch_day(date(2031, 6, 12))
+
+        # The day can't be worked out from a SQL expression
+        with pytest.raises(ValueError):
+            db.session.execute(db.update(Booking).values(end_date=Booking.end_date + timedelta(days=1)))
+
+        db.session.rollback()
+        Booking.query.delete()
+        db.session.commit()
+
+def test_generated_calendar_never_overlaps():
+    start, end = datetime(2020, 1, 1), datetime(2030, 1, 1)
+    ranges = sorted((row['start_date'], row['end_date'], kind)
+                    for kind, row in generate_calendar(start, end, occupancy=0.7, rng=random.Random(3)))
+    assert {kind for _, _, kind in ranges} == {'booking', 'blocked'}
+    assert ranges[0][0] == start and ranges[-1][1] <= end
+    # Ranges are inclusive, so each must start after the previous one's last day
+    assert all(previous_end < next_start for (_, previous_end, _), (next_start, _, _) in zip(ranges, ranges[1:]))
+    taken = sum((range_end - range_start).days + 1 for range_start, range_end, _ in ranges)
+    assert 0.6 < taken / (end - start).days < 0.8
+
+def test_seed_command(app):
+    runner = app.test_cli_runner()
+    with app.app_context():
+        result = runner.invoke(seed_command, ['--years', '2', '--seed', '1', '--clear'])
+        assert result.exit_code == 0, result.output
+        assert Booking.query.count() > 50 and BlockedDate.query.count() > 0
+        # Seeding on top of an existing calendar would create overlaps
+        result = runner.invoke(seed_command, ['--years', '2'])
+        assert result.exit_code == 1 and '--clear' in result.output
+        Booking.query.delete()
+        BlockedDate.query.delete()
+        db.session.commit()
@@ -0,0 +1,81 @@
+import pytest
+import time
+import socket
+from datetime import datetime
+from src.models import Booking
+from src.utils.email import send_email, send_emails
+from src.utils.smtp_pool import smtp_pool, smtp_settings
+from src.utils.templates import compile_template, TemplateError
+
+def test_batch_shares_one_session(app, smtp_server):
+    with app.app_context():
+        results = send_emails([
+            ('owner@example.com', 'New Booking', 'Details', False),
+            ('guest@example.com', 'Welcome', '<p>Hi</p>', True),
+        ])
+        assert results == [True, True]
+        assert smtp_server.connections == 1
+        assert [m['To'] for m in smtp_server.messages] == ['owner@example.com', 'guest@example.com']
+
+def test_sessions_are_reused_between_sends(app, smtp_server):
+    with app.app_context():
+        assert send_email('one@example.com', 'First', 'Hello')
+        assert send_email('two@example.com', 'Second', 'Hello')
+        assert smtp_server.connections == 1
+        assert smtp_pool.idle_count() == 1
+
+def test_rejected_message_keeps_session(app, smtp_server):
+    smtp_server.fail_next = 1
+    with app.app_context():
+        results = send_emails([
+            ('rejected@example.com', 'First', 'Hello', False),
+            ('accepted@example.com', 'Second', 'Hello', False),
+        ], max_retries=1)
+        assert results == [False, True]
+        assert smtp_server.connections == 1
+
+def test_idle_sessions_are_evicted(app, smtp_server, monkeypatch):
+    monkeypatch.setattr(smtp_pool, 'idle_timeout', 0)
+    with app.app_context():
+        assert send_email('one@example.com', 'First', 'Hello')
+        time.sleep(0.01)
+        assert smtp_pool.evict_idle() == 1
+        assert send_email('two@example.com', 'Second', 'Hello')
+        assert smtp_server.connections == 2
+
+def test_dead_session_is_replaced_after_noop(app, smtp_server, monkeypatch):
+    monkeypatch.setattr(smtp_pool, 'noop_interval', 0)
+    with app.app_context():
+        assert send_email('one@example.com', 'First', 'Hello')
+        # Simulate the provider dropping the idle session
+        with smtp_pool.connection(smtp_settings()) as server:
+            server.sock.shutdown(socket.SHUT_RDWR)
+        assert send_email('two@example.com', 'Second', 'Hello', max_retries=1)
+        assert smtp_server.connections == 2
+        assert len(smtp_server.messages) == 2
+
+def test_welcome_template_renders_every_field(app):
+    booking = Booking(id=7, guest_name='Ann <Lee>', guest_email='ann@example.com',
+                      start_date=datetime(2030, 3, 1), end_date=datetime(2030, 3, 4))
+    template = compile_template('{guest_name} {start_date}..{end_date} ({nights} nights, #{booking_id}) '
+                                '{start_date_long} p { color: red } {guest_name}')
+    assert template.render(booking) == ('Ann &lt;Lee&gt; 2030-03-01..2030-03-04 (3 nights, #7) '
+                                        'Friday, March 01, 2030 p { color: red } Ann &lt;Lee&gt;')
+    assert compile_template('{guest_name}') is compile_template('{guest_name}')
+
+def test_welcome_template_rejects_unknown_placeholders(app):
+    with pytest.raises(TemplateError, match='guest_phone'):
+        compile_template('Call {guest_phone}')
+
+def test_welcome_template_preview_and_validation(test_client, app):
+    test_client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    response = test_client.post('/admin/welcome-template/preview', json={'template': '<p>Hi {guest_name}, {nights} nights</p>'})
+    assert response.status_code == 200
+    assert response.json['html'] == '<p>Hi Jane Doe, 3 nights</p>'
+
+    response = test_client.post('/admin/welcome-template/preview', json={'template': 'Hi {name}'})
+    assert response.status_code == 400
+    assert 'Unknown placeholder {name}' in response.json['error']
+
+    response = test_client.put('/admin/welcome-template', json={'template': 'Hi {name}'})
+    assert response.status_code == 400
@@ -0,0 +1,131 @@
+import pytest
+from datetime import datetime, timedelta, UTC
+from flask.testing import FlaskClient
+from flask_login import login_user
+from src.models import Booking, OutboxMessage
+from src.database import db
+from src.utils import outbox
+from src.utils.outbox import queue_email, deliver_pending, claim_due_messages
+
+@pytest.fixture(autouse=True)
+def clean_outbox(app):
+    with app.app_context():
+        OutboxMessage.query.delete()
+        Booking.query.delete()
+        db.session.commit()
+    yield
+    with app.app_context():
+        OutboxMessage.query.delete()
+        Booking.query.delete()
+        db.session.commit()
+
+def test_booking_queues_emails(test_client: FlaskClient, app, regular_user):
+    with app.app_context():
+        db.session.add(regular_user)
+        db.session.refresh(regular_user)
+        with app.test_request_context():
+            login_user(regular_user)
+            response = test_client.post('/api/bookings', json={
+                'guest_name': 'Outbox Guest', 'guest_email': 'guest@example.com',
+                'start_date': '2032-03-01', 'end_date': '2032-03-04',
+            })
+            assert response.status_code == 201
+
+        messages = OutboxMessage.query.order_by(OutboxMessage.id).all()
+        assert [m.to_email for m in messages] == [app.config['OWNER_EMAIL'], 'guest@example.com']
+        assert all(m.status == 'pending' for m in messages)
+        assert 'Outbox Guest' in messages[1].body
+
+def test_deliver_pending_sends_via_smtp(app, smtp_server):
+    with app.app_context():
+        queue_email('one@example.com', 'First', 'Hello')
+        queue_email('two@example.com', 'Second', '<p>Hello</p>', is_html=True)
+        db.session.commit()
+
+        assert deliver_pending() == 2
+        assert sorted(m['To'] for m in smtp_server.messages) == ['one@example.com', 'two@example.com']
+        assert {m.status for m in OutboxMessage.query.all()} == {'sent'}
+
+        # Nothing left to send
+        assert deliver_pending() == 0
+
+def test_failed_delivery_backs_off(app, smtp_server, monkeypatch):
+    monkeypatch.setitem(app.config, 'OUTBOX_MAX_ATTEMPTS', 2)
+    smtp_server.fail_next = 2
+    with app.app_context():
+        message = queue_email('guest@example.com', 'Retry me', 'Hello')
+        db.session.commit()
+
+        assert deliver_pending() == 0
+        db.session.refresh(message)
+        assert message.status == 'pending'
+        assert message.attempts == 1
+        retry_at = message.next_attempt_at.replace(tzinfo=UTC)
+        assert retry_at >= datetime.now(UTC) + timedelta(seconds=app.config['OUTBOX_RETRY_BASE_SECONDS'] - 5)
+
+        # Not due yet, so a second pass leaves it alone
+        assert deliver_pending() == 0
+        db.session.refresh(message)
+        assert message.attempts == 1
+
+        message.next_attempt_at = datetime.now(UTC)
+        db.session.commit()
+        assert deliver_pending() == 0
+        db.session.refresh(message)
+        assert message.status == 'failed'
+        assert smtp_server.messages == []
+
+def test_leased_messages_are_skipped(app, smtp_server):
+    with app.app_context():
+        message = queue_email('guest@example.com', 'Claimed elsewhere', 'Hello')
+        message.locked_until = datetime.now(UTC) + timedelta(minutes=1)
+        db.session.commit()
+
+        assert deliver_pending() == 0
+        assert smtp_server.messages == []
+
+def test_lease_expiring_mid_batch(app, smtp_server, monkeypatch):
+    with app.app_context():
+        first = queue_email('one@example.com', 'First', 'Hello')
+        second = queue_email('two@example.com', 'Second', 'Hello')
+        db.session.commit()
+        first_id, second_id = first.id, second.id
+
+        sends = []
+        def slow_send(emails, max_retries):
+            sends.append(emails[0][0])
+            if len(sends) == 1:
+                # The first send outlasts the batch's lease, and another worker
+                # claims the second message once its lease has expired
+                db.session.execute(db.update(OutboxMessage).filter_by(id=second_id)
+                                   .values(locked_until=datetime.now(UTC) - timedelta(seconds=1))
+                                   .execution_options(synchronize_session=False))
+                taken_over, _ = claim_due_messages(datetime.now(UTC))
+                assert taken_over == [second_id]
+            return [True]
+        monkeypatch.setattr(outbox, 'send_emails', slow_send)
+
+        assert deliver_pending() == 1
+        assert sends == ['one@example.com']
+        assert db.session.get(OutboxMessage, first_id).status == 'sent'
+        second = db.session.get(OutboxMessage, second_id)
+        assert (second.status, second.attempts) == ('pending', 0)
+        assert second.locked_until is not None
+
+def test_lost_lease_is_not_marked_sent(app, smtp_server, monkeypatch):
+    with app.app_context():
+        message = queue_email('one@example.com', 'First', 'Hello')
+        db.session.commit()
+        message_id = message.id
+
+        def stolen_send(emails, max_retries):
+            # Another worker takes the message over while this send is stuck
+            db.session.execute(db.update(OutboxMessage).filter_by(id=message_id)
+                               .values(locked_until=datetime.now(UTC) + timedelta(hours=2)))
+            db.session.commit()
+            return [True]
+        monkeypatch.setattr(outbox, 'send_emails', stolen_send)
+
+        assert deliver_pending() == 0
+        message = db.session.get(OutboxMessage, message_id)
+        assert (message.status, message.attempts) == ('pending', 0)
@@ -0,0 +1,144 @@
+import multiprocessing
+import pytest
+from flask.testing import FlaskClient
+from flask_login import login_user
+from src.database import db
+from src import metrics as metrics_module
+from src.metrics import Metrics, metrics
+from src.utils.email import send_emails
+
+@pytest.fixture(autouse=True)
+def reset_metrics(app):
+    metrics.clear()
+
+def sample(text, line_start):
+    """Return the value of the first exposition line starting with `line_start`"""
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+def test_metrics_require_admin(test_client: FlaskClient):
+    response = test_client.get('/metrics')
+    assert response.status_code == 403
+
+def test_metrics_accept_bearer_token(test_client: FlaskClient, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    assert test_client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    response = test_client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+def test_metrics_record_requests(test_client: FlaskClient, app, admin_user):
+    db.session.add(admin_user)
+    db.session.refresh(admin_user)
+    with app.test_request_context():
+        login_user(admin_user)
+        for _ in range(2):
+            assert test_client.get('/api/bookings').status_code == 200
+        # The fourth request in a second trips the limiter
+        for _ in range(2):
+            test_client.get('/api/bookings')
+
+        text = test_client.get('/metrics').get_data(as_text=True)
+
+    series = 'blueprint="api",endpoint="api.get_bookings",method="GET"'
+    assert sample(text, f'homestay_http_requests_total{{{series},status="200"}}') == 3
+    assert sample(text, f'homestay_http_requests_total{{{series},status="429"}}') == 1
+    assert sample(text, f'homestay_http_request_duration_seconds_count{{{series}}}') == 4
+    assert sample(text, f'homestay_http_request_duration_seconds_bucket{{{series},le="+Inf"}}') == 4
+    assert sample(text, 'homestay_rate_limit_rejections_total{reason="throttled"}') == 1
+    # Only the scrape itself is still in flight
+    assert sample(text, 'homestay_http_requests_in_flight ') == 1
+    assert sample(text, 'homestay_db_query_duration_seconds_count{statement="select"}') > 0
+    assert sample(text, 'homestay_rate_limiter_tracked_ips ') >= 1
+    assert '# TYPE homestay_http_request_duration_seconds histogram' in text
+
+def test_metrics_record_emails(app, smtp_server):
+    smtp_server.fail_next = 1
+    with app.app_context():
+        assert send_emails([('guest@example.com', 'Welcome', 'Hi', False)], max_retries=2, retry_delay=0) == [True]
+    text = metrics.render()
+    assert sample(text, 'homestay_emails_total{result="sent"}') == 1
+    assert sample(text, 'homestay_email_retries_total ') == 1
+    assert sample(text, 'homestay_email_send_duration_seconds_count ') == 1
+
+def record_in_worker(path, barrier):
+    worker = Metrics()
+    worker.path = path
+    worker.inc('homestay_http_requests_total', status='200')
+    worker.observe('homestay_http_request_duration_seconds', 0.2)
+    worker.inc('homestay_http_requests_in_flight')
+    worker.publish()
+    barrier.wait()
+
+def test_metrics_add_up_across_workers(tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(3)
+    workers = [ctx.Process(target=record_in_worker, args=(path, barrier)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    scraper = Metrics()
+    scraper.path = path
+    text = scraper.render()
+    assert sample(text, 'homestay_http_requests_total{status="200"}') == 3
+    assert sample(text, 'homestay_http_requests_in_flight ') == 3
+    assert sample(text, 'homestay_http_request_duration_seconds_bucket{le="0.25"}') == 3
+    assert sample(text, 'homestay_http_request_duration_seconds_bucket{le="0.1"}') == 0
+    assert sample(text, 'homestay_http_request_duration_seconds_sum ') == pytest.approx(0.6)
+
+def record_and_exit(path):
+    worker = Metrics()
+    worker.path = path
+    worker.inc('homestay_http_requests_total', 2, status='200')
+    worker.inc('homestay_http_requests_in_flight')
+    worker.publish()
+
+def test_exited_workers_keep_their_counts(tmp_path, monkeypatch):
+    path = str(tmp_path / 'metrics.db')
+    worker = multiprocessing.get_context('fork').Process(target=record_and_exit, args=(path,))
+    worker.start()
+    worker.join(30)
+
+    # Two workers that share a pid don't overwrite each other
+    first, second = Metrics(), Metrics()
+    for current in (first, second):
+        current.path = path
+        current.inc('homestay_http_requests_total', status='200')
+        current.publish()
+    text = first.render()
+    assert sample(text, 'homestay_http_requests_total{status="200"}') == 4
+    assert sample(text, 'homestay_http_requests_in_flight ') == 1
+
+    # Once its process is gone, the exited worker's counters move to the baseline row
+    monkeypatch.setattr(metrics_module, 'GAUGE_TTL', -1)
+    text = first.render()
+    assert sample(text, 'homestay_http_requests_total{status="200"}') == 4
+    assert sample(text, 'homestay_http_requests_in_flight ') is None
+    rows = first._connection().execute('SELECT worker FROM metric_snapshots').fetchall()
+    assert sorted(worker for worker, in rows) == sorted([metrics_module.BASELINE, first._worker, second._worker])
+    first.publish()
+    assert sample(first.render(), 'homestay_http_requests_total{status="200"}') == 4
+
+def test_server_timing_in_debug(test_client: FlaskClient, app, monkeypatch):
+    assert 'Server-Timing' not in test_client.get('/api/availability').headers
+    monkeypatch.setattr(app, 'debug', True)
+    timing = test_client.get('/api/availability').headers['Server-Timing']
+    db_timing, app_timing = timing.split(', ')
+    assert db_timing.startswith('db;dur=') and db_timing.endswith(' queries"')
+    assert app_timing.startswith('app;dur=')
+
+def test_slow_queries_are_logged(test_client: FlaskClient, app, monkeypatch, caplog):
+    test_client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    monkeypatch.setattr(metrics, 'slow_query_seconds', 0.0)
+    with caplog.at_level('WARNING', logger=app.logger.name):
+        assert test_client.get('/api/availability').status_code == 200
+    slow = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Slow query')]
+    assert slow and all(' in api.get_availability: SELECT ' in message for message in slow)
+
+    text = metrics.render()
+    assert sample(text, 'homestay_db_queries_per_request_count{endpoint="api.get_availability"}') == 1
@@ -0,0 +1,76 @@
+import os
+import pstats
+import pytest
+from flask.testing import FlaskClient
+from src.profiling import profiler
+
+@pytest.fixture
+def profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'enabled', True)
+    monkeypatch.setattr(profiler, 'directory', str(tmp_path))
+    monkeypatch.setattr(profiler, 'sample_rate', 1.0)
+    monkeypatch.setattr(profiler, 'max_bytes', 10 * 1024 * 1024)
+    return tmp_path
+
+@pytest.fixture
+def admin_client(test_client: FlaskClient, app):
+    test_client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    return test_client
+
+def profiled_get(client, url, flag='1'):
+    with client.get(url, headers={'X-Profile': flag}) as response:
+        response.get_data()
+    return response
+
+def test_admin_request_is_profiled(admin_client, profiling):
+    response = profiled_get(admin_client, '/api/availability')
+    assert response.status_code == 200
+    name = response.headers['X-Profile']
+    assert '-api-get_availability-' in name and name.endswith('.prof')
+
+    stats = pstats.Stats(str(profiling / name))
+    assert any(function == 'get_availability' for _, _, function in stats.stats)
+
+    listing = admin_client.get('/admin/profiles').get_json()
+    assert [profile['name'] for profile in listing] == [name]
+    download = admin_client.get(listing[0]['url'])
+    assert download.status_code == 200
+    assert download.data == (profiling / name).read_bytes()
+    assert admin_client.get('/admin/profiles/../app.py').status_code == 404
+
+def test_memory_profile_reports_allocations(admin_client, profiling):
+    response = admin_client.get('/admin/summary?_profile=memory')
+    response.close()
+    report = profiling / response.headers['X-Profile'].replace('.prof', '.mem.txt')
+    assert report.read_text().startswith('Traced memory:')
+    assert 'whole process' in report.read_text()
+
+def test_unsaved_profile_is_logged(admin_client, profiling, monkeypatch, app, caplog):
+    blocked = profiling / 'not-a-directory'
+    blocked.write_text('')
+    monkeypatch.setattr(profiler, 'directory', str(blocked))
+    with caplog.at_level('WARNING', logger=app.logger.name):
+        assert profiled_get(admin_client, '/admin/summary').status_code == 200
+    assert any(record.getMessage().startswith('Could not save profile') for record in caplog.records)
+    # The slot was given back
+    assert profiled_get(admin_client, '/admin/summary').headers['X-Profile'].endswith('.prof')
+
+def test_only_admins_can_profile(test_client: FlaskClient, app, profiling):
+    test_client.post('/login', data={'access_code': app.config['DEFAULT_ACCESS_CODE']})
+    response = profiled_get(test_client, '/api/availability')
+    assert response.status_code == 200
+    assert 'X-Profile' not in response.headers
+    assert os.listdir(profiling) == []
+
+def test_profiling_is_sampled(admin_client, profiling, monkeypatch):
+    monkeypatch.setattr(profiler, 'sample_rate', 0.0)
+    assert profiled_get(admin_client, '/admin/summary').headers['X-Profile'] == 'skipped'
+    assert os.listdir(profiling) == []
+
+def test_profiles_are_capped(admin_client, profiling, monkeypatch):
+    first = profiled_get(admin_client, '/admin/summary').headers['X-Profile']
+    size = os.path.getsize(profiling / first)
+    monkeypatch.setattr(profiler, 'max_bytes', size * 3 // 2)
+    os.utime(profiling / first, (0, 0))
+    second = profiled_get(admin_client, '/admin/summary').headers['X-Profile']
+    assert os.listdir(profiling) == [second]
@@ -0,0 +1,64 @@
+import pytest
+from datetime import datetime, timedelta
+from flask.testing import FlaskClient
+from src.availability import availability
+from src.database import db
+from src.models import Booking, BlockedDate
+
+# Enough rows that a per-row query would blow every budget below
+ROWS = 20
+
+@pytest.fixture
+def admin_client(test_client: FlaskClient, app):
+    test_client.post('/admin/login', data={'access_code': app.config['ADMIN_ACCESS_CODE']})
+    return test_client
+
+@pytest.fixture
+def calendar(app):
+    Booking.query.delete()
+    BlockedDate.query.delete()
+    start = datetime(2034, 1, 1)
+    db.session.add_all([
+        Booking(guest_name=f'Guest {i}', guest_email=f'guest{i}@example.com',
+                start_date=start + timedelta(days=4 * i), end_date=start + timedelta(days=4 * i + 2))
+        for i in range(ROWS)
+    ] + [
+        BlockedDate(start_date=start + timedelta(days=4 * i + 3), end_date=start + timedelta(days=4 * i + 3),
+                    reason=f'Repairs {i}')
+        for i in range(ROWS)
+    ])
+    db.session.commit()
+    # Budgets below are for a warm availability index, as in a running worker
+    availability.sync()
+
+def test_events_feed_query_budget(admin_client, calendar, query_budget):
+    with query_budget(4):
+        response = admin_client.get('/api/bookings')
+    assert len(response.get_json()) == 2 * ROWS
+
+    # A cached feed only checks the data version
+    with query_budget(2):
+        assert admin_client.get('/api/bookings').status_code == 200
+
+def test_availability_query_budget(admin_client, calendar, query_budget):
+    with query_budget(3):
+        assert admin_client.get('/api/availability').status_code == 200
+
+def test_create_booking_query_budget(admin_client, calendar, query_budget):
+    with query_budget(10):
+        response = admin_client.post('/api/bookings', json={
+            'guest_name': 'Budget Guest', 'guest_email': 'budget@example.com',
+            'start_date': '2036-01-01', 'end_date': '2036-01-04'})
+    assert response.status_code == 201
+
+def test_create_blocked_date_query_budget(admin_client, calendar, query_budget):
+    with query_budget(7):
+        response = admin_client.post('/api/blocked-dates', json={
+            'start_date': '2036-02-01', 'end_date': '2036-02-03', 'reason': 'Painting'})
+    assert response.status_code == 201
+
+def test_dashboard_query_budget(admin_client, calendar, query_budget):
+    with query_budget(7):
+        response = admin_client.get('/admin/dashboard')
+    assert response.status_code == 200
+    assert b'Guest 0' in response.data
@@ -1,7 +1,8 @@
 import pytest
 import time
+import multiprocessing
 from datetime import datetime, timedelta
-from src.rate_limiting import ExponentialBackoffLimiter
+from src.rate_limiting import ExponentialBackoffLimiter, LimiterStorage, MemoryStorage, SQLiteStorage
 
 def test_basic_rate_limit():
     limiter = ExponentialBackoffLimiter()
@@ -39,7 +40,7 @@ def test_exponential_backoff():
         limiter.check_rate_limit(ip)
     
     assert limiter.is_banned(ip) == True
-    first_ban = limiter.ban_until[ip]
+    first_ban = limiter.state(ip).ban_until
     
     # Wait for ban to expire
     time.sleep(1.1)
@@ -49,8 +50,9 @@ def test_exponential_backoff():
         limiter.check_rate_limit(ip)
     
     # Second ban should be longer
-    second_ban = limiter.ban_until[ip]
-    assert (second_ban - datetime.now()) > (first_ban - datetime.now())
+    second_ban = limiter.state(ip).ban_until
+    now = limiter.storage.clock()
+    assert (second_ban - now) > (first_ban - now)
 
 def test_ban_duration():
     limiter = ExponentialBackoffLimiter()
@@ -84,12 +86,133 @@ def test_request_cleanup():
     limiter = ExponentialBackoffLimiter()
     ip = "127.0.0.7"
     
-    # Add some old requests
-    old_time = datetime.now() - timedelta(minutes=2)
-    limiter.request_times[ip] = [old_time for _ in range(10)]
+    # Add a full minute's worth of old requests
+    old_time = limiter.storage.clock() - timedelta(minutes=2).total_seconds()
+    for _ in range(100):
+        limiter.storage.update(ip, lambda state: state.record(old_time))
     
-    # Make a new request
+    # Old requests no longer count against the limits
     assert limiter.check_rate_limit(ip) == True
+    assert limiter.state(ip).latest(1) > old_time
+    assert limiter.is_banned(ip) == False
+
+def hammer_shared_limiter(path, ip, barrier, results):
+    limiter = ExponentialBackoffLimiter(SQLiteStorage(path))
+    barrier.wait()
+    results.put(sum(limiter.check_rate_limit(ip) for _ in range(5)))
+
+def test_shared_storage_holds_limit_across_processes(tmp_path):
+    """Four worker processes hitting one IP together still get 3 requests per second"""
+    path = str(tmp_path / 'rate_limits.db')
+    ExponentialBackoffLimiter(SQLiteStorage(path)).reset()  # Create the table up front
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(4)
+    results = ctx.Queue()
+    workers = [ctx.Process(target=hammer_shared_limiter, args=(path, '127.0.0.8', barrier, results))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    
+    allowed = sum(results.get(timeout=5) for _ in workers)
+    assert allowed == 3
+    assert ExponentialBackoffLimiter(SQLiteStorage(path)).is_banned('127.0.0.8') == True
+
+def test_shared_storage_bans_propagate(tmp_path):
+    path = str(tmp_path / 'rate_limits.db')
+    worker_a = ExponentialBackoffLimiter(SQLiteStorage(path))
+    worker_b = ExponentialBackoffLimiter(SQLiteStorage(path))
+    ip = "127.0.0.9"
+    
+    for _ in range(4):
+        worker_a.check_rate_limit(ip)
+    
+    assert worker_b.is_banned(ip) == True
+    assert worker_b.check_rate_limit("127.0.0.10") == True
+
+def test_storage_backends_must_implement_every_method():
+    class PartialStorage(LimiterStorage):
+        def get(self, ip):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStorage()
+
+def test_memory_storage_stripes_ips():
+    limiter = ExponentialBackoffLimiter()
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(1000)]
     
-    # Old requests should be cleaned up
-    assert len(limiter.request_times[ip]) == 1
+    for ip in ips:
+        assert limiter.check_rate_limit(ip) == True
+    
+    stripes = limiter.storage._stripes
+    assert sum(len(states) for _, states in stripes) == 1000
+    assert all(states for _, states in stripes)
+
+def test_ban_duration_is_capped():
+    limiter = ExponentialBackoffLimiter()
+    assert limiter.calculate_ban_duration(1) == 1
+    assert limiter.calculate_ban_duration(5) == 16
+    assert limiter.calculate_ban_duration(5000) == 24 * 60 * 60
+
+def test_memory_storage_is_bounded():
+    limiter = ExponentialBackoffLimiter(MemoryStorage(stripes=4, max_ips=100))
+    for i in range(1000):
+        assert limiter.check_rate_limit(f"10.1.{i // 256}.{i % 256}") == True
+    
+    assert limiter.stats()['tracked_ips'] <= 100
+    # The most recent client is always kept
+    assert limiter.state("10.1.3.231") is not None
+
+def test_memory_storage_evicts_idle_ips(monkeypatch):
+    storage = MemoryStorage(stripes=1, idle_ttl=60)
+    limiter = ExponentialBackoffLimiter(storage)
+    now = [1000.0]
+    monkeypatch.setattr(storage, 'clock', lambda: now[0])
+    
+    limiter.check_rate_limit("127.0.0.20")
+    now[0] += 30
+    limiter.check_rate_limit("127.0.0.21")
+    
+    # The first IP goes idle and is dropped on the next update
+    now[0] += 45
+    limiter.check_rate_limit("127.0.0.22")
+    assert limiter.state("127.0.0.20") is None
+    assert limiter.state("127.0.0.21") is not None
+    
+    now[0] += 60
+    assert storage.sweep() == 2
+    assert limiter.stats()['tracked_ips'] == 0
+
+def test_memory_storage_keeps_banned_ips(monkeypatch):
+    storage = MemoryStorage(stripes=1, idle_ttl=60)
+    limiter = ExponentialBackoffLimiter(storage)
+    now = [1000.0]
+    monkeypatch.setattr(storage, 'clock', lambda: now[0])
+    
+    for _ in range(4):
+        limiter.check_rate_limit("127.0.0.23")
+    storage.update("127.0.0.23", lambda state: setattr(state, 'ban_until', now[0] + 600))
+    
+    # Idle but still banned, so the violation history has to stay
+    now[0] += 120
+    assert storage.sweep() == 0
+    assert limiter.is_banned("127.0.0.23") == True
+
+def test_sqlite_storage_sweeps_expired_rows(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "limits.db"), max_ips=5, idle_ttl=60)
+    limiter = ExponentialBackoffLimiter(storage)
+    for i in range(10):
+        limiter.check_rate_limit(f"10.2.0.{i}")
+    
+    # Over capacity: the oldest rows go first
+    assert storage.sweep() == 5
+    assert limiter.stats()['tracked_ips'] == 5
+    assert limiter.state("10.2.0.0") is None
+    assert limiter.state("10.2.0.9") is not None
+    
+    monkeypatch.setattr(storage, 'clock', lambda: time.time() + 61)
+    assert storage.sweep() == 5
+    assert limiter.stats()['tracked_ips'] == 0
+    assert limiter.stats()['memory_bytes'] > 0
@@ -0,0 +1,47 @@
+from sqlalchemy import event
+from src.database import db
+from src.models import Setting
+from src.settings import SettingsStore
+
+def test_settings_default_to_config(app):
+    with app.app_context():
+        Setting.query.delete()
+        db.session.commit()
+        store = SettingsStore()
+        assert store.get('access_code') == app.config['DEFAULT_ACCESS_CODE']
+        assert store.get('welcome_template') == app.config['WELCOME_EMAIL_TEMPLATE']
+
+def test_settings_are_shared_between_workers(app):
+    # Two stores stand in for the caches of two gunicorn workers
+    worker_a, worker_b = SettingsStore(), SettingsStore()
+    with app.app_context():
+        Setting.query.delete()
+        db.session.commit()
+        assert worker_b.get('access_code') == app.config['DEFAULT_ACCESS_CODE']
+
+        worker_a.set('access_code', '2468')
+        assert worker_b.get('access_code') == '2468'
+
+        worker_b.set('welcome_template', 'Hello {guest_name}')
+        worker_b.set('access_code', '1357')
+        assert worker_a.snapshot() == {'access_code': '1357', 'welcome_template': 'Hello {guest_name}'}
+        assert worker_a.version == 3
+
+        Setting.query.delete()
+        db.session.commit()
+
+def test_settings_read_is_one_version_check(app):
+    store = SettingsStore()
+    with app.app_context():
+        store.get('access_code')
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            store.get('access_code')
+            store.get('welcome_template')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        assert len(statements) == 2
+        assert all('max(setting.version)' in statement for statement in statements)